@@ -4,18 +4,12 @@ import ImageIndexManager from '@/lib/imageIndex';
 export async function POST() {
   try {
     const imageManager = ImageIndexManager.getInstance();
-    const newIndex = imageManager.reloadIndex();
+    const stats = imageManager.reloadIndex();
     
     return NextResponse.json({
       success: true,
       message: 'Image index reloaded successfully',
-      stats: {
-        moviePosters: Object.keys(newIndex.movies.posters).length,
-        movieBackdrops: Object.keys(newIndex.movies.backdrops).length,
-        showPosters: Object.keys(newIndex.shows.posters).length,
-        showBackdrops: Object.keys(newIndex.shows.backdrops).length,
-        seasonPosters: Object.keys(newIndex.shows.season_posters).length
-      }
+      stats
     });
   } catch (error) {
     console.error('Error reloading image index:', error);
@@ -26,10 +26,13 @@ export async function GET() {
 
 export async function POST() {
   try {
-    // Clear cache to refresh data
-    dataService.clearCache();
+    // Reload only the files whose content hash changed in manifest.json
+    const result = dataService.reloadChanged();
     
-    return NextResponse.json({ message: 'Cache cleared successfully' });
+    return NextResponse.json({
+      message: result.full ? 'Cache cleared successfully' : 'Cache reloaded successfully',
+      ...result
+    });
   } catch (error) {
     console.error('Error clearing cache:', error);
     return NextResponse.json(
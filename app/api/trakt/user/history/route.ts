@@ -7,6 +7,38 @@ export async function GET(request: NextRequest) {
   try {
     const searchParams = request.nextUrl.searchParams;
     const type = searchParams.get('type'); // 'movies', 'shows', or 'all'
+    const page = searchParams.get('page');
+    const year = searchParams.get('year');
+
+    // Whole-year requests read only that year's segments of the history archive
+    if (year) {
+      if (!/^\d{4}$/.test(year)) {
+        return NextResponse.json(
+          { error: 'year must be a four-digit year' },
+          { status: 400 }
+        );
+      }
+      const data = dataService.getArchivedHistory(year, type === 'movies' || type === 'shows' ? type : null);
+      if (!data) {
+        return NextResponse.json(
+          { error: 'History archive not found' },
+          { status: 404 }
+        );
+      }
+      return NextResponse.json(data);
+    }
+
+    // Paged requests are served from the pre-sorted static pages
+    if (page && (type === 'movies' || type === 'shows')) {
+      const data = dataService.getListPage(`history/${type}`, Number(page), searchParams.get('sort'));
+      if (!data) {
+        return NextResponse.json(
+          { error: 'History page not found' },
+          { status: 404 }
+        );
+      }
+      return NextResponse.json(data);
+    }
 
     if (type === 'movies') {
       const data = dataService.getUserHistoryMovies();
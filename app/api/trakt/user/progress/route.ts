@@ -0,0 +1,32 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { TraktDataService } from '@/lib/services/trakt-data';
+
+const dataService = TraktDataService.getInstance();
+
+export async function GET(request: NextRequest) {
+  try {
+    const tmdbId = request.nextUrl.searchParams.get('tmdb_id');
+    if (!tmdbId) {
+      return NextResponse.json(
+        { error: 'tmdb_id is required' },
+        { status: 400 }
+      );
+    }
+
+    const progress = dataService.getShowProgress(tmdbId);
+    if (!progress) {
+      return NextResponse.json(
+        { error: 'Show progress not found' },
+        { status: 404 }
+      );
+    }
+
+    return NextResponse.json({ data: progress });
+  } catch (error) {
+    console.error('Error fetching show progress:', error);
+    return NextResponse.json(
+      { error: 'Internal server error' },
+      { status: 500 }
+    );
+  }
+}
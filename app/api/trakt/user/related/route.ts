@@ -0,0 +1,34 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { TraktDataService } from '@/lib/services/trakt-data';
+
+const dataService = TraktDataService.getInstance();
+
+export async function GET(request: NextRequest) {
+  try {
+    const searchParams = request.nextUrl.searchParams;
+    const type = searchParams.get('type');
+    const tmdbId = searchParams.get('tmdb_id');
+    if ((type !== 'movies' && type !== 'shows') || !tmdbId) {
+      return NextResponse.json(
+        { error: 'type (movies or shows) and tmdb_id are required' },
+        { status: 400 }
+      );
+    }
+
+    const related = dataService.getRelated(type, tmdbId);
+    if (!related) {
+      return NextResponse.json(
+        { error: 'Related titles not found' },
+        { status: 404 }
+      );
+    }
+
+    return NextResponse.json({ data: related });
+  } catch (error) {
+    console.error('Error fetching related titles:', error);
+    return NextResponse.json(
+      { error: 'Internal server error' },
+      { status: 500 }
+    );
+  }
+}
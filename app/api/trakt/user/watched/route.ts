@@ -9,6 +9,33 @@ export async function GET(request: NextRequest) {
   try {
     const searchParams = request.nextUrl.searchParams;
     const type = searchParams.get('type'); // 'movies', 'shows', or 'all'
+    const page = searchParams.get('page');
+
+    // Paged requests are served from the pre-sorted static pages
+    if (page && (type === 'movies' || type === 'shows')) {
+      const data = dataService.getListPage(`watched/${type}`, Number(page), searchParams.get('sort'));
+      if (!data) {
+        return NextResponse.json(
+          { error: 'Watched page not found' },
+          { status: 404 }
+        );
+      }
+      return NextResponse.json(data);
+    }
+
+    // Slim projection: ids, title, year, plays, last_watched_at (and season numbers for shows)
+    if (searchParams.get('slim') === 'true' && (type === 'movies' || type === 'shows')) {
+      const data = type === 'movies'
+        ? dataService.getUserWatchedMoviesSlim()
+        : dataService.getUserWatchedShowsSlim();
+      if (!data) {
+        return NextResponse.json(
+          { error: 'Slim watched data not found' },
+          { status: 404 }
+        );
+      }
+      return NextResponse.json(data);
+    }
 
     if (type === 'movies') {
       const data = dataService.getUserWatchedMovies();
@@ -1,5 +1,5 @@
 import { MetadataRoute } from 'next';
-import { readFileSync } from 'fs';
+import { readFileSync, existsSync } from 'fs';
 import { join } from 'path';
 
 interface WatchedMovie {
@@ -20,18 +20,20 @@ interface WatchedShow {
   last_watched_at: string;
 }
 
+// Prefer the slim projection (ids and dates only), fall back to the full file
+function readWatched<T>(name: 'movies' | 'shows'): T[] {
+  const slimPath = join(process.cwd(), `public/data/json/user/watched/${name}.slim.json`);
+  const fullPath = join(process.cwd(), `public/data/json/user/watched/${name}.json`);
+  const data = JSON.parse(readFileSync(existsSync(slimPath) ? slimPath : fullPath, 'utf-8'));
+  return data.data || [];
+}
+
 export default function sitemap(): MetadataRoute.Sitemap {
   const baseUrl = process.env.NEXT_PUBLIC_BASE_URL || 'https://trakt.sayed.app';
 
-  // Read watched movies data
-  const moviesPath = join(process.cwd(), 'public/data/json/user/watched/movies.json');
-  const moviesData = JSON.parse(readFileSync(moviesPath, 'utf-8'));
-  const watchedMovies: WatchedMovie[] = moviesData.data || [];
-
-  // Read watched shows data
-  const showsPath = join(process.cwd(), 'public/data/json/user/watched/shows.json');
-  const showsData = JSON.parse(readFileSync(showsPath, 'utf-8'));
-  const watchedShows: WatchedShow[] = showsData.data || [];
+  // Read watched movies and shows
+  const watchedMovies = readWatched<WatchedMovie>('movies');
+  const watchedShows = readWatched<WatchedShow>('shows');
 
   // Base routes
   const routes: MetadataRoute.Sitemap = [
@@ -3,7 +3,7 @@ import Link from 'next/link';
 import { notFound } from 'next/navigation';
 import { FaTv, FaCalendar, FaStar, FaPlay, FaCheckCircle } from 'react-icons/fa';
 import { fetchTMDBShow } from '@/lib/services/tmdb';
-import { fetchWatchedShows, fetchShowHistory } from '@/lib/services/api';
+import { fetchShowHistory, fetchShowProgress } from '@/lib/services/api';
 import { getBackdropUrl, getPosterUrl, getProfileUrl } from '@/lib/utils/image-proxy';
 import { Icons } from '@/lib/utils/icons';
 import { getImdbUrl, getTmdbUrl } from '@/lib/utils/media';
@@ -39,20 +39,14 @@ export default async function TVPage({ params }: TVPageProps) {
   }
 
   // Fetch user data to determine watch status
-  const [watchedShows, history] = await Promise.all([
-    fetchWatchedShows().catch(() => []),
+  const [progress, history] = await Promise.all([
+    fetchShowProgress(tmdb_id).catch(() => null),
     fetchShowHistory().catch(() => []),
   ]);
 
-  // Check if show is watched
-  const watchedShow = watchedShows.find(s => s.show.ids.tmdb === parseInt(tmdb_id));
-  const isWatched = !!watchedShow;
-
-  // Calculate total episodes watched
-  const totalEpisodesWatched = watchedShow?.seasons.reduce(
-    (acc, season) => acc + season.episodes.length,
-    0
-  ) || 0;
+  // Progress row from the precomputed table (one keyed lookup)
+  const isWatched = !!progress;
+  const totalEpisodesWatched = progress?.episodes_watched || 0;
 
   // Get last 10 shows from history
   const recentShows = history
@@ -3,21 +3,21 @@
 import { useEffect, useState } from 'react';
 import Link from 'next/link';
 import { FaTv } from 'react-icons/fa';
-import { WatchedShow } from '@/lib/types';
-import { fetchWatchedShows } from '@/lib/services/api';
+import { WatchedShowSlim } from '@/lib/types';
+import { fetchWatchedShowsSlim } from '@/lib/services/api';
 import { getTraktUrl, getImdbUrl, getTmdbUrl, formatRelativeTime } from '@/lib/utils/media';
 import { Icons } from '@/lib/utils/icons';
 import LazyImage from './LazyImage';
 
 export default function WatchedShowsGrid() {
-  const [watchedShows, setWatchedShows] = useState<WatchedShow[]>([]);
+  const [watchedShows, setWatchedShows] = useState<WatchedShowSlim[]>([]);
   const [loading, setLoading] = useState(true);
   const [displayCount, setDisplayCount] = useState(10);
 
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const data = await fetchWatchedShows();
+        const data = await fetchWatchedShowsSlim();
         setWatchedShows(data);
       } catch (error) {
         console.error('Error fetching watched shows:', error);
@@ -63,11 +63,7 @@ export default function WatchedShowsGrid() {
 
       <div className="grid grid-cols-2 md:grid-cols-3 lg:grid-cols-4 xl:grid-cols-5 gap-4">
         {displayedShows.map((item) => {
-          const seasons = Array.isArray(item.seasons) ? item.seasons : [];
-          const totalEpisodes = seasons.reduce(
-            (acc, season) => acc + (Array.isArray(season.episodes) ? season.episodes.length : 0),
-            0
-          );
+          const totalEpisodes = item.episodes_watched || 0;
           
           return (
             <div key={item.show.ids.trakt} className="group">
@@ -1,8 +1,11 @@
 import { readFileSync, existsSync } from 'fs';
 import { join } from 'path';
 
+type ImageLayout = 'flat' | 'hashed';
+
 interface MediaIndex {
   last_updated: string;
+  layout?: ImageLayout;
   movies: {
     posters: string[];
     backdrops: string[];
@@ -14,7 +17,40 @@ interface MediaIndex {
   };
 }
 
+// Compact index written by scripts/media_index.py: a manifest plus integer shards, so a lookup
+// reads one small shard instead of the whole media_index.json
+interface CompactManifest {
+  version: number;
+  last_updated: string;
+  shard_size: number;
+  layout?: ImageLayout;
+  file_pattern: string;
+  shards: Record<string, number>;
+  totals: Record<string, number>;
+}
+
+interface CompactShard {
+  movies: {
+    posters: number[];
+    backdrops: number[];
+  };
+  shows: {
+    posters: number[];
+    backdrops: number[];
+    season_posters: Record<string, number[]>;
+  };
+}
+
+export interface ImageIndexStats {
+  moviePosters: number;
+  movieBackdrops: number;
+  showPosters: number;
+  showBackdrops: number;
+  seasonPosters: number;
+}
+
 interface ImageLookup {
+  layout: ImageLayout;
   movies: {
     posters: Record<string, string[]>;
     backdrops: Record<string, string[]>;
@@ -26,10 +62,19 @@ interface ImageLookup {
   };
 }
 
+// Bucket directories of an id in the 'hashed' layout: leading digits of the id zero-padded
+// to four digits, e.g. 17801 -> 17/80 (mirrors scripts/image_layout.py)
+function idBuckets(tmdbId: string): string {
+  const digits = tmdbId.padStart(4, '0');
+  return `${digits.slice(0, 2)}/${digits.slice(2, 4)}`;
+}
+
 class ImageIndexManager {
   private static instance: ImageIndexManager;
   private imageIndex: ImageLookup | null = null;
   private lastUpdated: string | null = null;
+  private manifest: CompactManifest | null = null;
+  private shards = new Map<string, CompactShard | null>();
 
   private constructor() {}
 
@@ -40,6 +85,54 @@ class ImageIndexManager {
     return ImageIndexManager.instance;
   }
 
+  // The compact manifest, or null when the tree has none yet (media_index.json is used then)
+  loadManifest(): CompactManifest | null {
+    try {
+      const manifestPath = join(process.cwd(), 'public', 'data', 'media_index', 'manifest.json');
+      if (!existsSync(manifestPath)) {
+        return null;
+      }
+
+      const manifest: CompactManifest = JSON.parse(readFileSync(manifestPath, 'utf-8'));
+
+      // A new index run invalidates the shards read so far
+      if (!this.manifest || this.manifest.last_updated !== manifest.last_updated) {
+        this.manifest = manifest;
+        this.shards.clear();
+      }
+      return this.manifest;
+    } catch (error) {
+      console.error('Error loading compact image index manifest:', error);
+      return null;
+    }
+  }
+
+  private loadShard(manifest: CompactManifest, shardNumber: string): CompactShard | null {
+    if (!manifest.shards[shardNumber]) {
+      return null;  // no images in this id range
+    }
+    if (!this.shards.has(shardNumber)) {
+      const shardPath = join(process.cwd(), 'public', 'data', 'media_index',
+                             manifest.file_pattern.replace('{n}', shardNumber));
+      this.shards.set(shardNumber, existsSync(shardPath) ? JSON.parse(readFileSync(shardPath, 'utf-8')) : null);
+    }
+    return this.shards.get(shardNumber) ?? null;
+  }
+
+  private shardFor(manifest: CompactManifest, tmdbId: string): CompactShard | null {
+    if (!/^\d+$/.test(tmdbId)) {
+      return null;
+    }
+    return this.loadShard(manifest, String(Math.floor(Number(tmdbId) / manifest.shard_size)));
+  }
+
+  // Load what lookups need on server start: the manifest, or the full index for older trees
+  preload(): void {
+    if (!this.loadManifest()) {
+      this.loadImageIndex();
+    }
+  }
+
   loadImageIndex(): ImageLookup {
     try {
       const mediaIndexPath = join(process.cwd(), 'public', 'data', 'media_index.json');
@@ -60,6 +153,7 @@ class ImageIndexManager {
       
       // Transform the media index into a fast lookup structure
       const lookup: ImageLookup = {
+        layout: mediaIndexData.layout || 'flat',
         movies: {
           posters: this.buildLookupMap(mediaIndexData.movies.posters),
           backdrops: this.buildLookupMap(mediaIndexData.movies.backdrops)
@@ -103,18 +197,75 @@ class ImageIndexManager {
 
   private getEmptyIndex(): ImageLookup {
     return {
+      layout: 'flat',
       movies: { posters: {}, backdrops: {} },
       shows: { posters: {}, backdrops: {}, season_posters: {} }
     };
   }
 
-  reloadIndex(): ImageLookup {
+  reloadIndex(): ImageIndexStats {
     this.imageIndex = null;
     this.lastUpdated = null;
-    return this.loadImageIndex();
+    this.manifest = null;
+    this.shards.clear();
+    this.preload();
+    return this.stats();
+  }
+
+  stats(): ImageIndexStats {
+    const manifest = this.loadManifest();
+    if (manifest) {
+      return {
+        moviePosters: manifest.totals['movies/posters'] || 0,
+        movieBackdrops: manifest.totals['movies/backdrops'] || 0,
+        showPosters: manifest.totals['shows/posters'] || 0,
+        showBackdrops: manifest.totals['shows/backdrops'] || 0,
+        seasonPosters: manifest.totals['shows/season_posters'] || 0
+      };
+    }
+
+    const index = this.loadImageIndex();
+    return {
+      moviePosters: Object.keys(index.movies.posters).length,
+      movieBackdrops: Object.keys(index.movies.backdrops).length,
+      showPosters: Object.keys(index.shows.posters).length,
+      showBackdrops: Object.keys(index.shows.backdrops).length,
+      seasonPosters: Object.keys(index.shows.season_posters).length
+    };
+  }
+
+  private layout(): ImageLayout {
+    const manifest = this.loadManifest();
+    return manifest ? manifest.layout || 'flat' : this.loadImageIndex().layout;
+  }
+
+  // Directory of a title's images in a category, relative to the image tree root
+  categoryPath(type: 'movies' | 'shows', category: 'posters' | 'backdrops', tmdbId: string): string {
+    return this.layout() === 'hashed'
+      ? `${type}/${category}/${idBuckets(tmdbId)}`
+      : `${type}/${category}`;
   }
 
   findImages(type: 'movies' | 'shows', category: 'posters' | 'backdrops', tmdbId: string, season?: string): { files: string[], basePath: string } {
+    const manifest = this.loadManifest();
+    if (manifest) {
+      const shard = this.shardFor(manifest, tmdbId);
+      if (type === 'shows' && category === 'posters' && season) {
+        if (shard?.shows.season_posters[tmdbId]?.includes(Number(season))) {
+          return {
+            files: [`season_${season}_poster.jpg`],
+            basePath: `${this.categoryPath('shows', 'posters', tmdbId)}/${tmdbId}/${season}`
+          };
+        }
+        return { files: [], basePath: '' };
+      }
+      const kind = category === 'posters' ? 'poster' : 'backdrop';
+      return {
+        files: shard?.[type][category].includes(Number(tmdbId)) ? [`${tmdbId}_${kind}.jpg`] : [],
+        basePath: this.categoryPath(type, category, tmdbId)
+      };
+    }
+
     const index = this.loadImageIndex();
     
     // Auto-reload if index is older than 24 hours
@@ -126,7 +277,7 @@ class ImageIndexManager {
       if (seasonData) {
         return {
           files: seasonData,
-          basePath: `shows/posters/${tmdbId}/${season}`
+          basePath: `${this.categoryPath('shows', 'posters', tmdbId)}/${tmdbId}/${season}`
         };
       }
     } else {
@@ -134,13 +285,51 @@ class ImageIndexManager {
       const files = index[type][category][tmdbId] || [];
       return {
         files,
-        basePath: `${type}/${category}`
+        basePath: this.categoryPath(type, category, tmdbId)
       };
     }
     
     return { files: [], basePath: '' };
   }
 
+  // A random movie or show backdrop; with the compact index only one shard is read (picked
+  // by its number of images, so every backdrop has about the same chance)
+  randomBackdrop(): { type: 'movies' | 'shows'; tmdbId: string; filename: string; basePath: string } | null {
+    const pick = <T,>(items: T[]): T => items[Math.floor(Math.random() * items.length)];
+    let candidates: { type: 'movies' | 'shows'; tmdbId: string }[] = [];
+
+    const manifest = this.loadManifest();
+    if (manifest) {
+      const shardNumbers = Object.keys(manifest.shards);
+      if (shardNumbers.length === 0) return null;
+      let ticket = Math.random() * shardNumbers.reduce((total, n) => total + manifest.shards[n], 0);
+      const first = shardNumbers.find((n) => (ticket -= manifest.shards[n]) < 0) ?? shardNumbers[0];
+      // Shards without backdrops (only posters) are skipped
+      for (const shardNumber of [first, ...shardNumbers.filter((n) => n !== first)]) {
+        const shard = this.loadShard(manifest, shardNumber);
+        if (!shard) continue;
+        candidates = [
+          ...shard.movies.backdrops.map((id) => ({ type: 'movies' as const, tmdbId: String(id) })),
+          ...shard.shows.backdrops.map((id) => ({ type: 'shows' as const, tmdbId: String(id) }))
+        ];
+        if (candidates.length > 0) break;
+      }
+      if (candidates.length === 0) return null;
+      const { type, tmdbId } = pick(candidates);
+      return { type, tmdbId, filename: `${tmdbId}_backdrop.jpg`, basePath: this.categoryPath(type, 'backdrops', tmdbId) };
+    }
+
+    const index = this.loadImageIndex();
+    candidates = [
+      ...Object.keys(index.movies.backdrops).map((tmdbId) => ({ type: 'movies' as const, tmdbId })),
+      ...Object.keys(index.shows.backdrops).map((tmdbId) => ({ type: 'shows' as const, tmdbId }))
+    ];
+    if (candidates.length === 0) return null;
+    const { type, tmdbId } = pick(candidates);
+    const files = index[type].backdrops[tmdbId];
+    return { type, tmdbId, filename: pick(files), basePath: this.categoryPath(type, 'backdrops', tmdbId) };
+  }
+
   private checkForDailyReload(): void {
     if (!this.lastUpdated) return;
     
@@ -7,7 +7,7 @@ console.time('Image index preload');
 
 try {
   const imageManager = ImageIndexManager.getInstance();
-  imageManager.loadImageIndex();
+  imageManager.preload();
   console.timeEnd('Image index preload');
   console.log('✅ Image index preloaded successfully');
 } catch (error) {
@@ -1,4 +1,4 @@
-import { ApiResponse, UserProfile, UserStats, HistoryItem, WatchedMovie, WatchedShow, WatchlistItem, UserList, ListItem, CommentItem, SearchResult, WatchingData } from '../types';
+import { ApiResponse, UserProfile, UserStats, HistoryItem, WatchedMovie, WatchedShow, WatchlistItem, UserList, ListItem, CommentItem, SearchResult, WatchingData, ShowProgress, WatchedShowSlim, RelatedTitleType } from '../types';
 
 const API_BASE = '/api/trakt';
 
@@ -44,6 +44,29 @@ export async function fetchWatchedShows(): Promise<WatchedShow[]> {
   return data.data;
 }
 
+export async function fetchWatchedShowsSlim(): Promise<WatchedShowSlim[]> {
+  const response = await fetch(`${API_BASE}/user/watched?type=shows&slim=true`);
+  if (!response.ok) throw new Error('Failed to fetch watched shows');
+  const data: ApiResponse<WatchedShowSlim[]> = await response.json();
+  return data.data;
+}
+
+export async function fetchShowProgress(tmdbId: string): Promise<ShowProgress | null> {
+  const response = await fetch(`${API_BASE}/user/progress?tmdb_id=${encodeURIComponent(tmdbId)}`);
+  if (response.status === 404) return null;
+  if (!response.ok) throw new Error('Failed to fetch show progress');
+  const data: { data: ShowProgress } = await response.json();
+  return data.data;
+}
+
+export async function fetchRelatedTitles(type: RelatedTitleType, tmdbId: string): Promise<number[]> {
+  const response = await fetch(`${API_BASE}/user/related?type=${type}&tmdb_id=${encodeURIComponent(tmdbId)}`);
+  if (response.status === 404) return [];
+  if (!response.ok) throw new Error('Failed to fetch related titles');
+  const data: { data: number[] } = await response.json();
+  return data.data;
+}
+
 export async function fetchMovieWatchlist(): Promise<WatchlistItem[]> {
   const response = await fetch(`${API_BASE}/user/watchlist?type=movies`);
   if (!response.ok) throw new Error('Failed to fetch movie watchlist');
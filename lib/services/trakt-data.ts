@@ -12,6 +12,13 @@ import type {
   TraktUserLists,
   TraktWatchedMovie,
   TraktWatchedShow,
+  TraktShowProgress,
+  TraktRelatedTitles,
+  RelatedTitleType,
+  TraktUserWatchedMoviesSlim,
+  TraktUserWatchedShowsSlim,
+  ShowProgress,
+  HistoryItem,
 } from '@/lib/types';
 
 // Additional types for search results
@@ -73,9 +80,41 @@ export interface StatsSummary {
   last_updated: string | null;
 }
 
+export interface PageManifest {
+  page_size: number;
+  total: number;
+  total_pages: number;
+  default_sort: string;
+  sorts: Record<string, { path: string; pages: number }>;
+}
+
+export interface DataManifest {
+  version: number;
+  generated_at: string;
+  files: Record<string, { sha256: string; size: number; count?: number }>;
+  hot: string[];
+}
+
+export interface ReloadResult {
+  changed: string[];
+  removed: string[];
+  preloaded: number;
+  full: boolean;
+}
+
+export interface HistoryArchiveIndex {
+  version: number;
+  total: number;
+  updated_at?: string;
+  segments: Record<string, { count: number; first_watched_at: string; last_watched_at: string; bytes: number }>;
+}
+
+export type PagedList = 'history/movies' | 'history/shows' | 'watched/movies' | 'watched/shows';
+
 export class TraktDataService {
   private static instance: TraktDataService;
   private cache = new Map<string, unknown>();
+  private manifest: DataManifest | null = null;
   private readonly dataPath = join(process.cwd(), 'public', 'data', 'json');
 
   private constructor() {}
@@ -118,6 +157,79 @@ export class TraktDataService {
     this.cache.clear();
   }
 
+  private readManifest(): DataManifest | null {
+    const fullPath = join(this.dataPath, 'manifest.json');
+    if (!existsSync(fullPath)) {
+      return null;
+    }
+
+    try {
+      return JSON.parse(readFileSync(fullPath, 'utf8')) as DataManifest;
+    } catch (error) {
+      console.error('Error loading data manifest:', error);
+      return null;
+    }
+  }
+
+  // Drop only the cached files whose content hash changed since the last reload,
+  // then preload the files the sync pipeline marked as hot
+  public reloadChanged(): ReloadResult {
+    const next = this.readManifest();
+    if (!next) {
+      // No manifest written yet: fall back to a full reset
+      this.clearCache();
+      this.manifest = null;
+      return { changed: [], removed: [], preloaded: 0, full: true };
+    }
+
+    const previous = this.manifest;
+    const changed: string[] = [];
+    const removed: string[] = [];
+
+    for (const filePath of Array.from(this.cache.keys())) {
+      const entry = next.files[filePath];
+      if (!entry) {
+        removed.push(filePath);
+        this.cache.delete(filePath);
+      } else if (!previous || previous.files[filePath]?.sha256 !== entry.sha256) {
+        changed.push(filePath);
+        this.cache.delete(filePath);
+      }
+    }
+
+    this.manifest = next;
+    let preloaded = 0;
+    for (const filePath of next.hot) {
+      if (!this.cache.has(filePath) && this.loadJsonFile(filePath) !== null) {
+        preloaded++;
+      }
+    }
+
+    return { changed, removed, preloaded, full: false };
+  }
+
+  // Pre-sorted static pages written by the sync pipeline (user/<list>/page_<n>.json)
+  public getPageManifest(list: PagedList): PageManifest | null {
+    return this.loadJsonFile<PageManifest>(`user/${list}/manifest.json`);
+  }
+
+  public getListPage<T>(list: PagedList, page: number, sort?: string | null): TraktResponse<T> | null {
+    const manifest = this.getPageManifest(list);
+    const sortInfo = manifest?.sorts[sort || manifest.default_sort];
+    if (!sortInfo || !Number.isInteger(page) || page < 1 || page > sortInfo.pages) {
+      return null;
+    }
+
+    // Pages are small and numerous, so they are read per request instead of cached
+    const fullPath = join(this.dataPath, 'user', list, sortInfo.path.replace('{n}', String(page)));
+    try {
+      return JSON.parse(readFileSync(fullPath, 'utf8')) as TraktResponse<T>;
+    } catch (error) {
+      console.error(`Error loading page ${page} of ${list}:`, error);
+      return null;
+    }
+  }
+
   // Get index data
   public getIndex(): TraktResponse<unknown> | null {
     return this.loadJsonFile<TraktResponse<unknown>>('index.json');
@@ -149,6 +261,41 @@ export class TraktDataService {
     };
   }
 
+  // Archived history for one year: only that year's monthly NDJSON segments are read
+  public getArchivedHistory(year: string, type?: 'movies' | 'shows' | null): TraktUserHistory | null {
+    const index = this.loadJsonFile<HistoryArchiveIndex>('user/history/archive/index.json');
+    if (!index) return null;
+
+    const eventType = type === 'movies' ? 'movie' : type === 'shows' ? 'episode' : null;
+    const events: HistoryItem[] = [];
+    for (const segment of Object.keys(index.segments).filter(name => name.startsWith(`${year}-`))) {
+      const fullPath = join(this.dataPath, 'user', 'history', 'archive', `${segment}.ndjson`);
+      try {
+        for (const line of readFileSync(fullPath, 'utf8').split('\n')) {
+          if (!line) continue;
+          const event = JSON.parse(line) as HistoryItem;
+          if (!eventType || event.type === eventType) {
+            events.push(event);
+          }
+        }
+      } catch (error) {
+        console.error(`Error loading history segment ${segment}:`, error);
+      }
+    }
+
+    events.sort((a, b) => b.watched_at.localeCompare(a.watched_at));
+    return {
+      metadata: {
+        fetched_at: index.updated_at ?? '',
+        source: 'history_archive',
+        username: this.getUserProfile()?.metadata.username ?? '',
+        endpoint: `user/history/archive/${year}`,
+        count: events.length,
+      },
+      data: events,
+    };
+  }
+
   // Watched
   public getUserWatchedMovies(): TraktUserWatchedMovies | null {
     return this.loadJsonFile<TraktUserWatchedMovies>('user/watched/movies.json');
@@ -158,6 +305,42 @@ export class TraktDataService {
     return this.loadJsonFile<TraktUserWatchedShows>('user/watched/shows.json');
   }
 
+  // Slim files are written by the sync; until one exists (or if writing it failed) the
+  // same projection is built from the full file, so slim readers never come up empty
+  public getUserWatchedMoviesSlim(): TraktUserWatchedMoviesSlim | null {
+    const slim = this.loadJsonFile<TraktUserWatchedMoviesSlim>('user/watched/movies.slim.json');
+    if (slim) return slim;
+
+    const full = this.getUserWatchedMovies();
+    if (!full) return null;
+    return {
+      metadata: full.metadata,
+      data: full.data.map(({ plays, last_watched_at, movie }) => ({
+        plays,
+        last_watched_at,
+        movie: { title: movie.title, year: movie.year, ids: movie.ids },
+      })),
+    };
+  }
+
+  public getUserWatchedShowsSlim(): TraktUserWatchedShowsSlim | null {
+    const slim = this.loadJsonFile<TraktUserWatchedShowsSlim>('user/watched/shows.slim.json');
+    if (slim) return slim;
+
+    const full = this.getUserWatchedShows();
+    if (!full) return null;
+    return {
+      metadata: full.metadata,
+      data: full.data.map(({ plays, last_watched_at, show, seasons = [] }) => ({
+        plays,
+        last_watched_at,
+        show: { title: show.title, year: show.year, ids: show.ids },
+        season_numbers: seasons.filter((season) => season.number > 0).map((season) => season.number),
+        episodes_watched: seasons.reduce((total, season) => total + (season.episodes?.length ?? 0), 0),
+      })),
+    };
+  }
+
   public getUserWatchedAll(): { movies: TraktUserWatchedMovies | null; shows: TraktUserWatchedShows | null } {
     return {
       movies: this.getUserWatchedMovies(),
@@ -165,6 +348,18 @@ export class TraktDataService {
     };
   }
 
+  // Show progress (materialized by the sync pipeline)
+  public getShowProgress(tmdbId: string): ShowProgress | null {
+    const progress = this.loadJsonFile<TraktShowProgress>('user/progress/shows.json');
+    return progress?.data[tmdbId] ?? null;
+  }
+
+  // Related titles (materialized by the sync pipeline)
+  public getRelated(type: RelatedTitleType, tmdbId: string): number[] | null {
+    const related = this.loadJsonFile<TraktRelatedTitles>('user/related/titles.json');
+    return related?.data[type]?.[tmdbId] ?? null;
+  }
+
   // Watchlist
   public getUserWatchlistMovies(): TraktUserWatchlist | null {
     return this.loadJsonFile<TraktUserWatchlist>('user/watchlist/movies.json');
@@ -141,6 +141,47 @@ export interface WatchedShow {
   seasons: WatchedShowSeason[];
 }
 
+// Slim projections (<file>.slim.json): ids and a few fields, without nested seasons
+export interface WatchedMovieSlim {
+  plays: number;
+  last_watched_at: string;
+  movie: Movie;
+}
+
+export interface WatchedShowSlim {
+  plays: number;
+  last_watched_at: string;
+  show: Show;
+  season_numbers: number[];
+  episodes_watched: number;
+}
+
+// Show progress table (one row per show, keyed by TMDB id)
+export interface ShowProgressEpisode {
+  season: number;
+  number: number;
+  watched_at?: string;
+}
+
+export interface ShowProgress {
+  title: string;
+  trakt: number;
+  plays: number;
+  episodes_watched: number;
+  episodes_total: number | null;
+  completed: boolean;
+  seasons: Record<string, { watched: number; total: number | null }>;
+  first_watched_at: string | null;
+  last_watched_at: string | null;
+  last_episode: ShowProgressEpisode | null;
+  next_episode: ShowProgressEpisode | null;
+  rewatches: { plays: number; episodes: number };
+}
+
+// Related titles table (TMDB ids of similar titles of the same type, best first)
+export type RelatedTitleType = 'movies' | 'shows';
+export type RelatedTitles = Record<RelatedTitleType, Record<string, number[]>>;
+
 // Watchlist Types
 export interface WatchlistItem {
   rank: number;
@@ -284,6 +325,10 @@ export type TraktUserWatchedShows = ApiResponse<WatchedShow[]>;
 export type TraktUserWatchlist = ApiResponse<WatchlistItem[]>;
 export type TraktUserComments = ApiResponse<Comment[]>;
 export type TraktUserLists = ApiResponse<UserList[]>;
+export type TraktUserWatchedMoviesSlim = ApiResponse<WatchedMovieSlim[]>;
+export type TraktUserWatchedShowsSlim = ApiResponse<WatchedShowSlim[]>;
+export type TraktShowProgress = ApiResponse<Record<string, ShowProgress>>;
+export type TraktRelatedTitles = ApiResponse<RelatedTitles>;
 
 // For backwards compatibility
 export type MovieWatchHistoryItem = HistoryItem;
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Offline Pipeline Benchmark
+
+This script measures the data pipeline against a local Trakt/TMDB stand-in server
+(see stub_api_server.py) instead of the real APIs. For each synthetic library size it runs:
+- fetch: TraktUserDataClient.fetch_all_user_data
+- download: MediaDownloader.download_all_media into an empty image tree
+- download_warm: the same download again with every image already present
+- cover: generate_cover against the stand-in site API and CDN
+
+and reports wall time, request counts (client and server side) and peak memory.
+"""
+
+import os
+import sys
+import contextlib
+import json
+import time
+import shutil
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing
+import logging
+from pathlib import Path
+from urllib.request import urlopen
+
+# Add scripts directory to path to import other modules
+sys.path.append(str(Path(__file__).parent))
+
+from stub_api_server import StubApiServer, StubState, SyntheticLibrary
+
+logger = logging.getLogger(__name__)
+
+STAGES = ['fetch', 'download', 'download_warm', 'cover']
+
+
+def serve(size, options, ready):
+    """Run the stand-in server in a child process so it does not skew memory numbers"""
+    state = StubState(SyntheticLibrary(size), **options)
+    server = StubApiServer(state)
+    ready.put(server.env())
+    server.httpd.serve_forever()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class PipelineBenchmark:
+    def __init__(self, size, workdir, server_env, request_delay=0.0, trace_memory=True):
+        self.size = size
+        self.workdir = Path(workdir)
+        self.server_env = server_env
+        self.request_delay = request_delay
+        self.trace_memory = trace_memory
+        self.server_url = server_env['TRAKT_API_BASE_URL'].rsplit('/trakt', 1)[0]
+
+    def server_stats(self, reset=False):
+        path = '/_reset' if reset else '/_stats'
+        with urlopen(f'{self.server_url}{path}') as response:
+            return json.load(response)
+
+    def measure(self, name, func):
+        """Run one stage and collect wall time, request counts and peak memory"""
+        self.server_stats(reset=True)
+        if self.trace_memory:
+            tracemalloc.start()
+
+        started = time.perf_counter()
+        metrics = func()
+        wall_time = time.perf_counter() - started
+
+        peak_traced = 0
+        if self.trace_memory:
+            peak_traced = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        result = {
+            'stage': name,
+            'wall_seconds': round(wall_time, 3),
+            'server_requests': self.server_stats(),
+            'peak_traced_mb': round(peak_traced / (1024 * 1024), 1),
+            'peak_rss_mb': peak_rss_mb()
+        }
+        if metrics is not None:
+            result['client_totals'] = metrics.summary()['totals']
+        logger.info(f"[{self.size}] {name}: {result['wall_seconds']}s, {result['server_requests']}")
+        return result
+
+    def run_fetch(self):
+        from fetch_trakt_data import TraktUserDataClient
+        from metrics import RequestMetrics
+
+        metrics = RequestMetrics()
+        TraktUserDataClient(metrics=metrics).fetch_all_user_data()
+        return metrics
+
+    def run_download(self):
+        from download_media import MediaDownloader
+        from metrics import RequestMetrics
+
+        metrics = RequestMetrics()
+        downloader = MediaDownloader(cdn_repo_path=str(self.workdir / 'cdn'), metrics=metrics)
+        downloader.request_delay = self.request_delay
+        downloader.download_all_media()
+        return metrics
+
+    def run_cover(self):
+        import generate_cover
+
+        # generate_cover reports progress with print(); keep it out of the report
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            self.render_cover(generate_cover)
+        return None
+
+    def render_cover(self, generate_cover):
+        movies_data = generate_cover.fetch_json_data(f"{generate_cover.DATA_BASE_URL}/api/trakt/user/watched?type=movies&slim=true")
+        shows_data = generate_cover.fetch_json_data(f"{generate_cover.DATA_BASE_URL}/api/trakt/user/watched?type=shows&slim=true")
+        poster_data = generate_cover.get_tmdb_poster_urls(movies_data, shows_data, generate_cover.fetch_image_layout())
+        generate_cover.create_cover_image(poster_data, str(self.workdir / 'cover.webp'))
+
+    def run(self, stages):
+        previous_cwd = os.getcwd()
+        previous_env = {key: os.environ.get(key) for key in self.server_env}
+        os.environ.update(self.server_env)
+        os.environ.setdefault('TRAKT_API_KEY', 'benchmark')
+        os.environ.setdefault('TMDB_API_KEY', 'benchmark')
+
+        runners = {
+            'fetch': self.run_fetch,
+            'download': self.run_download,
+            'download_warm': self.run_download,
+            'cover': self.run_cover
+        }
+
+        results = []
+        os.chdir(self.workdir)
+        try:
+            for stage in stages:
+                results.append(self.measure(stage, runners[stage]))
+        finally:
+            os.chdir(previous_cwd)
+            for key, value in previous_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+        return results
+
+
+def run_size(size, args):
+    """Benchmark one library size with its own server process and work directory"""
+    options = {
+        'latency_ms': args.latency_ms,
+        'error_rate': args.error_rate,
+        'retry_after': args.retry_after,
+        'trakt_limit': args.trakt_limit,
+        'tmdb_limit': args.tmdb_limit
+    }
+    ready = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(size, options, ready), daemon=True)
+    server.start()
+    workdir = Path(tempfile.mkdtemp(prefix=f'trakt-bench-{size}-'))
+    try:
+        server_env = ready.get(timeout=120)
+        benchmark = PipelineBenchmark(size, workdir, server_env, request_delay=args.request_delay,
+                                      trace_memory=not args.no_tracemalloc)
+        return {'size': size, 'stages': benchmark.run(args.stages)}
+    finally:
+        server.terminate()
+        server.join()
+        if args.keep_workdir:
+            logger.info(f"Kept work directory: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(report):
+    """Print a compact table of the results"""
+    print(f"{'size':>7} {'stage':<14} {'wall s':>9} {'trakt':>7} {'tmdb':>7} {'images':>7} "
+          f"{'429s':>5} {'traced MB':>10} {'rss MB':>8}")
+    for entry in report['results']:
+        for stage in entry['stages']:
+            requests_by_api = stage['server_requests']
+            images = sum(requests_by_api.get(api, {}).get('requests', 0) for api in ('tmdb_images', 'cdn'))
+            rate_limited = sum(api.get('rate_limited', 0) for api in requests_by_api.values())
+            print(f"{entry['size']:>7} {stage['stage']:<14} {stage['wall_seconds']:>9} "
+                  f"{requests_by_api.get('trakt', {}).get('requests', 0):>7} "
+                  f"{requests_by_api.get('tmdb', {}).get('requests', 0):>7} {images:>7} "
+                  f"{rate_limited:>5} {stage['peak_traced_mb']:>10} {stage['peak_rss_mb']:>8}")
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline against a local Trakt/TMDB stand-in')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000],
+                        help='Synthetic library sizes to run, e.g. 1000 10000 50000 (default: 1000)')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='Stages to run')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Added server latency per request')
+    parser.add_argument('--error-rate', type=float, default=0.001,
+                        help='Fraction of API requests answered with 429 (default: 0.001)')
+    parser.add_argument('--retry-after', type=int, default=0, help='Retry-After seconds on injected 429s')
+    parser.add_argument('--trakt-limit', type=int, default=1000, help='Trakt requests per 5 minutes')
+    parser.add_argument('--tmdb-limit', type=int, default=100000, help='TMDB requests per 10 seconds')
+    parser.add_argument('--request-delay', type=float, default=0.0,
+                        help='MediaDownloader delay between requests (production uses 0.25)')
+    parser.add_argument('--no-tracemalloc', action='store_true',
+                        help='Skip Python heap tracing (faster, RSS only)')
+    parser.add_argument('--keep-workdir', action='store_true', help='Keep the generated data and images')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--verbose', action='store_true', help='Show pipeline logging')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    report = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'verbose')},
+        'results': [run_size(size, args) for size in args.sizes]
+    }
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,7 +6,130 @@ TMDB_API_VERSION = "3"
 
 # Rate Limiting (requests per second)
 TRAKT_RATE_LIMIT = 1000  # requests per hour
+TRAKT_RATE_PERIOD = 3600
 TMDB_RATE_LIMIT = 40     # requests per 10 seconds
+TMDB_RATE_PERIOD = 10
+TMDB_ESTIMATED_LATENCY = 0.15  # seconds per request, used by the download planner's ETA
+
+# Batch Mode (several users synced concurrently under one rate budget)
+BATCH_MAX_WORKERS = 4
+
+# Run Metrics (per-endpoint JSON reports and Prometheus textfile)
+METRICS_DIR = "metrics"
+METRICS_KEEP_RUNS = 90   # number of run reports kept for trend charts
+
+# Stage profiling (--profile): one subdirectory per run with pstats files and a summary
+PROFILE_DIR = "profiles"
+
+# Lossless image optimization (manifest lives in the image tree so files are only processed once)
+OPTIMIZE_MANIFEST = ".optimize_manifest.json"
+
+# Image integrity scan (verify): results cache keyed by (path, size, mtime) and the queue of
+# broken files the downloader replaces on its next run, both in the image tree
+VERIFY_CACHE = ".verify_cache.json"
+REDOWNLOAD_QUEUE = ".redownload_queue.json"
+
+# Orphan image garbage collection (gc): images of titles no data file references are deleted
+# after they have been orphaned this long; first-seen dates are kept in the image tree
+GC_GRACE_DAYS = 14
+GC_STATE = ".gc_state.json"
+
+# Image tree layout for new trees: "flat" (movies/posters/17801_poster.jpg) or "hashed"
+# (movies/posters/17/80/17801_poster.jpg); $IMAGE_LAYOUT overrides it. A tree records its
+# layout in the marker file, and manage_data.py migrate-layout moves an existing tree
+IMAGE_LAYOUT = "flat"
+IMAGE_LAYOUT_MARKER = ".layout.json"
+
+# Compact media index (integer ids split into shards by id range)
+MEDIA_INDEX_SHARD_SIZE = 5000
+
+# Partial indexes of sharded downloads (--shard i/N), in this directory next to media_index.json
+MEDIA_INDEX_PARTS_DIR = "media_index_parts"
+
+# Trakt query parameters per endpoint group. "extended": "full" adds overviews, runtimes and
+# genres; for watched_shows "extended": "noseasons" drops the nested seasons and episodes
+# (the show progress table, season posters and cover seasons need them, so they are kept)
+FETCH_PROFILES = {
+    "profile": {"extended": "full"},
+    "history": {},
+    "watched_movies": {},
+    "watched_shows": {},
+    "watchlist": {},
+    "list_items": {},
+    "comments": {}
+}
+
+# Movie and episode history come from one /history request and are split locally. Each type
+# keeps the events a per-type request returns (Trakt's default page size). A page holds
+# 2 * HISTORY_ITEMS_PER_TYPE events (the bytes of both per-type requests); a type still short
+# after HISTORY_MAX_PAGES pages falls back to its own request. More pages rarely fill the short
+# type of a lopsided history and cost a request more than the fallback
+HISTORY_ITEMS_PER_TYPE = 10
+HISTORY_MAX_PAGES = 1
+
+# Related titles table (user/related/titles.json): neighbours kept per title, rows per
+# similarity matrix product, and the weight of each feature block
+RELATED_TOP_K = 12
+RELATED_BLOCK_SIZE = 512
+RELATED_WEIGHTS = {
+    "genres": 1.0,
+    "lists": 0.7,
+    "year": 0.5,
+    "runtime": 0.25,
+    "rating": 0.35
+}
+
+# Slim projections ({title, year, ids} plus a few fields) written next to these files
+SLIM_FILES = [
+    "user/history/movies.json",
+    "user/history/shows.json",
+    "user/watched/movies.json",
+    "user/watched/shows.json",
+    "user/watchlist/all.json"
+]
+
+# Pre-paginated pages (saved file -> sort orders, the first one is the default order)
+PAGE_SIZE = 50
+PAGED_FILES = {
+    "user/history/movies.json": ["watched_at", "title"],
+    "user/history/shows.json": ["watched_at", "title"],
+    "user/watched/movies.json": ["last_watched_at", "plays", "title"],
+    "user/watched/shows.json": ["last_watched_at", "plays", "title"]
+}
+
+# On-demand image proxy (image_proxy.py): images fetched on a miss are cached in
+# IMAGE_PROXY_CACHE_DIR, least recently served first out once it exceeds IMAGE_PROXY_CACHE_MB
+IMAGE_PROXY_PORT = 8787
+IMAGE_PROXY_CACHE_DIR = "image_cache"
+IMAGE_PROXY_CACHE_MB = 1024
+IMAGE_PROXY_MISS_TTL = 3600   # seconds a path TMDB has no image for is answered with 404 directly
+IMAGE_PROXY_MAX_AGE = 86400   # Cache-Control max-age of served images
+
+# Scaled posters (thumbnails.py) of the cover generator, keyed by the hash of the source
+# image; thumbnails unused for THUMBNAIL_CACHE_DAYS are pruned
+THUMBNAIL_CACHE_DIR = "thumbnail_cache"
+THUMBNAIL_CACHE_DAYS = 30
+
+# Download time budget: seconds kept back for saving season counts and the media index
+DOWNLOAD_BUDGET_RESERVE = 60
+
+# TMDB episodes per season, cached by the downloader for the show progress table
+SEASON_COUNTS_FILE = "public/data/json/tmdb/season_counts.json"
+
+# TMDB genres, year, runtime and rating per title, cached by the downloader for the related titles table
+TITLE_FEATURES_FILE = "public/data/json/tmdb/title_features.json"
+
+# Data files the site serves most often; the server preloads them after a cache reload
+HOT_DATA_FILES = [
+    "index.json",
+    "user/profile/basic.json",
+    "user/stats/overview.json",
+    "user/watched/movies.json",
+    "user/watched/shows.json",
+    "user/watchlist/all.json",
+    "user/history/movies.json",
+    "user/history/shows.json"
+]
 
 # Image Configuration
 IMAGE_SIZES = {
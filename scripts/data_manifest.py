@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Data Manifest
+
+Writes public/data/json/manifest.json after a sync so the site can tell which data files
+changed without re-reading all of them. For every JSON file it records:
+- sha256 of the payload (the file without its metadata block, whose fetched_at changes every run)
+- size in bytes
+- record count (metadata.count when present)
+
+plus the "hot" files the site serves most often, which the server preloads after a reload.
+Page files (page_<n>.json) are left out: the site reads them per request without caching.
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+DATA_MANIFEST_VERSION = 1
+
+
+def file_entry(filepath):
+    """Hash, size and record count for one data file"""
+    content = filepath.read_bytes()
+    entry = {'size': len(content)}
+    try:
+        data = json.loads(content)
+    except ValueError:
+        logger.warning(f"Manifest: {filepath} is not valid JSON")
+        entry['sha256'] = hashlib.sha256(content).hexdigest()
+        return entry
+
+    if isinstance(data, dict) and isinstance(data.get('metadata'), dict):
+        metadata = data['metadata']
+        # fetched_at changes on every sync, so only the payload is hashed
+        payload = {key: value for key, value in data.items() if key != 'metadata'}
+        if 'count' in metadata:
+            entry['count'] = metadata['count']
+    else:
+        payload = data
+    if 'count' not in entry and isinstance(payload, dict) and isinstance(payload.get('data'), list):
+        entry['count'] = len(payload['data'])
+
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    entry['sha256'] = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    return entry
+
+
+def write_data_manifest(data_dir, hot_files):
+    """Write manifest.json for every data file under data_dir; returns the manifest"""
+    data_dir = Path(data_dir)
+    files = {}
+    for root, dirs, filenames in os.walk(data_dir):
+        dirs.sort()
+        for filename in sorted(filenames):
+            if not filename.endswith('.json') or filename.startswith('page_'):
+                continue
+            filepath = Path(root) / filename
+            relative_path = filepath.relative_to(data_dir).as_posix()
+            if relative_path == MANIFEST_NAME:
+                continue
+            files[relative_path] = file_entry(filepath)
+
+    manifest = {
+        'version': DATA_MANIFEST_VERSION,
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'files': files,
+        'hot': [path for path in hot_files if path in files]
+    }
+
+    tmp_path = data_dir / f'{MANIFEST_NAME}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, data_dir / MANIFEST_NAME)
+
+    logger.info(f"Wrote data manifest for {len(files)} files ({len(manifest['hot'])} hot)")
+    return manifest
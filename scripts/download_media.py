@@ -7,9 +7,13 @@ from the JSON data fetched by the Trakt API script. It uses TMDB API for high-qu
 """
 
 import os
+import re
 import json
 import requests
 import time
+import threading
+import itertools
+from queue import PriorityQueue
 from datetime import datetime
 from dotenv import load_dotenv
 from pathlib import Path
@@ -17,6 +21,13 @@ import logging
 from urllib.parse import urlparse
 import hashlib
 
+import config
+from metrics import RequestMetrics
+from image_layout import ImageLayout, write_marker
+from media_index import write_compact_index, filter_index, merge_indexes, filename_id
+from media_items import iter_media_items, merge_items, shard_of
+from profiling import NULL_PROFILER, create_profiler
+
 # Load environment variables
 load_dotenv('../.env.local')  # Look in project root folder
 
@@ -24,20 +35,35 @@ load_dotenv('../.env.local')  # Look in project root folder
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Data files (relative to a user's data dir) whose titles get images, besides list items
+DOWNLOAD_SOURCES = [
+    'user/watchlist/movies.json',
+    'user/watchlist/all.json',
+    'user/history/movies.json',
+    'user/history/shows.json',
+    'user/watched/movies.json',
+    'user/watched/shows.json'
+]
+STREAM_END = 9  # priority tier of the stream's end marker, after every real tier
+
 class MediaDownloader:
-    def __init__(self, cdn_repo_path=None):
+    def __init__(self, cdn_repo_path=None, metrics=None, rate_limiter=None, offline=False,
+                 presence_source='scan', profiler=None, shard=None):
         self.tmdb_api_key = os.getenv('TMDB_API_KEY')
         
-        if not self.tmdb_api_key:
+        # Offline instances (e.g. the download planner) never call TMDB
+        if not self.tmdb_api_key and not offline:
             raise ValueError("TMDB_API_KEY environment variable is required for downloading images")
         
-        self.tmdb_base_url = 'https://api.themoviedb.org/3'
-        self.tmdb_image_base_url = 'https://image.tmdb.org/t/p'
+        self.tmdb_base_url = os.getenv('TMDB_API_BASE_URL', 'https://api.themoviedb.org/3')
+        self.tmdb_image_base_url = os.getenv('TMDB_IMAGE_BASE_URL', 'https://image.tmdb.org/t/p')
         
         # Image sizes for different types
         self.image_sizes = {
             'poster': 'w780',      # poster sizes: w92, w154, w185, w342, w500, w780, original
             'backdrop': 'w1280',   # backdrop sizes: w300, w780, w1280, original
+            'still': config.DEFAULT_IMAGE_SIZES['still'],      # episode stills (image proxy only)
+            'profile': config.DEFAULT_IMAGE_SIZES['profile'],  # person profiles (image proxy only)
         }
         
         # Create output directories
@@ -51,10 +77,50 @@ class MediaDownloader:
             self.images_dir = Path('public/data/imgs')
             self.media_index_path = self.images_dir / 'media_index.json'  # Save index to images dir
         
-        self.create_directory_structure()
+        # Flat or hashed directories for posters and backdrops (see image_layout.py)
+        self.layout = ImageLayout.for_tree(self.images_dir)
+        
+        # Files already on disk, loaded once on first use ('scan' walks the tree, 'index' reads media_index.json)
+        self.presence_source = presence_source
+        self.existing_files = None
+        self.presence_lock = threading.Lock()
+        self.known_dirs = set()
+        
+        # Broken files found by verify_media.py count as missing until they are replaced
+        self.redownload_queue = set()
+        self.redownloaded = set()
+        
+        self.offline = offline
+        if not offline:
+            self.create_directory_structure()
         
         # Rate limiting
         self.request_delay = 0.25  # 4 requests per second (TMDB limit is 40/10s)
+        self.rate_limiter = rate_limiter  # Shared budget replaces the fixed delay in batch mode
+        
+        # Titles already handled this run, so repeats across files and users cost nothing
+        self.processed_items = set()
+        self.processed_lock = threading.Lock()
+        
+        # Episodes per season from TMDB show details, saved for the show progress table
+        self.season_counts = {}
+        
+        # Genres, year, runtime and rating from TMDB details, saved for the related titles table;
+        # a movie's details are requested once, a show's come with the details fetched anyway
+        self.title_features = {'movies': {}, 'shows': {}}
+        self.cached_movie_features = set(self.load_title_features().get('movies', {}))
+        
+        # Monotonic time after which no new titles are started (see set_time_budget)
+        self.deadline = None
+        
+        # Per-endpoint network metrics (shared with the fetcher when run from manage_data)
+        self.metrics = metrics or RequestMetrics()
+        
+        # Per-stage CPU/memory profiling (--profile); a no-op unless enabled
+        self.profiler = profiler or NULL_PROFILER
+        
+        # (i, N) when this run only handles shard i of N (--shard), see in_shard
+        self.shard = shard
     
     def create_directory_structure(self):
         """Create organized directory structure for images"""
@@ -66,9 +132,41 @@ class MediaDownloader:
         ]
         
         for directory in directories:
-            (self.images_dir / directory).mkdir(parents=True, exist_ok=True)
+            self.ensure_dir(self.images_dir / directory)
         
-        logger.info(f"Created image directory structure in {self.images_dir}")
+        # New trees record their layout right away, so later runs never guess it
+        if not (self.images_dir / config.IMAGE_LAYOUT_MARKER).exists():
+            write_marker(self.images_dir, self.layout.name)
+        
+        logger.info(f"Created image directory structure in {self.images_dir} ({self.layout.name} layout)")
+    
+    def metrics_key(self, endpoint):
+        """Normalize a TMDB endpoint into a metrics label (ids replaced by placeholders)"""
+        key = re.sub(r'/season/\d+', '/season/{season}', endpoint)
+        key = re.sub(r'/episode/\d+', '/episode/{episode}', key)
+        return re.sub(r'^/(movie|tv|person)/\d+', r'/\1/{id}', key)
+    
+    def image_metrics_key(self, image_url):
+        """Metrics label for an image download, grouped by image size"""
+        size = urlparse(image_url).path.split('/')[-2]
+        return f'image/{size}'
+    
+    def throttle(self, metrics_key):
+        """Sleep between requests to stay under the TMDB rate limit"""
+        if self.rate_limiter:
+            self.metrics.record_sleep('tmdb', metrics_key, self.rate_limiter.acquire())
+            return
+        time.sleep(self.request_delay)
+        self.metrics.record_sleep('tmdb', metrics_key, self.request_delay)
+    
+    def claim_item(self, media_type, tmdb_id):
+        """Mark a title as handled; returns False if it was already processed this run"""
+        key = (media_type, int(tmdb_id))
+        with self.processed_lock:
+            if key in self.processed_items:
+                return False
+            self.processed_items.add(key)
+            return True
     
     def make_tmdb_request(self, endpoint, params=None):
         """Make request to TMDB API with rate limiting"""
@@ -77,14 +175,20 @@ class MediaDownloader:
         
         params['api_key'] = self.tmdb_api_key
         url = f"{self.tmdb_base_url}{endpoint}"
+        metrics_key = self.metrics_key(endpoint)
         
+        started = time.monotonic()
         try:
-            time.sleep(self.request_delay)  # Rate limiting
+            self.throttle(metrics_key)  # Rate limiting
+            started = time.monotonic()
             response = requests.get(url, params=params)
+            self.metrics.record_request('tmdb', metrics_key, time.monotonic() - started,
+                                        len(response.content), error=not response.ok)
             
             if response.status_code == 429:
                 retry_after = int(response.headers.get('Retry-After', 10))
                 logger.warning(f"TMDB rate limited. Waiting {retry_after} seconds...")
+                self.metrics.record_rate_limited('tmdb', metrics_key, retry_after)
                 time.sleep(retry_after)
                 return self.make_tmdb_request(endpoint, params)
             
@@ -92,34 +196,122 @@ class MediaDownloader:
             return response.json()
             
         except requests.exceptions.RequestException as e:
+            if getattr(e, 'response', None) is None:
+                self.metrics.record_request('tmdb', metrics_key, time.monotonic() - started, error=True)
             logger.error(f"Error fetching TMDB {endpoint}: {e}")
             return None
     
+    def load_presence_index(self):
+        """Snapshot the files already in the image tree with one scan (or from the media index)"""
+        existing_files = set()
+        
+        if self.presence_source == 'index' and self.media_index_path.exists():
+            with open(self.media_index_path, 'r', encoding='utf-8') as f:
+                media_index = json.load(f)
+            for media_type in ('movies', 'shows'):
+                for category in ('posters', 'backdrops'):
+                    for filename in media_index.get(media_type, {}).get(category, []):
+                        tmdb_id = filename_id(filename)
+                        if tmdb_id is not None:
+                            existing_files.add(f'{self.layout.category_dir(media_type, category, tmdb_id)}/{filename}')
+            for show_id, seasons in media_index.get('shows', {}).get('season_posters', {}).items():
+                for season_number, filenames in seasons.items():
+                    season_dir = self.layout.season_dir(show_id, season_number)
+                    self.known_dirs.add(self.images_dir / season_dir)
+                    for filename in filenames:
+                        existing_files.add(f'{season_dir}/{filename}')
+            source = f'media index {self.media_index_path}'
+        else:
+            for root, dirs, files in os.walk(self.images_dir):
+                self.known_dirs.add(Path(root))
+                relative_root = Path(root).relative_to(self.images_dir).as_posix()
+                prefix = '' if relative_root == '.' else f'{relative_root}/'
+                for filename in files:
+                    existing_files.add(prefix + filename)
+            source = f'scan of {self.images_dir}'
+        
+        logger.info(f"Loaded {len(existing_files)} existing files from {source}")
+        
+        self.redownload_queue = self.load_redownload_queue()
+        if self.redownload_queue:
+            logger.info(f"{len(self.redownload_queue)} broken files are queued for re-download")
+        return existing_files - self.redownload_queue
+    
+    def load_redownload_queue(self):
+        """Relative paths of the broken files verify_media.py queued"""
+        queue_path = self.images_dir / config.REDOWNLOAD_QUEUE
+        if not queue_path.exists():
+            return set()
+        with open(queue_path, 'r', encoding='utf-8') as f:
+            return set(json.load(f).get('files', []))
+    
+    def update_redownload_queue(self):
+        """Drop the queued files that were replaced this run"""
+        if not self.redownloaded:
+            return
+        queue_path = self.images_dir / config.REDOWNLOAD_QUEUE
+        remaining = sorted(self.redownload_queue - self.redownloaded)
+        with open(queue_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': remaining, 'last_updated': datetime.now().isoformat()}, f, indent=2)
+        logger.info(f"Replaced {len(self.redownloaded)} broken files, {len(remaining)} still queued")
+    
+    def has_file(self, filepath):
+        """Check the presence snapshot instead of stat-ing the file"""
+        with self.presence_lock:
+            if self.existing_files is None:
+                self.existing_files = self.load_presence_index()
+        return Path(filepath).relative_to(self.images_dir).as_posix() in self.existing_files
+    
+    def ensure_dir(self, directory):
+        """Create a directory once per run"""
+        if directory not in self.known_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            self.known_dirs.add(directory)
+    
     def download_image(self, image_url, filepath):
-        """Download image from URL"""
+        """Download image from URL unless it is already in the image tree"""
+        if self.has_file(filepath):
+            logger.debug(f"Image already exists: {filepath}")
+            self.metrics.record_cache_hit('tmdb', self.image_metrics_key(image_url))
+            return True
+        
+        if not self.fetch_image(image_url, filepath):
+            return False
+        
+        relative_path = filepath.relative_to(self.images_dir).as_posix()
+        self.existing_files.add(relative_path)
+        if relative_path in self.redownload_queue:
+            self.redownloaded.add(relative_path)
+        return True
+    
+    def fetch_image(self, image_url, filepath):
+        """Download one image to filepath (no presence check); returns False on errors"""
+        metrics_key = self.image_metrics_key(image_url)
+        started = time.monotonic()
         try:
-            # Check if file already exists
-            if filepath.exists():
-                logger.debug(f"Image already exists: {filepath}")
-                return True
-            
-            time.sleep(self.request_delay)  # Rate limiting
+            self.throttle(metrics_key)  # Rate limiting
+            started = time.monotonic()
             response = requests.get(image_url, stream=True)
             response.raise_for_status()
             
             # Create directory if it doesn't exist
-            filepath.parent.mkdir(parents=True, exist_ok=True)
+            self.ensure_dir(filepath.parent)
             
-            # Download image
-            with open(filepath, 'wb') as f:
+            # Download image (to a temporary name, so an interrupted download never looks complete)
+            nbytes = 0
+            tmp_path = filepath.with_name(f'.{filepath.name}.part')
+            with open(tmp_path, 'wb') as f:
                 for chunk in response.iter_content(chunk_size=8192):
                     f.write(chunk)
+                    nbytes += len(chunk)
+            os.replace(tmp_path, filepath)
             
+            self.metrics.record_request('tmdb', metrics_key, time.monotonic() - started, nbytes)
             logger.info(f"Downloaded: {filepath}")
-            
             return True
             
         except Exception as e:
+            self.metrics.record_request('tmdb', metrics_key, time.monotonic() - started, error=True)
             logger.error(f"Error downloading {image_url}: {e}")
             return False
     
@@ -153,7 +345,29 @@ class MediaDownloader:
         
         return {
             'seasons': show_data.get('seasons', []),
-            'number_of_seasons': show_data.get('number_of_seasons', 0)
+            'number_of_seasons': show_data.get('number_of_seasons', 0),
+            'features': self.title_features_of(show_data, 'first_air_date',
+                                               (show_data.get('episode_run_time') or [None])[0])
+        }
+    
+    def get_movie_details(self, tmdb_id):
+        """Get movie details (for the related titles features)"""
+        movie_data = self.make_tmdb_request(f'/movie/{tmdb_id}')
+        if not movie_data:
+            return None
+        
+        return {
+            'features': self.title_features_of(movie_data, 'release_date', movie_data.get('runtime'))
+        }
+    
+    def title_features_of(self, details, date_field, runtime):
+        """Related titles features of a movie or show from its TMDB details"""
+        date = details.get(date_field) or ''
+        return {
+            'year': int(date[:4]) if date[:4].isdigit() else None,
+            'runtime': runtime or None,
+            'rating': details.get('vote_average') or None,
+            'genres': sorted(genre['name'] for genre in details.get('genres', []) if genre.get('name'))
         }
     
     def get_season_images(self, tmdb_id, season_number):
@@ -166,21 +380,53 @@ class MediaDownloader:
             'posters': images_data.get('posters', [])
         }
     
-    def download_movie_images(self, movie_data):
-        """Download images for a movie"""
-        tmdb_id = None
-        
-        # Extract TMDB ID from different possible structures
-        if isinstance(movie_data, dict):
-            if 'ids' in movie_data:
-                tmdb_id = movie_data['ids'].get('tmdb')
-            elif 'movie' in movie_data and 'ids' in movie_data['movie']:
-                tmdb_id = movie_data['movie']['ids'].get('tmdb')
-            elif 'tmdb' in movie_data:
-                tmdb_id = movie_data['tmdb']
-        
-        if not tmdb_id:
-            logger.warning(f"No TMDB ID found for movie: {movie_data}")
+    def get_episode_images(self, tmdb_id, season_number, episode_number):
+        """Get episode stills from TMDB"""
+        images_data = self.make_tmdb_request(f'/tv/{tmdb_id}/season/{season_number}/episode/{episode_number}/images')
+        if not images_data:
+            return None
+        
+        return {
+            'stills': images_data.get('stills', [])
+        }
+    
+    def get_person_images(self, person_id):
+        """Get profile pictures of a person (cast and crew) from TMDB"""
+        images_data = self.make_tmdb_request(f'/person/{person_id}/images')
+        if not images_data:
+            return None
+        
+        return {
+            'profiles': images_data.get('profiles', [])
+        }
+    
+    def image_paths(self, media_type, tmdb_id):
+        """Paths of the main poster and backdrop for a movie ('movies') or show ('shows')"""
+        return (self.images_dir / self.layout.image_path(media_type, 'poster', tmdb_id),
+                self.images_dir / self.layout.image_path(media_type, 'backdrop', tmdb_id))
+    
+    def season_poster_path(self, tmdb_id, season_number):
+        """Path of a season poster: shows/posters/[id]/[season]/season_[n]_poster.jpg (flat layout)"""
+        return self.images_dir / self.layout.season_poster_path(tmdb_id, season_number)
+    
+    def download_movie_images(self, item):
+        """Download images for a movie (a MediaItem)"""
+        tmdb_id = item.tmdb_id
+        
+        if not self.claim_item('movie', tmdb_id):
+            logger.debug(f"Movie TMDB ID {tmdb_id} already processed")
+            return
+        
+        # Features are requested once per movie, whether or not its images are missing
+        if str(tmdb_id) not in self.cached_movie_features:
+            movie_details = self.get_movie_details(tmdb_id)
+            if movie_details:
+                self.title_features['movies'][str(tmdb_id)] = movie_details['features']
+        
+        poster_path, backdrop_path = self.image_paths('movies', tmdb_id)
+        if self.has_file(poster_path) and self.has_file(backdrop_path):
+            logger.debug(f"All images present for movie TMDB ID: {tmdb_id}")
+            self.metrics.record_cache_hit('tmdb', '/movie/{id}/images')
             return
         
         logger.info(f"Downloading images for movie TMDB ID: {tmdb_id}")
@@ -193,58 +439,52 @@ class MediaDownloader:
         for i, poster in enumerate(images['posters'][:1]):  # Limit to 1 poster
             if poster.get('file_path'):
                 image_url = f"{self.tmdb_image_base_url}/{self.image_sizes['poster']}{poster['file_path']}"
-                filename = f"{tmdb_id}_poster.jpg"
-                filepath = self.images_dir / 'movies' / 'posters' / filename
-                self.download_image(image_url, filepath)
+                self.download_image(image_url, poster_path)
         
         # Download backdrops
         for i, backdrop in enumerate(images['backdrops'][:1]):  # Limit to 1 backdrop
             if backdrop.get('file_path'):
                 image_url = f"{self.tmdb_image_base_url}/{self.image_sizes['backdrop']}{backdrop['file_path']}"
-                filename = f"{tmdb_id}_backdrop.jpg"
-                filepath = self.images_dir / 'movies' / 'backdrops' / filename
-                self.download_image(image_url, filepath)
-    
-    def download_show_images(self, show_data):
-        """Download images for a TV show including season posters"""
-        tmdb_id = None
-        
-        # Extract TMDB ID from different possible structures
-        if isinstance(show_data, dict):
-            if 'ids' in show_data:
-                tmdb_id = show_data['ids'].get('tmdb')
-            elif 'show' in show_data and 'ids' in show_data['show']:
-                tmdb_id = show_data['show']['ids'].get('tmdb')
-            elif 'tmdb' in show_data:
-                tmdb_id = show_data['tmdb']
-        
-        if not tmdb_id:
-            logger.warning(f"No TMDB ID found for show: {show_data}")
+                self.download_image(image_url, backdrop_path)
+    
+    def download_show_images(self, item):
+        """Download images for a TV show (a MediaItem) including season posters"""
+        tmdb_id = item.tmdb_id
+        
+        if not self.claim_item('show', tmdb_id):
+            logger.debug(f"Show TMDB ID {tmdb_id} already processed")
             return
         
         logger.info(f"Downloading images for show TMDB ID: {tmdb_id}")
         
         # Download main show images
-        images = self.get_show_images(tmdb_id)
+        poster_path, backdrop_path = self.image_paths('shows', tmdb_id)
+        if self.has_file(poster_path) and self.has_file(backdrop_path):
+            self.metrics.record_cache_hit('tmdb', '/tv/{id}/images')
+            images = None
+        else:
+            images = self.get_show_images(tmdb_id)
         if images:
             # Download main show poster
             for i, poster in enumerate(images['posters'][:1]):  # Limit to 1 poster
                 if poster.get('file_path'):
                     image_url = f"{self.tmdb_image_base_url}/{self.image_sizes['poster']}{poster['file_path']}"
-                    filename = f"{tmdb_id}_poster.jpg"
-                    filepath = self.images_dir / 'shows' / 'posters' / filename
-                    self.download_image(image_url, filepath)
+                    self.download_image(image_url, poster_path)
             
             # Download backdrops
             for i, backdrop in enumerate(images['backdrops'][:1]):  # Limit to 1 backdrop
                 if backdrop.get('file_path'):
                     image_url = f"{self.tmdb_image_base_url}/{self.image_sizes['backdrop']}{backdrop['file_path']}"
-                    filename = f"{tmdb_id}_backdrop.jpg"
-                    filepath = self.images_dir / 'shows' / 'backdrops' / filename
-                    self.download_image(image_url, filepath)
+                    self.download_image(image_url, backdrop_path)
         
-        # Get show details to find seasons
+        # Get show details to find seasons (new seasons can appear at any time)
         show_details = self.get_show_details(tmdb_id)
+        if show_details:
+            self.season_counts[str(tmdb_id)] = {
+                str(season['season_number']): season.get('episode_count', 0)
+                for season in show_details['seasons'] if season.get('season_number') is not None
+            }
+            self.title_features['shows'][str(tmdb_id)] = show_details['features']
         if show_details and show_details['seasons']:
             logger.info(f"Found {len(show_details['seasons'])} seasons for show {tmdb_id}")
             
@@ -253,9 +493,11 @@ class MediaDownloader:
                 if season_number is None:
                     continue
                 
-                # Create dynamic folder structure: shows/posters/[id]/[season]/
-                season_dir = self.images_dir / 'shows' / 'posters' / str(tmdb_id) / str(season_number)
-                season_dir.mkdir(parents=True, exist_ok=True)
+                # Dynamic folder structure: shows/posters/[id]/[season]/ (under the id's buckets when hashed)
+                filepath = self.season_poster_path(tmdb_id, season_number)
+                if self.has_file(filepath):
+                    self.metrics.record_cache_hit('tmdb', '/tv/{id}/season/{season}/images')
+                    continue
                 
                 # Download season poster
                 season_images = self.get_season_images(tmdb_id, season_number)
@@ -263,50 +505,259 @@ class MediaDownloader:
                     for i, poster in enumerate(season_images['posters'][:1]):  # Limit to 1 poster per season
                         if poster.get('file_path'):
                             image_url = f"{self.tmdb_image_base_url}/{self.image_sizes['poster']}{poster['file_path']}"
-                            filename = f"season_{season_number}_poster.jpg"
-                            filepath = season_dir / filename
-                            
-                            # Check if file already exists to avoid duplicates
-                            if not filepath.exists():
-                                self.download_image(image_url, filepath)
-                            else:
-                                logger.debug(f"Season poster already exists: {filepath}")
+                            self.download_image(image_url, filepath)
                 else:
                     logger.debug(f"No season poster found for show {tmdb_id}, season {season_number}")
     
-    def process_json_file(self, json_file_path):
-        """Process a JSON file and download images for items in it"""
-        try:
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Extract actual data (handle metadata wrapper)
-            if isinstance(data, dict) and 'data' in data:
-                items = data['data']
+    def iter_json_items(self, json_file_path):
+        """Yield a MediaItem for every title in a JSON file (the raw data is dropped after parsing)"""
+        with open(json_file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        yield from iter_media_items(data, json_file_path)
+    
+    def is_download_source(self, relative_path):
+        """Whether a data file (relative to the data dir) references titles with images"""
+        relative_path = Path(relative_path).as_posix()
+        return relative_path in DOWNLOAD_SOURCES or (
+            relative_path.startswith('user/lists/') and relative_path.endswith('_items.json'))
+    
+    def json_files(self, data_dir):
+        """JSON files in a user's data tree that reference titles with images"""
+        data_dir = Path(data_dir)
+        
+        files = []
+        for json_file in DOWNLOAD_SOURCES:
+            json_path = data_dir / json_file
+            if json_path.exists():
+                files.append(json_path)
             else:
-                items = data
-            
-            if not isinstance(items, list):
-                items = [items]
-            
-            for item in items:
-                if isinstance(item, dict):
-                    # Check if it's a movie
-                    if 'movie' in item or (item.get('type') == 'movie'):
-                        self.download_movie_images(item)
-                    # Check if it's a show
-                    elif 'show' in item or (item.get('type') == 'show'):
-                        self.download_show_images(item)
-                    # Check if it has direct movie/show data
-                    elif 'ids' in item:
-                        # Try to determine type from context or filename
-                        if 'movie' in str(json_file_path).lower():
-                            self.download_movie_images(item)
-                        elif 'show' in str(json_file_path).lower():
-                            self.download_show_images(item)
+                logger.warning(f"JSON file not found: {json_path}")
         
+        # Process list items
+        lists_dir = data_dir / 'user' / 'lists'
+        if lists_dir.exists():
+            files.extend(sorted(lists_dir.glob('*_items.json')))
+        
+        return files
+    
+    def in_shard(self, tmdb_id):
+        """Whether a title belongs to this run's shard (always true without --shard)"""
+        return self.shard is None or shard_of(tmdb_id, self.shard[1]) == self.shard[0]
+    
+    def prioritized_items(self, data_dir, json_paths=None):
+        """One MediaItem per title of a user's data tree (or of json_paths), most important first"""
+        items = []
+        for json_path in (self.json_files(data_dir) if json_paths is None else json_paths):
+            try:
+                items.extend(item for item in self.iter_json_items(json_path) if self.in_shard(item.tmdb_id))
+            except Exception as e:
+                logger.error(f"Error reading {json_path}: {e}")
+        return merge_items(items)
+    
+    def out_of_time(self):
+        """True once the time budget (minus the reserve for saving the index) is used up"""
+        return self.deadline is not None and time.monotonic() >= self.deadline
+    
+    def set_time_budget(self, seconds):
+        """Stop starting new titles after `seconds`, keeping time to save the index"""
+        self.deadline = time.monotonic() + max(0, seconds - config.DOWNLOAD_BUDGET_RESERVE)
+    
+    def download_item(self, item):
+        """Download the images of one queued title, logging instead of raising"""
+        try:
+            if item.media_type == 'movie':
+                self.download_movie_images(item)
+            else:
+                self.download_show_images(item)
         except Exception as e:
-            logger.error(f"Error processing {json_file_path}: {e}")
+            logger.error(f"Error processing {item.media_type} {item.tmdb_id}: {e}")
+    
+    def process_items(self, queue):
+        """Download a prioritized queue; returns False when the time budget ran out first"""
+        with self.profiler.stage('download.process_items'):
+            for done, item in enumerate(queue):
+                if self.out_of_time():
+                    logger.warning(f"Time budget reached: {len(queue) - done} of {len(queue)} items left "
+                                  f"for the next run")
+                    return False
+                self.download_item(item)
+        return True
+    
+    def process_data_dir(self, data_dir):
+        """Download images for every title in one user's JSON data tree, in priority order.
+        Returns False when the time budget ran out before every title was processed."""
+        with self.profiler.stage('download.build_queue'):
+            queue = self.prioritized_items(data_dir)
+        logger.info(f"Processing {len(queue)} items from {data_dir} in priority order")
+        return self.process_items(queue)
+    
+    def start_stream(self):
+        """Start a worker thread that downloads titles while the fetcher is still running.
+        Feed it with submit_items (the fetcher's on_save callback) and end it with finish_stream."""
+        self.stream_queue = PriorityQueue()
+        self.stream_sequence = itertools.count()
+        self.streamed_files = set()
+        self.stream_completed = True
+        self.stream_worker = threading.Thread(target=self.stream_worker_loop, name='media-stream', daemon=True)
+        self.stream_worker.start()
+    
+    def submit_items(self, relative_path, data):
+        """Queue the titles of a data file the fetcher just saved (items arrive in memory)"""
+        if not self.is_download_source(relative_path):
+            return
+        self.streamed_files.add(Path(relative_path).as_posix())
+        for item in merge_items(item for item in iter_media_items(data, relative_path) if self.in_shard(item.tmdb_id)):
+            # A more important title submitted later still jumps ahead of queued ones
+            self.stream_queue.put((item.priority, next(self.stream_sequence), item))
+    
+    def stream_worker_loop(self):
+        """Download queued titles, most important first, until the end marker arrives"""
+        # cProfile only sees its own thread, so the worker's downloads are a stage of their own
+        with self.profiler.stage('download.stream_worker', concurrent=True):
+            while True:
+                _, _, item = self.stream_queue.get()
+                if item is None:
+                    return
+                if self.out_of_time():
+                    # Keep draining so finish_stream returns promptly
+                    self.stream_completed = False
+                    continue
+                self.download_item(item)
+    
+    def finish_stream(self, data_dir=None, abort=False):
+        """Wait for the streamed titles, then process sources the fetcher did not rewrite this run
+        (such as unchanged lists). Returns False when the time budget ran out first."""
+        if abort:
+            self.deadline = time.monotonic()
+        self.stream_queue.put(((STREAM_END,), next(self.stream_sequence), None))
+        self.stream_worker.join()
+        if abort:
+            return False
+        
+        data_dir = Path(data_dir)
+        remaining = [path for path in self.json_files(data_dir)
+                     if path.relative_to(data_dir).as_posix() not in self.streamed_files]
+        if remaining:
+            logger.info(f"Processing {len(remaining)} data files that were not streamed")
+        completed = self.process_items(self.prioritized_items(data_dir, remaining))
+        return self.stream_completed and completed
+    
+    def plan_downloads(self, data_dir=None):
+        """Estimate the remaining download work from local files only (no network calls)"""
+        items = self.prioritized_items(data_dir or self.data_dir)
+        movies = {item.tmdb_id for item in items if item.media_type == 'movie'}
+        # Seasons we know about locally: watched seasons and history episodes
+        shows = {item.tmdb_id: item.seasons for item in items if item.media_type == 'show'}
+        
+        missing = {'movies/posters': 0, 'movies/backdrops': 0, 'shows/posters': 0,
+                   'shows/backdrops': 0, 'shows/season_posters': 0}
+        api_calls = 0
+        shows_without_seasons = 0
+        
+        for tmdb_id in movies:
+            poster_path, backdrop_path = self.image_paths('movies', tmdb_id)
+            missing_poster, missing_backdrop = not self.has_file(poster_path), not self.has_file(backdrop_path)
+            missing['movies/posters'] += missing_poster
+            missing['movies/backdrops'] += missing_backdrop
+            api_calls += (missing_poster or missing_backdrop) + (str(tmdb_id) not in self.cached_movie_features)
+        
+        for tmdb_id, seasons in shows.items():
+            poster_path, backdrop_path = self.image_paths('shows', tmdb_id)
+            missing_poster, missing_backdrop = not self.has_file(poster_path), not self.has_file(backdrop_path)
+            missing['shows/posters'] += missing_poster
+            missing['shows/backdrops'] += missing_backdrop
+            api_calls += (missing_poster or missing_backdrop) + 1  # images (if needed) + details
+            if not seasons:
+                shows_without_seasons += 1
+            missing_seasons = sum(1 for season in seasons if not self.has_file(self.season_poster_path(tmdb_id, season)))
+            missing['shows/season_posters'] += missing_seasons
+            api_calls += missing_seasons
+        
+        downloads = sum(missing.values())
+        seconds_per_request = self.request_delay + config.TMDB_ESTIMATED_LATENCY
+        return {
+            'movies': len(movies),
+            'shows': len(shows),
+            'missing': missing,
+            'api_calls': api_calls,
+            'downloads': downloads,
+            'shows_without_season_info': shows_without_seasons,
+            'eta_seconds': round((api_calls + downloads) * seconds_per_request)
+        }
+    
+    def save_season_counts(self):
+        """Merge this run's season episode counts into the shared season counts file"""
+        if not self.season_counts:
+            return
+        
+        counts_path = Path(config.SEASON_COUNTS_FILE)
+        counts = {}
+        if counts_path.exists():
+            with open(counts_path, 'r', encoding='utf-8') as f:
+                counts = json.load(f).get('data', {})
+        counts.update(self.season_counts)
+        
+        output = {
+            'metadata': {
+                'updated_at': datetime.now().isoformat(),
+                'source': 'tmdb_show_details',
+                'count': len(counts)
+            },
+            'data': dict(sorted(counts.items(), key=lambda x: int(x[0])))
+        }
+        counts_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(counts_path, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2)
+        
+        logger.info(f"Saved season counts for {len(self.season_counts)} shows to {counts_path}")
+    
+    def load_title_features(self):
+        """{'movies': {tmdb_id: features}, 'shows': {...}} saved by earlier runs"""
+        features_path = Path(config.TITLE_FEATURES_FILE)
+        if not features_path.exists():
+            return {}
+        with open(features_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('data', {})
+    
+    def save_title_features(self):
+        """Merge this run's TMDB title features into the shared title features file"""
+        if not any(self.title_features.values()):
+            return
+        
+        features = self.load_title_features()
+        for media_type, new_features in self.title_features.items():
+            features.setdefault(media_type, {}).update(new_features)
+        
+        output = {
+            'metadata': {
+                'updated_at': datetime.now().isoformat(),
+                'source': 'tmdb_details',
+                'count': {media_type: len(entries) for media_type, entries in features.items()}
+            },
+            'data': {media_type: dict(sorted(entries.items(), key=lambda x: int(x[0])))
+                     for media_type, entries in features.items()}
+        }
+        features_path = Path(config.TITLE_FEATURES_FILE)
+        features_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(features_path, 'w', encoding='utf-8') as f:
+            json.dump(output, f, separators=(',', ':'))
+        
+        self.cached_movie_features.update(self.title_features['movies'])
+        logger.info(f"Saved features for {len(self.title_features['movies'])} movies and "
+                   f"{len(self.title_features['shows'])} shows to {features_path}")
+    
+    def save_results(self):
+        """Save the season counts, title features and media index after a download run
+        (a sharded run saves them into its partial index instead)"""
+        self.update_redownload_queue()
+        with self.profiler.stage('download.create_media_index'):
+            if self.shard:
+                self.write_partial_index()
+            else:
+                self.save_season_counts()
+                self.save_title_features()
+                self.create_media_index()
     
     def download_all_media(self):
         """Download all media files based on JSON data"""
@@ -317,40 +768,24 @@ class MediaDownloader:
             logger.error(f"JSON data directory not found: {self.data_dir}")
             return
         
-        # Process different types of JSON files
-        json_files_to_process = [
-            'user/watchlist/movies.json',
-            'user/watchlist/all.json',
-            'user/history/movies.json',
-            'user/history/shows.json',
-            'user/watched/movies.json',
-            'user/watched/shows.json'
-        ]
-        
-        for json_file in json_files_to_process:
-            json_path = self.data_dir / json_file
-            if json_path.exists():
-                logger.info(f"Processing: {json_file}")
-                self.process_json_file(json_path)
-            else:
-                logger.warning(f"JSON file not found: {json_path}")
-        
-        # Process list items
-        lists_dir = self.data_dir / 'user' / 'lists'
-        if lists_dir.exists():
-            for list_file in lists_dir.glob('*_items.json'):
-                logger.info(f"Processing list: {list_file.name}")
-                self.process_json_file(list_file)
-        
-        # Create media index
-        self.create_media_index()
+        # Whatever was downloaded before the time budget ran out is still indexed
+        completed = self.process_data_dir(self.data_dir)
+        self.save_results()
         
-        logger.info("Media download process completed!")
+        if completed:
+            logger.info("Media download process completed!")
+        else:
+            logger.info("Media download stopped at the time budget; the next run picks up the rest")
     
     def create_media_index(self):
         """Create an index of all downloaded media files"""
+        self.write_media_index(self.build_media_index())
+    
+    def build_media_index(self):
+        """Scan the image tree into a media_index.json structure"""
         media_index = {
             'last_updated': datetime.now().isoformat(),
+            'layout': self.layout.name,
             'movies': {
                 'posters': [],
                 'backdrops': []
@@ -362,54 +797,123 @@ class MediaDownloader:
             }
         }
         
-        # Index movie images
+        # Index movie images (directly in the category directory, or in its buckets when hashed)
         movies_dir = self.images_dir / 'movies'
-        if movies_dir.exists():
-            for poster in (movies_dir / 'posters').glob('*.jpg'):
-                media_index['movies']['posters'].append(poster.name)
-            for backdrop in (movies_dir / 'backdrops').glob('*.jpg'):
-                media_index['movies']['backdrops'].append(backdrop.name)
+        for category in ('posters', 'backdrops'):
+            for bucket_dir in self.layout.bucket_dirs(movies_dir / category):
+                for image in bucket_dir.glob('*.jpg'):
+                    media_index['movies'][category].append(image.name)
         
         # Index show images
         shows_dir = self.images_dir / 'shows'
-        if shows_dir.exists():
-            # Main show posters (direct files in shows/posters/)
-            for poster in (shows_dir / 'posters').glob('*.jpg'):
-                media_index['shows']['posters'].append(poster.name)
-            
-            # Season posters (in subdirectories shows/posters/[id]/[season]/)
-            posters_dir = shows_dir / 'posters'
-            if posters_dir.exists():
-                for show_id_dir in posters_dir.iterdir():
-                    if show_id_dir.is_dir() and show_id_dir.name.isdigit():
-                        show_id = show_id_dir.name
-                        media_index['shows']['season_posters'][show_id] = {}
-                        
-                        for season_dir in show_id_dir.iterdir():
-                            if season_dir.is_dir():
-                                season_number = season_dir.name
-                                season_posters = []
-                                for poster in season_dir.glob('*.jpg'):
-                                    season_posters.append(poster.name)
-                                
-                                if season_posters:
-                                    media_index['shows']['season_posters'][show_id][season_number] = season_posters
-            
-            # Show backdrops
-            for backdrop in (shows_dir / 'backdrops').glob('*.jpg'):
-                media_index['shows']['backdrops'].append(backdrop.name)
+        for category in ('posters', 'backdrops'):
+            for bucket_dir in self.layout.bucket_dirs(shows_dir / category):
+                for image in bucket_dir.glob('*.jpg'):
+                    media_index['shows'][category].append(image.name)
+        
+        # Season posters (in show subdirectories next to the main posters: [id]/[season]/)
+        for bucket_dir in self.layout.bucket_dirs(shows_dir / 'posters'):
+            for show_id_dir in bucket_dir.iterdir():
+                if show_id_dir.is_dir() and show_id_dir.name.isdigit():
+                    show_id = show_id_dir.name
+                    media_index['shows']['season_posters'][show_id] = {}
+                    
+                    for season_dir in show_id_dir.iterdir():
+                        if season_dir.is_dir():
+                            season_number = season_dir.name
+                            season_posters = []
+                            for poster in season_dir.glob('*.jpg'):
+                                season_posters.append(poster.name)
+                            
+                            if season_posters:
+                                media_index['shows']['season_posters'][show_id][season_number] = season_posters
         
-        # Save index
+        return media_index
+    
+    def write_media_index(self, media_index):
+        """Save media_index.json and its compact shards"""
         # Ensure the directory exists for media_index.json
         self.media_index_path.parent.mkdir(parents=True, exist_ok=True)
         
         with open(self.media_index_path, 'w', encoding='utf-8') as f:
             json.dump(media_index, f, indent=2)
         
+        # Compact integer shards next to the full index, for lookups that need a few KB
+        write_compact_index(media_index, self.media_index_path.parent / 'media_index',
+                            config.MEDIA_INDEX_SHARD_SIZE)
+        
         logger.info(f"Created media index: {self.media_index_path}")
         logger.info(f"Indexed {len(media_index['movies']['posters'])} movie posters, "
                    f"{len(media_index['shows']['posters'])} show posters, "
                    f"{len(media_index['shows']['season_posters'])} shows with season posters")
+    
+    def partial_index_path(self, shard):
+        """Partial index of shard (i, N): media_index_parts/part_<i>_of_<N>.json next to the index"""
+        return self.media_index_path.parent / config.MEDIA_INDEX_PARTS_DIR / f'part_{shard[0]}_of_{shard[1]}.json'
+    
+    def write_partial_index(self):
+        """Save the images, season counts and title features of this run's shard for merge_partial_indexes"""
+        shard_index, shard_count = self.shard
+        media_index = filter_index(self.build_media_index(),
+                                   lambda tmdb_id: shard_of(tmdb_id, shard_count) == shard_index)
+        output = {
+            'shard': {'index': shard_index, 'count': shard_count},
+            'media_index': media_index,
+            'season_counts': self.season_counts,
+            'title_features': self.title_features
+        }
+        
+        partial_path = self.partial_index_path(self.shard)
+        partial_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(partial_path, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2)
+        
+        logger.info(f"Saved partial index for shard {shard_index}/{shard_count}: {partial_path}")
+        return partial_path
+    
+    def merge_partial_indexes(self, parts_dir=None):
+        """Combine the partial indexes of every shard into media_index.json, the season counts and
+        the title features.
+        Returns False (and writes nothing) unless all shards 1..N of one run are present."""
+        parts_dir = Path(parts_dir) if parts_dir else self.media_index_path.parent / config.MEDIA_INDEX_PARTS_DIR
+        partials = {}
+        for partial_path in sorted(parts_dir.glob('part_*_of_*.json')):
+            with open(partial_path, 'r', encoding='utf-8') as f:
+                partial = json.load(f)
+            partials[(partial['shard']['index'], partial['shard']['count'])] = partial
+        
+        shard_counts = {shard_count for _, shard_count in partials}
+        if len(shard_counts) != 1:
+            logger.error(f"Need the partial indexes of exactly one sharded run in {parts_dir}, "
+                        f"found shard counts {sorted(shard_counts)}")
+            return False
+        shard_count = shard_counts.pop()
+        missing = [i for i in range(1, shard_count + 1) if (i, shard_count) not in partials]
+        if missing:
+            logger.error(f"Missing partial indexes for shards {missing} of {shard_count} in {parts_dir}")
+            return False
+        
+        self.write_media_index(merge_indexes([partial['media_index'] for partial in partials.values()]))
+        for partial in partials.values():
+            self.season_counts.update(partial['season_counts'])
+            for media_type, features in partial.get('title_features', {}).items():
+                self.title_features[media_type].update(features)
+        self.save_season_counts()
+        self.save_title_features()
+        logger.info(f"Merged {shard_count} partial indexes from {parts_dir}")
+        return True
+
+def parse_shard(value):
+    """'i/N' -> (i, N) with 1 <= i <= N"""
+    import argparse
+    
+    try:
+        shard_index, shard_count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like i/N, got {value!r}")
+    if not 1 <= shard_index <= shard_count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and N, got {value!r}")
+    return shard_index, shard_count
 
 def main():
     """Main function"""
@@ -418,16 +922,34 @@ def main():
     parser = argparse.ArgumentParser(description='Download media files for Trakt data')
     parser.add_argument('--cdn-repo-path', 
                        help='Path to the CDN repository where images will be stored')
+    parser.add_argument('--metrics-dir',
+                       help='Write a per-endpoint metrics report for this run to this directory')
+    parser.add_argument('--time-budget', type=float,
+                       help='Stop starting new downloads after this many seconds and save the index')
+    parser.add_argument('--shard', type=parse_shard,
+                       help='Only download titles of shard i of N (e.g. 2/4, by a stable hash of the TMDB id) '
+                            'and write a partial index; combine them with "manage_data.py merge-index"')
+    parser.add_argument('--profile', nargs='?', const=config.PROFILE_DIR,
+                       help=f'Profile each download stage (cProfile + tracemalloc) into this directory '
+                            f'(default: {config.PROFILE_DIR})')
     
     args = parser.parse_args()
     
+    profiler = create_profiler(args.profile, 'download')
     try:
-        downloader = MediaDownloader(cdn_repo_path=args.cdn_repo_path)
+        downloader = MediaDownloader(cdn_repo_path=args.cdn_repo_path, profiler=profiler, shard=args.shard)
+        if args.time_budget:
+            downloader.set_time_budget(args.time_budget)
         downloader.download_all_media()
         
     except Exception as e:
         logger.error(f"Script failed: {e}")
         exit(1)
+    finally:
+        profiler.write_summary()
+    
+    if args.metrics_dir:
+        downloader.metrics.write_report(args.metrics_dir, 'download', keep_runs=config.METRICS_KEEP_RUNS)
 
 if __name__ == '__main__':
     main()
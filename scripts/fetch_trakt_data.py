@@ -12,6 +12,7 @@ It retrieves data for a specific user including:
 
 import os
 import json
+import re
 import requests
 import time
 from datetime import datetime, timezone
@@ -19,6 +20,16 @@ from dotenv import load_dotenv
 from pathlib import Path
 import logging
 
+import config
+from data_manifest import write_data_manifest
+from history_archive import archive_events
+from metrics import RequestMetrics
+from paginate_data import write_sorted_pages
+from slim_data import write_slim
+from profiling import NULL_PROFILER, create_profiler
+from show_progress import write_show_progress, load_season_counts
+from related_titles import write_related_titles, load_title_features
+
 # Load environment variables
 load_dotenv('../.env.local')  # Look in project root folder
 
@@ -27,24 +38,38 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 class TraktUserDataClient:
-    def __init__(self):
+    def __init__(self, metrics=None, username=None, data_dir=None, imgs_dir=None, rate_limiter=None,
+                 profiler=None, on_save=None):
         self.api_key = os.getenv('TRAKT_API_KEY')
-        self.username = os.getenv('TRAKT_USERNAME', 'lrs')  # Default to 'lrs'
+        self.username = username or os.getenv('TRAKT_USERNAME', 'lrs')  # Default to 'lrs'
         
         if not self.api_key:
             raise ValueError("TRAKT_API_KEY environment variable is required")
         
         logger.info(f"Fetching data for Trakt user: {self.username}")
         
-        self.base_url = 'https://api.trakt.tv'
+        self.base_url = os.getenv('TRAKT_API_BASE_URL', 'https://api.trakt.tv')
         self.headers = {
             'Content-Type': 'application/json',
             'trakt-api-version': '2',
             'trakt-api-key': self.api_key
         }
         
+        # Per-endpoint network metrics (shared with the downloader when run from manage_data)
+        self.metrics = metrics or RequestMetrics()
+        
+        # Optional rate budget shared with other clients (batch mode syncs several users at once)
+        self.rate_limiter = rate_limiter
+        
+        # Per-stage CPU/memory profiling (--profile); a no-op unless enabled
+        self.profiler = profiler or NULL_PROFILER
+        
+        # Called with (filepath, data) after each save, e.g. to stream titles to the downloader
+        self.on_save = on_save
+        
         # Create output directories
-        self.data_dir = Path('public/data/json')
+        self.data_dir = Path(data_dir or 'public/data/json')
+        self.imgs_dir = Path(imgs_dir or 'public/data/imgs')
         self.create_directory_structure()
     
     def create_directory_structure(self):
@@ -64,33 +89,80 @@ class TraktUserDataClient:
             (self.data_dir / directory).mkdir(parents=True, exist_ok=True)
         
         # Create imgs directory for profile pictures
-        imgs_dir = Path('public/data/imgs')
-        imgs_dir.mkdir(parents=True, exist_ok=True)
+        self.imgs_dir.mkdir(parents=True, exist_ok=True)
         
         logger.info(f"Created directory structure in {self.data_dir}")
-        logger.info(f"Created imgs directory in {imgs_dir}")
+        logger.info(f"Created imgs directory in {self.imgs_dir}")
+    
+    def metrics_key(self, endpoint):
+        """Normalize an endpoint into a metrics label (no username, slug or query)"""
+        key = endpoint.split('?')[0].replace(f'/users/{self.username}', '/users/{username}')
+        return re.sub(r'/lists/[^/]+/items', '/lists/{slug}/items', key)
     
-    def make_request(self, endpoint, params=None):
-        """Make request to Trakt API with rate limiting"""
+    def fetch_params(self, profile_name):
+        """Trakt query parameters for an endpoint group (config.FETCH_PROFILES)"""
+        return dict(config.FETCH_PROFILES.get(profile_name, {})) or None
+    
+    def make_request(self, endpoint, params=None, with_headers=False):
+        """Make request to Trakt API with rate limiting (returns (data, headers) with with_headers)"""
         url = f"{self.base_url}{endpoint}"
+        metrics_key = self.metrics_key(endpoint)
+        
+        if self.rate_limiter:
+            self.metrics.record_sleep('trakt', metrics_key, self.rate_limiter.acquire())
         
+        started = time.monotonic()
         try:
             response = requests.get(url, headers=self.headers, params=params)
+            self.metrics.record_request('trakt', metrics_key, time.monotonic() - started,
+                                        len(response.content), error=not response.ok)
             
             # Handle rate limiting
             if response.status_code == 429:
                 retry_after = int(response.headers.get('Retry-After', 60))
                 logger.warning(f"Rate limited. Waiting {retry_after} seconds...")
+                self.metrics.record_rate_limited('trakt', metrics_key, retry_after)
                 time.sleep(retry_after)
-                return self.make_request(endpoint, params)
+                return self.make_request(endpoint, params, with_headers)
             
             response.raise_for_status()
+            if with_headers:
+                return response.json(), response.headers
             return response.json()
             
         except requests.exceptions.RequestException as e:
+            if getattr(e, 'response', None) is None:
+                self.metrics.record_request('trakt', metrics_key, time.monotonic() - started, error=True)
             logger.error(f"Error fetching {endpoint}: {e}")
             return None
     
+    def make_paginated_request(self, endpoint, params=None, max_pages=None, done=None):
+        """Fetch every page of an endpoint, following the X-Pagination-* headers.
+        Stops early after max_pages or once done(items) is true; returns (items, complete)"""
+        params = dict(params or {})
+        items = []
+        page = int(params.get('page', 1))
+        while True:
+            result = self.make_request(endpoint, params or None, with_headers=True)
+            if result is None:
+                return (items or None), False
+            data, headers = result
+            if not isinstance(data, list):
+                logger.error(f"Expected a list from {endpoint}, got {type(data).__name__}")
+                return None, False
+            items.extend(data)
+            
+            # Unpaginated responses carry no headers and hold everything
+            page_count = int(headers.get('X-Pagination-Page-Count', page))
+            if page >= page_count:
+                return items, True
+            if (max_pages and page >= max_pages) or (done and done(items)):
+                return items, False
+            
+            page += 1
+            params['page'] = page
+            params.setdefault('limit', headers.get('X-Pagination-Limit'))
+    
     def save_json(self, data, filepath):
         """Save data to JSON file with metadata"""
         full_path = self.data_dir / filepath
@@ -112,6 +184,18 @@ class TraktUserDataClient:
             json.dump(output, f, indent=2, ensure_ascii=False)
         
         logger.info(f"Saved {len(data) if isinstance(data, list) else 1} items to {full_path}")
+        
+        if self.on_save:
+            self.on_save(filepath, data)
+        
+        # Consumers that only need ids and a few fields read the slim copy
+        if filepath in config.SLIM_FILES and isinstance(data, list):
+            write_slim(full_path, data, output['metadata'])
+        
+        # Large lists also get static pages so the site can serve one page per request
+        sorts = config.PAGED_FILES.get(filepath)
+        if sorts and isinstance(data, list):
+            write_sorted_pages(full_path.with_suffix(''), data, sorts, config.PAGE_SIZE, output['metadata'])
     
     def download_profile_picture(self, profile_data):
         """Download and save user's profile picture"""
@@ -135,6 +219,7 @@ class TraktUserDataClient:
         
         try:
             logger.info(f"Downloading profile picture from: {image_url}")
+            started = time.monotonic()
             response = requests.get(image_url, stream=True)
             response.raise_for_status()
             
@@ -146,14 +231,16 @@ class TraktUserDataClient:
                     extension = url_ext
             
             # Save to imgs folder
-            imgs_dir = Path('public/data/imgs')
             filename = f"dp.{extension}"
-            filepath = imgs_dir / filename
+            filepath = self.imgs_dir / filename
             
+            nbytes = 0
             with open(filepath, 'wb') as f:
                 for chunk in response.iter_content(chunk_size=8192):
                     f.write(chunk)
+                    nbytes += len(chunk)
             
+            self.metrics.record_request('trakt', 'avatar', time.monotonic() - started, nbytes)
             logger.info(f"Profile picture saved to {filepath}")
             
         except requests.exceptions.RequestException as e:
@@ -165,7 +252,7 @@ class TraktUserDataClient:
         """Fetch user profile (public data)"""
         logger.info(f"Fetching profile for user: {self.username}")
         
-        profile = self.make_request(f'/users/{self.username}?extended=full')
+        profile = self.make_request(f'/users/{self.username}', self.fetch_params('profile'))
         if profile:
             self.save_json(profile, 'user/profile/basic.json')
             # Download profile picture if available
@@ -180,27 +267,46 @@ class TraktUserDataClient:
         """Fetch user's watch history (public if user has public profile)"""
         logger.info(f"Fetching watch history for user: {self.username}")
         
-        # Movie history
-        movie_history = self.make_request(f'/users/{self.username}/history/movies')
-        if movie_history:
-            self.save_json(movie_history, 'user/history/movies.json')
+        # One combined history, paged until both types have their share of events
+        per_type = config.HISTORY_ITEMS_PER_TYPE
+        split = {'movie': [], 'episode': []}
+        
+        def both_filled(events):
+            return all(sum(1 for e in events if e.get('type') == t) >= per_type for t in split)
+        
+        params = {**(self.fetch_params('history') or {}), 'limit': 2 * per_type}
+        history, complete = self.make_paginated_request(f'/users/{self.username}/history', params,
+                                                        config.HISTORY_MAX_PAGES, both_filled)
+        for event in history or []:
+            if event.get('type') in split:
+                split[event['type']].append(event)
         
-        # Show history
-        show_history = self.make_request(f'/users/{self.username}/history/shows')
-        if show_history:
-            self.save_json(show_history, 'user/history/shows.json')
+        archived = list(history or [])
+        for event_type, content_type in [('movie', 'movies'), ('episode', 'shows')]:
+            events = split[event_type][:per_type]
+            # Rarely watched types may sit beyond the pages fetched: ask for them directly
+            if history is not None and len(events) < per_type and not complete:
+                events = self.make_request(f'/users/{self.username}/history/{content_type}',
+                                           {**(self.fetch_params('history') or {}), 'limit': per_type})
+                archived.extend(events or [])
+            if events:
+                self.save_json(events, f'user/history/{content_type}.json')
+        
+        # Keep every event, including those that fall out of the window the API returns
+        # (events are archived once by id, so overlap with the per-type requests is harmless)
+        archive_events(self.data_dir / 'user/history/archive', archived)
     
     def fetch_user_watched(self):
         """Fetch user's watched movies and shows (public if user has public profile)"""
         logger.info(f"Fetching watched content for user: {self.username}")
         
         # Watched movies
-        watched_movies = self.make_request(f'/users/{self.username}/watched/movies')
+        watched_movies = self.make_request(f'/users/{self.username}/watched/movies', self.fetch_params('watched_movies'))
         if watched_movies:
             self.save_json(watched_movies, 'user/watched/movies.json')
         
         # Watched shows
-        watched_shows = self.make_request(f'/users/{self.username}/watched/shows')
+        watched_shows = self.make_request(f'/users/{self.username}/watched/shows', self.fetch_params('watched_shows'))
         if watched_shows:
             self.save_json(watched_shows, 'user/watched/shows.json')
     
@@ -208,38 +314,92 @@ class TraktUserDataClient:
         """Fetch user's watchlist (public if user has public profile)"""
         logger.info(f"Fetching watchlist for user: {self.username}")
         
-        watchlist = self.make_request(f'/users/{self.username}/watchlist')
+        watchlist, _ = self.make_paginated_request(f'/users/{self.username}/watchlist', self.fetch_params('watchlist'))
         if watchlist:
             self.save_json(watchlist, 'user/watchlist/all.json')
         
-        # Watchlist by type
-        for content_type in ['movies', 'shows']:
-            type_watchlist = self.make_request(f'/users/{self.username}/watchlist/{content_type}')
-            if type_watchlist:
-                self.save_json(type_watchlist, f'user/watchlist/{content_type}.json')
+            # Watchlist by type, split from the combined list (which is already in rank order)
+            for item_type, content_type in [('movie', 'movies'), ('show', 'shows')]:
+                type_watchlist = [item for item in watchlist if item.get('type') == item_type]
+                if type_watchlist:
+                    self.save_json(type_watchlist, f'user/watchlist/{content_type}.json')
+    
+    def load_previous_lists(self):
+        """Return {slug: list entry} from the last saved user_lists.json"""
+        lists_path = self.data_dir / 'user/lists/user_lists.json'
+        if not lists_path.exists():
+            return {}
+        
+        try:
+            with open(lists_path, 'r', encoding='utf-8') as f:
+                previous = json.load(f).get('data', [])
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read previous lists snapshot: {e}")
+            return {}
+        
+        return {
+            list_item['ids']['slug']: list_item
+            for list_item in previous
+            if isinstance(list_item, dict) and list_item.get('ids', {}).get('slug')
+        }
+    
+    def remove_stale_list_files(self, current_slugs):
+        """Delete item files for lists that no longer exist"""
+        lists_dir = self.data_dir / 'user/lists'
+        for items_file in lists_dir.glob('*_items.json'):
+            slug = items_file.name[:-len('_items.json')]
+            if slug not in current_slugs:
+                items_file.unlink()
+                logger.info(f"Removed items for deleted list: {slug}")
     
     def fetch_user_lists(self):
         """Fetch user's public lists"""
         logger.info(f"Fetching lists for user: {self.username}")
         
-        # User's lists
+        # Snapshot from the previous run, read before user_lists.json is overwritten
+        previous_lists = self.load_previous_lists()
+        
+        # User's lists (None is an error; [] means the user has no lists any more)
         lists = self.make_request(f'/users/{self.username}/lists')
-        if lists:
-            self.save_json(lists, 'user/lists/user_lists.json')
-            
-            # Fetch items from each public list
-            for list_item in lists:
-                list_slug = list_item.get('ids', {}).get('slug')
-                if list_slug:
-                    list_items = self.make_request(f'/users/{self.username}/lists/{list_slug}/items')
-                    if list_items:
+        if lists is None:
+            return
+        
+        def snapshot(list_item):
+            return (list_item.get('updated_at'), list_item.get('item_count'))
+        
+        # Fetch items from each public list
+        current_slugs = set()
+        saved_lists = []
+        for list_item in lists:
+            list_slug = list_item.get('ids', {}).get('slug')
+            if list_slug:
+                current_slugs.add(list_slug)
+                
+                # Skip lists whose updated_at and item_count match the last run
+                items_path = self.data_dir / f'user/lists/{list_slug}_items.json'
+                previous = previous_lists.get(list_slug)
+                if previous is not None and snapshot(previous) == snapshot(list_item) and items_path.exists():
+                    logger.info(f"List unchanged since last run, skipping items: {list_slug}")
+                    self.metrics.record_cache_hit('trakt', '/users/{username}/lists/{slug}/items')
+                else:
+                    list_items = self.make_request(f'/users/{self.username}/lists/{list_slug}/items', self.fetch_params('list_items'))
+                    if list_items is not None:
                         self.save_json(list_items, f'user/lists/{list_slug}_items.json')
+                    elif previous is not None:
+                        # Keep the old snapshot, so the next run fetches this list again
+                        logger.warning(f"Could not fetch items of list {list_slug}; it is retried next run")
+                        list_item = previous
+            saved_lists.append(list_item)
+        
+        # Saved after the items, so a list's snapshot is only recorded once its items are
+        self.save_json(saved_lists, 'user/lists/user_lists.json')
+        self.remove_stale_list_files(current_slugs)
     
     def fetch_user_comments(self):
         """Fetch user's comments"""
         logger.info(f"Fetching comments for user: {self.username}")
         
-        comments = self.make_request(f'/users/{self.username}/comments')
+        comments = self.make_request(f'/users/{self.username}/comments', self.fetch_params('comments'))
         if comments:
             self.save_json(comments, 'user/comments/all.json')
     
@@ -252,16 +412,12 @@ class TraktUserDataClient:
         logger.info(f"Starting personal Trakt data fetch for user: {self.username}")
         
         try:
-            # User-specific data only
-            self.fetch_user_profile()
-            self.fetch_user_history()
-            self.fetch_user_watched()
-            self.fetch_user_watchlist()
-            self.fetch_user_lists()
-            self.fetch_user_comments()
-            
-            # Basic metadata only (needed for media downloads)
-            self.fetch_metadata()
+            # User-specific data, plus basic metadata (needed for media downloads)
+            for step in (self.fetch_user_profile, self.fetch_user_history, self.fetch_user_watched,
+                         self.fetch_user_watchlist, self.fetch_user_lists, self.fetch_user_comments,
+                         self.fetch_metadata):
+                with self.profiler.stage(f"fetch.{step.__name__[len('fetch_'):]}"):
+                    step()
             
             # Create index file
             index = {
@@ -277,12 +433,17 @@ class TraktUserDataClient:
                         'watched': ['movies.json', 'shows.json'],
                         'watchlist': ['all.json', 'movies.json', 'shows.json'],
                         'lists': ['user_lists.json', '[list_slug]_items.json'],
+                        'progress': ['shows.json'],
+                        'related': ['titles.json'],
                         'comments': ['all.json']
                     }
                 }
             }
             
             self.save_json(index, 'index.json')
+            write_show_progress(self.data_dir, load_season_counts(config.SEASON_COUNTS_FILE))
+            write_related_titles(self.data_dir, load_title_features(config.TITLE_FEATURES_FILE))
+            write_data_manifest(self.data_dir, config.HOT_DATA_FILES)
             logger.info(f"Personal Trakt data fetch completed successfully for user: {self.username}!")
             
         except Exception as e:
@@ -291,13 +452,24 @@ class TraktUserDataClient:
 
 def main():
     """Main function"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Fetch personal Trakt data')
+    parser.add_argument('--profile', nargs='?', const=config.PROFILE_DIR,
+                       help=f'Profile each fetch stage (cProfile + tracemalloc) into this directory '
+                            f'(default: {config.PROFILE_DIR})')
+    args = parser.parse_args()
+    
+    profiler = create_profiler(args.profile, 'fetch')
     try:
-        client = TraktUserDataClient()
+        client = TraktUserDataClient(profiler=profiler)
         client.fetch_all_user_data()
         
     except Exception as e:
         logger.error(f"Script failed: {e}")
         exit(1)
+    finally:
+        profiler.write_summary()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Orphan Image Garbage Collection
+
+Deletes images of titles that no current data file references any more (titles that left
+the watchlist, lists or history window), so the CDN repository stops growing forever.
+- referenced TMDB ids come from every download source of every user's data tree; a tree that
+  is missing one of the DOWNLOAD_SOURCES files stops the collection (its titles would look
+  orphaned), and a dry run lists the missing files
+- orphans are found with set differences between the ids in media_index.json and the
+  referenced ids, per category (no per-file lookups)
+- an id is only deleted once it has been orphaned for the grace period; first-seen dates
+  are kept in the image tree, so a title that comes back in the meantime is spared
+- shows lose their poster, backdrop and whole season poster directory
+- media_index.json (and its compact shards) is updated from the same sets, without a rescan
+"""
+
+import os
+import json
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+import logging
+
+import config
+from download_media import DOWNLOAD_SOURCES
+from media_index import filename_ids
+
+logger = logging.getLogger(__name__)
+
+
+class MediaGarbageCollector:
+    def __init__(self, downloader, data_dirs, grace_days=None, dry_run=False):
+        self.downloader = downloader
+        self.images_dir = downloader.images_dir
+        self.data_dirs = [Path(data_dir) for data_dir in data_dirs]
+        self.grace_days = config.GC_GRACE_DAYS if grace_days is None else grace_days
+        self.dry_run = dry_run
+        self.state_path = self.images_dir / config.GC_STATE
+
+    def referenced_ids(self):
+        """{'movie': ids, 'show': ids} referenced by any download source of any data tree"""
+        referenced = {'movie': set(), 'show': set()}
+        for data_dir in self.data_dirs:
+            for json_path in self.downloader.json_files(data_dir):
+                # A source that cannot be read must not make its titles look orphaned
+                for item in self.downloader.iter_json_items(json_path):
+                    referenced[item.media_type].add(int(item.tmdb_id))
+        return referenced
+
+    def missing_sources(self):
+        """DOWNLOAD_SOURCES files that are missing from a data tree"""
+        return [data_dir / source for data_dir in self.data_dirs for source in DOWNLOAD_SOURCES
+                if not (data_dir / source).exists()]
+
+    def load_media_index(self):
+        """media_index.json, or a fresh scan when there is none yet"""
+        if self.downloader.media_index_path.exists():
+            with open(self.downloader.media_index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return self.downloader.build_media_index()
+
+    def indexed_ids(self, media_index):
+        """{'movie': ids, 'show': ids} that have at least one image in the index"""
+        return {
+            'movie': filename_ids(media_index['movies']['posters']) | filename_ids(media_index['movies']['backdrops']),
+            'show': (filename_ids(media_index['shows']['posters']) | filename_ids(media_index['shows']['backdrops'])
+                     | {int(show_id) for show_id in media_index['shows']['season_posters'] if show_id.isdigit()})
+        }
+
+    def load_state(self):
+        if self.state_path.exists():
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'orphans': {}}
+
+    def save_state(self, state):
+        state['last_updated'] = datetime.now().isoformat()
+        tmp_path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def title_paths(self, media_type, tmdb_id):
+        """Files and directories that hold a title's images"""
+        poster_path, backdrop_path = self.downloader.image_paths(f'{media_type}s', tmdb_id)
+        paths = [poster_path, backdrop_path]
+        if media_type == 'show':
+            paths.append(self.images_dir / self.downloader.layout.show_seasons_dir(tmdb_id))
+        return paths
+
+    def disk_usage(self, path):
+        if path.is_dir():
+            return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+        return path.stat().st_size if path.exists() else 0
+
+    def delete_title(self, media_type, tmdb_id):
+        """Delete a title's images; returns the bytes freed"""
+        freed = 0
+        for path in self.title_paths(media_type, tmdb_id):
+            freed += self.disk_usage(path)
+            if self.dry_run:
+                continue
+            if path.is_dir():
+                shutil.rmtree(path)
+            elif path.exists():
+                path.unlink()
+        return freed
+
+    def prune_index(self, media_index, deleted):
+        """Remove deleted titles from the index structure"""
+        def keep(filenames, ids):
+            removed = {f'{tmdb_id}_{kind}.jpg' for tmdb_id in ids for kind in ('poster', 'backdrop')}
+            return sorted(set(filenames) - removed)
+
+        media_index['movies']['posters'] = keep(media_index['movies']['posters'], deleted['movie'])
+        media_index['movies']['backdrops'] = keep(media_index['movies']['backdrops'], deleted['movie'])
+        media_index['shows']['posters'] = keep(media_index['shows']['posters'], deleted['show'])
+        media_index['shows']['backdrops'] = keep(media_index['shows']['backdrops'], deleted['show'])
+        deleted_shows = {str(tmdb_id) for tmdb_id in deleted['show']}
+        media_index['shows']['season_posters'] = {show_id: seasons for show_id, seasons
+                                                  in media_index['shows']['season_posters'].items()
+                                                  if show_id not in deleted_shows}
+        media_index['last_updated'] = datetime.now().isoformat()
+        return media_index
+
+    def collect(self):
+        """Find orphans, delete those past the grace period and update the index"""
+        missing = self.missing_sources()
+        if missing and not self.dry_run:
+            raise RuntimeError(f"{len(missing)} download source files are missing (first: {missing[0]}); "
+                               f"refusing to collect, their titles would look orphaned")
+
+        referenced = self.referenced_ids()
+        if not referenced['movie'] and not referenced['show']:
+            raise RuntimeError("No titles are referenced by any data file; refusing to collect "
+                               "(fetch the Trakt data first)")
+
+        media_index = self.load_media_index()
+        indexed = self.indexed_ids(media_index)
+        orphans = {media_type: indexed[media_type] - referenced[media_type] for media_type in indexed}
+
+        state = self.load_state()
+        now = datetime.now()
+        first_seen = {}
+        for media_type, ids in orphans.items():
+            for tmdb_id in ids:
+                key = f'{media_type}:{tmdb_id}'
+                first_seen[key] = state['orphans'].get(key, now.isoformat())
+
+        cutoff = now - timedelta(days=self.grace_days)
+        due = {'movie': set(), 'show': set()}
+        for key, seen in first_seen.items():
+            if datetime.fromisoformat(seen) <= cutoff:
+                media_type, tmdb_id = key.split(':')
+                due[media_type].add(int(tmdb_id))
+
+        freed = sum(self.delete_title(media_type, tmdb_id) for media_type, ids in due.items() for tmdb_id in ids)
+        waiting = sum(len(ids) for ids in orphans.values()) - sum(len(ids) for ids in due.values())
+        verb = 'Would delete' if self.dry_run else 'Deleted'
+        logger.info(f"{sum(len(ids) for ids in orphans.values())} orphaned titles "
+                   f"({len(orphans['movie'])} movies, {len(orphans['show'])} shows); {verb.lower()} "
+                   f"{len(due['movie'])} movies and {len(due['show'])} shows past the {self.grace_days}-day "
+                   f"grace period ({freed / 1024 / 1024:.1f} MB), {waiting} still within it")
+
+        if self.dry_run:
+            for media_type, ids in due.items():
+                for tmdb_id in sorted(ids):
+                    logger.info(f"{verb} {media_type} {tmdb_id} (orphaned since {first_seen[f'{media_type}:{tmdb_id}']})")
+            if missing:
+                logger.warning(f"A real run would refuse to collect: {len(missing)} download source files are "
+                               f"missing, so the orphans above are overcounted")
+                for path in missing:
+                    logger.warning(f"Missing download source: {path}")
+            return {'orphans': orphans, 'deleted': due, 'bytes_freed': freed, 'missing_sources': missing}
+
+        # Deleted titles are done; the rest keep their first-seen date for the next run
+        state['orphans'] = {key: seen for key, seen in first_seen.items()
+                            if int(key.split(':')[1]) not in due[key.split(':')[0]]}
+        self.save_state(state)
+        if due['movie'] or due['show']:
+            self.downloader.write_media_index(self.prune_index(media_index, due))
+        return {'orphans': orphans, 'deleted': due, 'bytes_freed': freed}
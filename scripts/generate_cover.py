@@ -10,9 +10,33 @@ import json
 import os
 import random
 from PIL import Image
-from io import BytesIO
 import sys
 
+import config
+from image_layout import ImageLayout
+from profiling import create_profiler
+from thumbnails import ThumbnailCache, make_thumbnail
+
+# Site serving the watched data and CDN serving the posters (overridable for local runs)
+DATA_BASE_URL = os.getenv('COVER_DATA_BASE_URL', 'https://trakt.sayed.app')
+CDN_BASE_URL = os.getenv('COVER_CDN_BASE_URL', 'https://cfcdn.sayed.app')
+
+# Compact media index manifest published with the data; it records the CDN tree's layout
+MEDIA_INDEX_MANIFEST_URL = f"{DATA_BASE_URL}/data/media_index/manifest.json"
+
+def fetch_image_layout():
+    """Directory layout of the CDN image tree, as recorded in the published media index
+    (flat when the manifest is missing, like trees from before the layout was recorded)"""
+    try:
+        response = requests.get(MEDIA_INDEX_MANIFEST_URL, timeout=30)
+        response.raise_for_status()
+        layout = ImageLayout(response.json().get('layout', 'flat'))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"⚠️ Could not read the image layout from {MEDIA_INDEX_MANIFEST_URL} ({e}); assuming flat")
+        return ImageLayout('flat')
+    print(f"🗂️ CDN image layout: {layout.name}")
+    return layout
+
 def fetch_json_data(url):
     """Fetch JSON data from URL"""
     try:
@@ -40,8 +64,8 @@ def fetch_json_data(url):
         print(f"❌ Error parsing JSON from {url}: {e}")
         return []
 
-def get_tmdb_poster_urls(movies_data, shows_data):
-    """Extract TMDB IDs and create poster URLs, sorted by watch date (newest first)"""
+def get_tmdb_poster_urls(movies_data, shows_data, layout):
+    """Extract TMDB IDs and create poster URLs (in the CDN's image layout), sorted by watch date (newest first)"""
     poster_data = {
         "movies": [],
         "shows": []
@@ -55,7 +79,7 @@ def get_tmdb_poster_urls(movies_data, shows_data):
             movie = movie_entry['movie']
             if 'ids' in movie and 'tmdb' in movie['ids'] and movie['ids']['tmdb']:
                 tmdb_id = movie['ids']['tmdb']
-                poster_url = f"https://cfcdn.sayed.app/watch/movies/posters/{tmdb_id}_poster.jpg"
+                poster_url = f"{CDN_BASE_URL}/watch/{layout.image_path('movies', 'poster', tmdb_id)}"
                 movie_entries_with_dates.append({
                     "tmdb_id": tmdb_id,
                     "title": movie.get('title', 'Unknown'),
@@ -78,7 +102,9 @@ def get_tmdb_poster_urls(movies_data, shows_data):
                 
                 # Use available seasons from the data, or fallback to random
                 available_seasons = []
-                if 'seasons' in show_entry:
+                if 'season_numbers' in show_entry:
+                    available_seasons = show_entry['season_numbers']
+                elif 'seasons' in show_entry:
                     available_seasons = [season['number'] for season in show_entry['seasons'] if season.get('number', 0) > 0]
                 
                 # Choose a season - prefer from available seasons, otherwise random 1-5
@@ -87,7 +113,7 @@ def get_tmdb_poster_urls(movies_data, shows_data):
                 else:
                     season = random.randint(1, 5)
                 
-                poster_url = f"https://cfcdn.sayed.app/watch/shows/posters/{tmdb_id}/{season}/season_{season}_poster.jpg"
+                poster_url = f"{CDN_BASE_URL}/watch/{layout.season_poster_path(tmdb_id, season)}"
                 show_entries_with_dates.append({
                     "tmdb_id": tmdb_id,
                     "title": show.get('title', 'Unknown'),
@@ -107,19 +133,20 @@ def get_tmdb_poster_urls(movies_data, shows_data):
     return poster_data
 
 def download_image(url, timeout=10):
-    """Download image from URL and return PIL Image object"""
+    """Download image from URL and return its bytes (decoding is left to the thumbnailer)"""
     try:
         print(f"⬇️ Downloading: {url}")
         response = requests.get(url, timeout=timeout)
         response.raise_for_status()
-        image = Image.open(BytesIO(response.content))
-        return image
+        return response.content
     except Exception as e:
         print(f"❌ Failed to download {url}: {e}")
         return None
 
-def create_cover_image(poster_data, output_path):
-    """Create a 896x272px cover image from poster data with alternating pattern"""
+def create_cover_image(poster_data, output_path, thumbnail_cache=None):
+    """Create a 896x272px cover image from poster data with alternating pattern.
+    Posters are scaled with the reduced-resolution JPEG decode of thumbnails.py (and taken
+    from thumbnail_cache when the same poster bytes were scaled before)"""
     # Cover dimensions - optimized for 20 posters in 2 rows
     cover_width = 896
     cover_height = 272
@@ -192,11 +219,13 @@ def create_cover_image(poster_data, output_path):
         
         if poster_url:
             # Download and resize poster
-            poster_img = download_image(poster_url)
-            if poster_img:
+            poster_bytes = download_image(poster_url)
+            if poster_bytes:
                 try:
-                    # Resize to fit the calculated dimensions
-                    poster_img = poster_img.resize((poster_width, poster_height), Image.Resampling.LANCZOS)
+                    # Scale to the calculated dimensions (draft-mode decode, reduce, then LANCZOS)
+                    poster_size = (poster_width, poster_height)
+                    poster_img = (thumbnail_cache.get(poster_bytes, poster_size) if thumbnail_cache
+                                  else make_thumbnail(poster_bytes, poster_size))
                     
                     # Paste onto cover at calculated position
                     cover.paste(poster_img, (x_position, y_position))
@@ -226,22 +255,46 @@ def create_cover_image(poster_data, output_path):
 
 def main():
     """Main function"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Generate the cover image from Trakt watched data')
+    parser.add_argument('--profile', nargs='?', const=config.PROFILE_DIR,
+                        help=f'Profile each stage (cProfile + tracemalloc) into this directory '
+                             f'(default: {config.PROFILE_DIR})')
+    parser.add_argument('--thumbnail-cache', default=config.THUMBNAIL_CACHE_DIR,
+                        help=f'Directory for scaled posters, keyed by source hash '
+                             f'(default: {config.THUMBNAIL_CACHE_DIR}; "" disables the cache)')
+    args = parser.parse_args()
+    
+    thumbnail_cache = ThumbnailCache(args.thumbnail_cache) if args.thumbnail_cache else None
+    profiler = create_profiler(args.profile, 'cover')
+    try:
+        generate(profiler, thumbnail_cache)
+    finally:
+        profiler.write_summary()
+
+def generate(profiler, thumbnail_cache=None):
+    """Fetch the watched data, then write cover.json and the cover image"""
     print("🚀 Starting cover generation process...")
     
     # URLs to fetch data from
-    movies_url = "https://trakt.sayed.app/api/trakt/user/watched?type=movies"
-    shows_url = "https://trakt.sayed.app/api/trakt/user/watched?type=shows"
+    # The slim projection carries everything the cover needs (ids, dates, season numbers)
+    movies_url = f"{DATA_BASE_URL}/api/trakt/user/watched?type=movies&slim=true"
+    shows_url = f"{DATA_BASE_URL}/api/trakt/user/watched?type=shows&slim=true"
     
     # Fetch data
-    movies_data = fetch_json_data(movies_url)
-    shows_data = fetch_json_data(shows_url)
+    with profiler.stage('cover.fetch_data'):
+        movies_data = fetch_json_data(movies_url)
+        shows_data = fetch_json_data(shows_url)
+        layout = fetch_image_layout()
     
     if not movies_data and not shows_data:
         print("❌ No data fetched. Exiting...")
         sys.exit(1)
     
     # Create poster data
-    poster_data = get_tmdb_poster_urls(movies_data, shows_data)
+    with profiler.stage('cover.poster_urls'):
+        poster_data = get_tmdb_poster_urls(movies_data, shows_data, layout)
     
     # Ensure public directory exists
     os.makedirs('public', exist_ok=True)
@@ -254,7 +307,13 @@ def main():
     
     # Create cover image
     cover_image_path = 'public/cover.webp'
-    create_cover_image(poster_data, cover_image_path)
+    with profiler.stage('cover.render'):
+        create_cover_image(poster_data, cover_image_path, thumbnail_cache)
+    
+    if thumbnail_cache:
+        pruned = thumbnail_cache.prune(config.THUMBNAIL_CACHE_DAYS)
+        print(f"🗂️ Thumbnail cache: {thumbnail_cache.hits} hits, {thumbnail_cache.misses} misses, "
+              f"{pruned} unused thumbnails pruned")
     
     print("✅ Cover generation completed successfully!")
 
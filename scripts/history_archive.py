@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Watch History Archive
+
+Keeps every history event ever fetched, even after it drops out of the window the Trakt API
+returns. Events are stored append-only as NDJSON (one event per line), one segment per month
+of watched_at, in user/history/archive/:
+- <YYYY-MM>.ndjson  events watched in that month, in the order they were archived
+- index.json        per segment: event count, first/last watched_at, size in bytes
+
+Events are de-duplicated by their history id. Archiving a day's events only reads and appends
+to the segments those events fall in (normally just the current month), and a range query
+such as "2024 watches" only opens the segments whose month is in the range.
+"""
+
+import os
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_VERSION = 1
+INDEX_NAME = 'index.json'
+
+
+def segment_name(watched_at):
+    """Segment for an event: its watched_at month ('2024-05')"""
+    return watched_at[:7]
+
+
+def load_index(archive_dir):
+    index_path = Path(archive_dir) / INDEX_NAME
+    if index_path.exists():
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'version': ARCHIVE_VERSION, 'total': 0, 'segments': {}}
+
+
+def segment_ids(segment_path):
+    """History ids already stored in a segment"""
+    ids = set()
+    if segment_path.exists():
+        with open(segment_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    ids.add(json.loads(line)['id'])
+    return ids
+
+
+def archive_events(archive_dir, events):
+    """Append events that are not archived yet; returns the number of new events"""
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    index = load_index(archive_dir)
+
+    by_segment = {}
+    for event in events:
+        if isinstance(event, dict) and event.get('id') is not None and event.get('watched_at'):
+            by_segment.setdefault(segment_name(event['watched_at']), []).append(event)
+
+    added = 0
+    for name, segment_events in sorted(by_segment.items()):
+        segment_path = archive_dir / f'{name}.ndjson'
+        known = segment_ids(segment_path)
+        new_events = []
+        for event in sorted(segment_events, key=lambda e: (e['watched_at'], e['id'])):
+            if event['id'] not in known:
+                known.add(event['id'])
+                new_events.append(event)
+        if not new_events:
+            continue
+
+        with open(segment_path, 'a', encoding='utf-8') as f:
+            for event in new_events:
+                f.write(json.dumps(event, separators=(',', ':'), ensure_ascii=False) + '\n')
+
+        entry = index['segments'].get(name, {'count': 0, 'first_watched_at': None, 'last_watched_at': None})
+        watched = [event['watched_at'] for event in new_events]
+        entry['count'] += len(new_events)
+        entry['first_watched_at'] = min(filter(None, [entry['first_watched_at'], min(watched)]))
+        entry['last_watched_at'] = max(filter(None, [entry['last_watched_at'], max(watched)]))
+        entry['bytes'] = segment_path.stat().st_size
+        index['segments'][name] = entry
+        added += len(new_events)
+
+    if added:
+        index['segments'] = dict(sorted(index['segments'].items()))
+        index['total'] = sum(entry['count'] for entry in index['segments'].values())
+        index['updated_at'] = datetime.now(timezone.utc).isoformat()
+        tmp_path = archive_dir / f'{INDEX_NAME}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, archive_dir / INDEX_NAME)
+
+    logger.info(f"History archive: {added} new events ({index['total']} total in {len(index['segments'])} segments)")
+    return added
+
+
+def iter_range(archive_dir, since=None, until=None):
+    """Yield archived events with since <= watched_at < until, reading only matching segments.
+    Bounds are ISO timestamps or prefixes ('2024', '2024-05')."""
+    archive_dir = Path(archive_dir)
+    for name in load_index(archive_dir)['segments']:
+        # Segment 'YYYY-MM' holds [YYYY-MM, next month): skip it unless it overlaps [since, until)
+        if (since and name < since[:7]) or (until and name >= until):
+            continue
+        with open(archive_dir / f'{name}.ndjson', 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if (since is None or event['watched_at'] >= since) and (until is None or event['watched_at'] < until):
+                    yield event
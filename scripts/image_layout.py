@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Image Tree Layout
+
+Where posters and backdrops live in the image tree. The downloader, the media index, the
+cover generator, the image proxy and the site (lib/imageIndex.ts) all build paths here, so
+the file names stay the same in every layout and only the directories differ:
+- flat:   movies/posters/17801_poster.jpg, shows/posters/1399/1/season_1_poster.jpg
+- hashed: movies/posters/17/80/17801_poster.jpg, shows/posters/13/99/1399/1/season_1_poster.jpg
+  The buckets are the leading digits of the id zero-padded to four digits, so a directory
+  holds at most a few hundred entries instead of every title.
+Episode stills and person profiles (image proxy only) are not affected.
+
+The layout of a tree is recorded in a marker file in the tree. A tree without one is flat
+if it already has images in the flat directories, otherwise it gets IMAGE_LAYOUT (from the
+environment or config). migrate_layout moves an existing tree from one layout to another.
+"""
+
+import os
+import re
+import json
+from datetime import datetime
+from pathlib import Path
+import logging
+
+import config
+from media_index import filename_id
+
+logger = logging.getLogger(__name__)
+
+LAYOUTS = ('flat', 'hashed')
+BUCKET_DIGITS = 2
+BUCKET_LEVELS = 2
+IMAGE_CATEGORIES = [('movies', 'posters'), ('movies', 'backdrops'), ('shows', 'posters'), ('shows', 'backdrops')]
+
+# Loose patterns; parse() only accepts a path that the layout would build itself
+MAIN_IMAGE = re.compile(r'(movies|shows)/(posters|backdrops)/(?:\d+/)*(\d+)_(poster|backdrop)\.jpg')
+SEASON_POSTER = re.compile(r'shows/posters/(?:\d+/)*(\d+)/(\d+)/season_(\d+)_poster\.jpg')
+
+
+def id_buckets(tmdb_id):
+    """Bucket directories of an id in the hashed layout: 17801 -> ['17', '80']"""
+    digits = str(int(tmdb_id)).zfill(BUCKET_DIGITS * BUCKET_LEVELS)
+    return [digits[level * BUCKET_DIGITS:(level + 1) * BUCKET_DIGITS] for level in range(BUCKET_LEVELS)]
+
+
+def configured_layout():
+    """Layout for new trees: $IMAGE_LAYOUT or config.IMAGE_LAYOUT"""
+    layout = os.getenv('IMAGE_LAYOUT', config.IMAGE_LAYOUT)
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown image layout {layout!r} (expected one of {', '.join(LAYOUTS)})")
+    return layout
+
+
+def read_marker(images_dir):
+    """A tree's layout marker ({} when there is none)"""
+    marker_path = Path(images_dir) / config.IMAGE_LAYOUT_MARKER
+    if not marker_path.exists():
+        return {}
+    with open(marker_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_marker(images_dir, layout, migrating_to=None):
+    """Record a tree's layout (and the target of a migration in progress)"""
+    marker = {'layout': layout, 'last_updated': datetime.now().isoformat()}
+    if migrating_to:
+        marker['migrating_to'] = migrating_to
+    marker_path = Path(images_dir) / config.IMAGE_LAYOUT_MARKER
+    marker_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(marker_path, 'w', encoding='utf-8') as f:
+        json.dump(marker, f, indent=2)
+
+
+def has_flat_images(images_dir):
+    """Whether a tree without a marker already has images in the flat directories"""
+    for media_type, category in IMAGE_CATEGORIES:
+        if next((Path(images_dir) / media_type / category).glob('*.jpg'), None):
+            return True
+    return False
+
+
+class ImageLayout:
+    def __init__(self, name='flat'):
+        if name not in LAYOUTS:
+            raise ValueError(f"Unknown image layout {name!r} (expected one of {', '.join(LAYOUTS)})")
+        self.name = name
+
+    @classmethod
+    def for_tree(cls, images_dir):
+        """Layout of an image tree: its marker, flat for older trees, else the configured one"""
+        layout = read_marker(images_dir).get('layout')
+        if layout is None:
+            layout = 'flat' if has_flat_images(images_dir) else configured_layout()
+        return cls(layout)
+
+    def category_dir(self, media_type, category, tmdb_id):
+        """Directory of a title's images in a category: 'movies/posters/17/80'"""
+        if self.name == 'hashed':
+            return '/'.join([media_type, category, *id_buckets(tmdb_id)])
+        return f'{media_type}/{category}'
+
+    def image_path(self, media_type, kind, tmdb_id):
+        """Main poster or backdrop ('poster'/'backdrop') of a movie or show ('movies'/'shows')"""
+        return f'{self.category_dir(media_type, f"{kind}s", tmdb_id)}/{tmdb_id}_{kind}.jpg'
+
+    def show_seasons_dir(self, tmdb_id):
+        """Directory holding a show's season poster directories"""
+        return f'{self.category_dir("shows", "posters", tmdb_id)}/{tmdb_id}'
+
+    def season_dir(self, tmdb_id, season_number):
+        return f'{self.show_seasons_dir(tmdb_id)}/{season_number}'
+
+    def season_poster_path(self, tmdb_id, season_number):
+        return f'{self.season_dir(tmdb_id, season_number)}/season_{season_number}_poster.jpg'
+
+    def bucket_dirs(self, category_root):
+        """Directories under a category root that hold images and show directories"""
+        category_root = Path(category_root)
+        if self.name == 'flat':
+            return [category_root] if category_root.is_dir() else []
+        pattern = '/'.join(['[0-9]' * BUCKET_DIGITS] * BUCKET_LEVELS)
+        return sorted(path for path in category_root.glob(pattern) if path.is_dir())
+
+    def parse(self, relative_path):
+        """('main', media_type, kind, tmdb_id) or ('season', tmdb_id, season_number) for an
+        image path of this layout; None for anything else"""
+        if match := MAIN_IMAGE.fullmatch(relative_path):
+            media_type, tmdb_id, kind = match.group(1), int(match.group(3)), match.group(4)
+            if self.image_path(media_type, kind, tmdb_id) == relative_path:
+                return ('main', media_type, kind, tmdb_id)
+        elif match := SEASON_POSTER.fullmatch(relative_path):
+            tmdb_id, season_number = int(match.group(1)), int(match.group(2))
+            if self.season_poster_path(tmdb_id, season_number) == relative_path:
+                return ('season', tmdb_id, season_number)
+        return None
+
+    def convert(self, relative_path, target):
+        """Path of the same image in another layout (unchanged for paths this layout did not build)"""
+        parsed = self.parse(relative_path)
+        if parsed is None:
+            return relative_path
+        if parsed[0] == 'main':
+            return target.image_path(*parsed[1:])
+        return target.season_poster_path(*parsed[1:])
+
+
+def pending_root(images_dir, media_type, category):
+    """Where a category root waits while it is being migrated"""
+    return Path(images_dir) / media_type / f'{category}.migrating'
+
+
+def move_category(images_dir, media_type, category, source, target):
+    """Move the images of one category from its .migrating root into the target layout;
+    returns the number of files moved"""
+    root = Path(images_dir) / media_type / category
+    old_root = pending_root(images_dir, media_type, category)
+    root.mkdir(parents=True, exist_ok=True)
+
+    moved = 0
+    for bucket_dir in source.bucket_dirs(old_root):
+        for entry in sorted(bucket_dir.iterdir()):
+            if entry.is_file() and filename_id(entry.name) is not None:
+                destination = Path(images_dir) / target.category_dir(media_type, category, filename_id(entry.name)) / entry.name
+                moved += 1
+            elif entry.is_dir() and entry.name.isdigit() and (media_type, category) == ('shows', 'posters'):
+                destination = Path(images_dir) / target.show_seasons_dir(int(entry.name))
+                moved += sum(len(files) for _, _, files in os.walk(entry))
+            else:
+                continue
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(entry, destination)
+
+    # Remove the emptied directories; anything the layouts do not know about stays behind
+    for directory, _, _ in sorted(os.walk(old_root), key=lambda walked: len(walked[0]), reverse=True):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+    if old_root.exists():
+        logger.warning(f"Left unrecognized files in {old_root}")
+    return moved
+
+
+def rewrite_path_keys(json_path, source, target):
+    """Point the per-file entries of the optimize manifest, verify cache and re-download
+    queue (all {'files': {path: ...}} or {'files': [path, ...]}) at the new paths"""
+    if not json_path.exists():
+        return
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    files = data.get('files', {})
+    if isinstance(files, dict):
+        data['files'] = {source.convert(path, target): entry for path, entry in files.items()}
+    else:
+        data['files'] = sorted(source.convert(path, target) for path in files)
+    tmp_path = json_path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, json_path)
+
+
+def migrate_layout(images_dir, target_name):
+    """Move every poster and backdrop of a tree into the target layout; returns files moved.
+
+    Every category root is renamed to <category>.migrating before anything moves, so flat show
+    directories and hashed buckets (both digit names) never share a directory. The marker names
+    the target once all roots are renamed; an interrupted run resumes from the .migrating roots."""
+    images_dir = Path(images_dir)
+    marker = read_marker(images_dir)
+    source = ImageLayout.for_tree(images_dir)
+    target = ImageLayout(target_name)
+
+    if marker.get('migrating_to'):
+        if marker['migrating_to'] != target.name:
+            raise ValueError(f"{images_dir} is being migrated to the {marker['migrating_to']} layout; "
+                             f"finish that migration first")
+        logger.info(f"Resuming the migration of {images_dir} to the {target.name} layout...")
+    else:
+        pending = [pending_root(images_dir, *category) for category in IMAGE_CATEGORIES]
+        if source.name == target.name and not any(root.exists() for root in pending):
+            logger.info(f"Image tree {images_dir} already uses the {target.name} layout")
+            return 0
+        logger.info(f"Migrating {images_dir} from the {source.name} to the {target.name} layout...")
+        write_marker(images_dir, source.name)
+        for (media_type, category), old_root in zip(IMAGE_CATEGORIES, pending):
+            root = images_dir / media_type / category
+            if root.exists() and not old_root.exists():
+                root.rename(old_root)
+        write_marker(images_dir, source.name, migrating_to=target.name)
+
+    moved = sum(move_category(images_dir, media_type, category, source, target)
+                for media_type, category in IMAGE_CATEGORIES
+                if pending_root(images_dir, media_type, category).exists())
+    for filename in (config.OPTIMIZE_MANIFEST, config.VERIFY_CACHE, config.REDOWNLOAD_QUEUE):
+        rewrite_path_keys(images_dir / filename, source, target)
+    write_marker(images_dir, target.name)
+
+    logger.info(f"Moved {moved} images to the {target.name} layout")
+    return moved
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+On-demand Image Proxy
+
+A small HTTP service that serves images in the image tree layout and fetches anything that
+is missing from TMDB the first time someone asks for it, so rarely seen artwork (season
+posters of old shows, episode stills, cast photos) no longer has to be downloaded in bulk:
+- movies/posters/<id>_poster.jpg, movies/backdrops/<id>_backdrop.jpg (same for shows/)
+- shows/posters/<id>/<season>/season_<season>_poster.jpg
+  (posters and backdrops follow the layout of the image tree, see image_layout.py)
+- episodes/stills/<show id>/<season>/<episode>_still.jpg
+- people/profiles/<person id>_profile.jpg
+
+Files in the image tree (the bulk downloads) are served as they are and never deleted.
+Fetched files go to a separate cache directory that is kept under a disk budget by evicting
+the least recently served files. TMDB lookups go through MediaDownloader, so they share its
+rate limiting and metrics; paths TMDB has no image for are remembered for a while.
+"""
+
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+import logging
+
+import config
+from download_media import MediaDownloader
+from rate_limit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+EPISODE_STILL = re.compile(r'episodes/stills/(\d+)/(\d+)/(\d+)_still\.jpg')
+PERSON_PROFILE = re.compile(r'people/profiles/(\d+)_profile\.jpg')
+
+
+class ImageProxy:
+    def __init__(self, downloader, cache_dir, budget_bytes):
+        self.downloader = downloader
+        self.store_dir = downloader.images_dir
+        self.layout = downloader.layout
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.budget_bytes = budget_bytes
+
+        # Cached files by recency of use (oldest first) and their sizes
+        self.lru = OrderedDict()
+        self.cache_bytes = 0
+        self.lock = threading.Lock()
+        self.fetch_locks = {}
+
+        # Paths TMDB has no image for: {relative_path: monotonic time the entry expires}
+        self.misses = {}
+
+        self.load_cache()
+
+    def load_cache(self):
+        """Rebuild the LRU order from the cache directory (file mtimes record the last use)"""
+        files = []
+        for root, dirs, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+                filepath = Path(root) / filename
+                stat = filepath.stat()
+                files.append((stat.st_mtime, filepath.relative_to(self.cache_dir).as_posix(), stat.st_size))
+
+        for _, relative_path, size in sorted(files):
+            self.lru[relative_path] = size
+            self.cache_bytes += size
+        logger.info(f"Image cache: {len(self.lru)} files, {self.cache_bytes / 1024 / 1024:.1f} MB "
+                   f"of {self.budget_bytes / 1024 / 1024:.0f} MB")
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used cached files until the cache fits its budget
+        (the most recent file is kept even when it alone is over budget)"""
+        with self.lock:
+            while self.cache_bytes > self.budget_bytes and len(self.lru) > 1:
+                relative_path, size = self.lru.popitem(last=False)
+                self.cache_bytes -= size
+                (self.cache_dir / relative_path).unlink(missing_ok=True)
+                logger.debug(f"Evicted {relative_path}")
+
+    def source_url(self, relative_path):
+        """TMDB image URL for a path (None when TMDB has no image, or for unknown paths)"""
+        downloader = self.downloader
+        parsed = self.layout.parse(relative_path)
+
+        if parsed and parsed[0] == 'main':
+            _, media_type, size, tmdb_id = parsed
+            category = f'{size}s'
+            images = (downloader.get_movie_images(tmdb_id) if media_type == 'movies'
+                      else downloader.get_show_images(tmdb_id))
+        elif parsed:
+            _, tmdb_id, season_number = parsed
+            images = downloader.get_season_images(tmdb_id, season_number)
+            category, size = 'posters', 'poster'
+        elif match := EPISODE_STILL.fullmatch(relative_path):
+            images = downloader.get_episode_images(*(int(group) for group in match.groups()))
+            category, size = 'stills', 'still'
+        elif match := PERSON_PROFILE.fullmatch(relative_path):
+            images = downloader.get_person_images(int(match.group(1)))
+            category, size = 'profiles', 'profile'
+        else:
+            return None
+
+        file_path = next((image['file_path'] for image in (images or {}).get(category, []) if image.get('file_path')), None)
+        if not file_path:
+            return None
+        return f"{downloader.tmdb_image_base_url}/{downloader.image_sizes[size]}{file_path}"
+
+    def is_known_path(self, relative_path):
+        return (self.layout.parse(relative_path) is not None
+                or any(pattern.fullmatch(relative_path) for pattern in (EPISODE_STILL, PERSON_PROFILE)))
+
+    def get(self, relative_path):
+        """Local file for an image path, fetching it on a miss; None when there is no image"""
+        if not self.is_known_path(relative_path):
+            return None
+
+        store_path = self.store_dir / relative_path
+        if store_path.is_file():
+            return store_path
+
+        cache_path = self.cache_dir / relative_path
+        if self.touch(relative_path, cache_path):
+            return cache_path
+
+        with self.lock:
+            if self.misses.get(relative_path, 0) > time.monotonic():
+                return None
+            fetch_lock = self.fetch_locks.setdefault(relative_path, threading.Lock())
+
+        # One fetch per path; concurrent requests for it wait and then find the file
+        with fetch_lock:
+            try:
+                if self.touch(relative_path, cache_path):
+                    return cache_path
+
+                image_url = self.source_url(relative_path)
+                if not image_url:
+                    with self.lock:
+                        self.misses[relative_path] = time.monotonic() + config.IMAGE_PROXY_MISS_TTL
+                    return None
+                if not self.downloader.fetch_image(image_url, cache_path):
+                    return None
+
+                with self.lock:
+                    self.lru[relative_path] = cache_path.stat().st_size
+                    self.cache_bytes += self.lru[relative_path]
+                self.evict()
+                return cache_path
+            finally:
+                with self.lock:
+                    self.fetch_locks.pop(relative_path, None)
+
+    def touch(self, relative_path, cache_path):
+        """Mark a cached file as just used; False when it is not cached"""
+        with self.lock:
+            if relative_path not in self.lru:
+                return False
+            self.lru.move_to_end(relative_path)
+        try:
+            os.utime(cache_path)
+        except FileNotFoundError:
+            with self.lock:
+                self.cache_bytes -= self.lru.pop(relative_path, 0)
+            return False
+        return True
+
+
+class ImageProxyHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.serve(send_body=True)
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
+
+    def serve(self, send_body):
+        relative_path = urlparse(self.path).path.lstrip('/')
+        filepath = self.server.proxy.get(relative_path) if '..' not in relative_path else None
+        if filepath is None:
+            self.send_error(404)
+            return
+
+        try:
+            body = filepath.read_bytes()
+        except FileNotFoundError:  # evicted in the meantime
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', f'public, max-age={config.IMAGE_PROXY_MAX_AGE}')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def create_server(proxy, host, port):
+    server = ThreadingHTTPServer((host, port), ImageProxyHandler)
+    server.daemon_threads = True
+    server.proxy = proxy
+    return server
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve images from the image tree and fetch missing ones from TMDB')
+    parser.add_argument('--cdn-repo-path',
+                       help='Path to the CDN repository whose images are served first')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=config.IMAGE_PROXY_PORT,
+                       help=f'Port to listen on (default: {config.IMAGE_PROXY_PORT})')
+    parser.add_argument('--cache-dir', default=config.IMAGE_PROXY_CACHE_DIR,
+                       help=f'Directory for images fetched on demand (default: {config.IMAGE_PROXY_CACHE_DIR})')
+    parser.add_argument('--cache-mb', type=int, default=config.IMAGE_PROXY_CACHE_MB,
+                       help=f'Disk budget of the cache directory in MB (default: {config.IMAGE_PROXY_CACHE_MB})')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    try:
+        # Token bucket instead of the fixed per-request delay, so a page full of misses can burst
+        rate_limiter = RateLimiter(config.TMDB_RATE_LIMIT, config.TMDB_RATE_PERIOD)
+        downloader = MediaDownloader(cdn_repo_path=args.cdn_repo_path, rate_limiter=rate_limiter)
+        proxy = ImageProxy(downloader, args.cache_dir, args.cache_mb * 1024 * 1024)
+        server = create_server(proxy, args.host, args.port)
+    except Exception as e:
+        logger.error(f"Script failed: {e}")
+        exit(1)
+
+    logger.info(f"Image proxy listening on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
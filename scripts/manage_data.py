@@ -8,17 +8,22 @@ It can be used to run both operations sequentially or individually.
 
 import os
 import sys
+import json
 import argparse
 import logging
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 from pathlib import Path
 
 # Add scripts directory to path to import other modules
 sys.path.append(str(Path(__file__).parent))
 
+# Only light modules are imported here; the fetcher, downloader and their dependencies
+# (requests, dotenv...) are imported by the actions that use them, so status/check/cleanup start fast
 try:
-    from fetch_trakt_data import TraktUserDataClient
-    from download_media import MediaDownloader
+    import config
+    from metrics import RequestMetrics
+    from profiling import NULL_PROFILER, create_profiler
 except ImportError as e:
     print(f"Error importing modules: {e}")
     print("Make sure all required files are in the scripts directory")
@@ -36,15 +41,20 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class TraktDataManager:
-    def __init__(self):
+    def __init__(self, cdn_repo_path=None, time_budget=None, profiler=None):
         self.start_time = datetime.now()
+        self.cdn_repo_path = cdn_repo_path
+        self.time_budget = time_budget  # seconds for the whole run, counted from start_time
+        self.metrics = RequestMetrics()
+        self.profiler = profiler or NULL_PROFILER
         logger.info("Initializing Trakt Data Manager...")
     
     def fetch_data_only(self):
         """Fetch Trakt data only"""
         logger.info("Starting Trakt data fetch...")
         try:
-            client = TraktUserDataClient()
+            from fetch_trakt_data import TraktUserDataClient
+            client = TraktUserDataClient(metrics=self.metrics, profiler=self.profiler)
             client.fetch_all_user_data()
             logger.info("Trakt data fetch completed successfully!")
             return True
@@ -56,7 +66,10 @@ class TraktDataManager:
         """Download media files only"""
         logger.info("Starting media download...")
         try:
-            downloader = MediaDownloader()
+            from download_media import MediaDownloader
+            downloader = MediaDownloader(cdn_repo_path=self.cdn_repo_path, metrics=self.metrics,
+                                         profiler=self.profiler)
+            self.apply_time_budget(downloader)
             downloader.download_all_media()
             logger.info("Media download completed successfully!")
             return True
@@ -64,20 +77,63 @@ class TraktDataManager:
             logger.error(f"Media download failed: {e}")
             return False
     
-    def full_update(self):
-        """Perform full update: fetch data then download media"""
-        logger.info("Starting full update process...")
+    def apply_time_budget(self, downloader):
+        """Give the downloader whatever is left of the run's time budget"""
+        if self.time_budget:
+            elapsed = (datetime.now() - self.start_time).total_seconds()
+            downloader.set_time_budget(self.time_budget - elapsed)
+    
+    def streamed_update(self):
+        """Fetch data and download media at the same time: each saved file's titles go
+        straight from memory to the download queue while the next endpoints are fetched"""
+        from fetch_trakt_data import TraktUserDataClient
+        from download_media import MediaDownloader
         
-        # Step 1: Fetch Trakt data
-        if not self.fetch_data_only():
-            logger.error("Full update failed at data fetch step")
+        try:
+            downloader = MediaDownloader(cdn_repo_path=self.cdn_repo_path, metrics=self.metrics,
+                                         profiler=self.profiler)
+            self.apply_time_budget(downloader)
+        except Exception as e:
+            logger.error(f"Media download failed: {e}")
             return False
         
-        # Step 2: Download media
-        if not self.download_media_only():
-            logger.error("Full update failed at media download step")
+        downloader.start_stream()
+        try:
+            client = TraktUserDataClient(metrics=self.metrics, profiler=self.profiler,
+                                         on_save=downloader.submit_items)
+            client.fetch_all_user_data()
+        except Exception as e:
+            logger.error(f"Trakt data fetch failed: {e}")
+            downloader.finish_stream(abort=True)
             return False
         
+        logger.info("Trakt data fetch completed, waiting for the remaining media downloads...")
+        downloader.finish_stream(client.data_dir)
+        downloader.save_results()
+        return True
+    
+    def full_update(self, stream=True):
+        """Perform full update: fetch data and download media (overlapped unless stream=False)"""
+        logger.info("Starting full update process...")
+        
+        if stream:
+            if not self.streamed_update():
+                logger.error("Full update failed")
+                return False
+        else:
+            # Step 1: Fetch Trakt data
+            if not self.fetch_data_only():
+                logger.error("Full update failed at data fetch step")
+                return False
+            
+            # Step 2: Download media
+            if not self.download_media_only():
+                logger.error("Full update failed at media download step")
+                return False
+        
+        # Season totals and title features from this download complete the derived tables
+        self.refresh_derived_data(Path('public/data/json'))
+        
         # Calculate total time
         end_time = datetime.now()
         duration = end_time - self.start_time
@@ -85,6 +141,182 @@ class TraktDataManager:
         logger.info(f"Full update completed successfully in {duration}")
         return True
     
+    def refresh_derived_data(self, data_dir):
+        """Rebuild the show progress table, related titles and data manifest for one user's data tree"""
+        from show_progress import write_show_progress, load_season_counts
+        from related_titles import write_related_titles, load_title_features
+        from data_manifest import write_data_manifest
+        
+        with self.profiler.stage('derived_data'):
+            write_show_progress(data_dir, load_season_counts(config.SEASON_COUNTS_FILE))
+            write_related_titles(data_dir, load_title_features(config.TITLE_FEATURES_FILE))
+            write_data_manifest(data_dir, config.HOT_DATA_FILES)
+    
+    def plan_downloads(self, presence_source='scan'):
+        """Print the remaining media download work without making any network calls"""
+        from download_media import MediaDownloader
+        
+        downloader = MediaDownloader(cdn_repo_path=self.cdn_repo_path, metrics=self.metrics,
+                                     offline=True, presence_source=presence_source)
+        with self.profiler.stage('plan'):
+            plan = downloader.plan_downloads()
+        
+        logger.info(f"Download plan for {plan['movies']} movies and {plan['shows']} shows:")
+        for category, count in plan['missing'].items():
+            logger.info(f"  {category}: {count} missing")
+        logger.info(f"Estimated TMDB API calls: {plan['api_calls']}")
+        logger.info(f"Estimated image downloads: {plan['downloads']}")
+        if plan['shows_without_season_info']:
+            logger.info(f"{plan['shows_without_season_info']} shows have no local season data; "
+                       f"their season posters are not included in the estimate")
+        logger.info(f"Estimated time: {timedelta(seconds=plan['eta_seconds'])}")
+        return plan
+    
+    def optimize_media(self, workers=None):
+        """Losslessly recompress new posters and backdrops in the image tree"""
+        logger.info("Starting lossless image optimization...")
+        try:
+            from download_media import MediaDownloader
+            from optimize_media import ImageOptimizer
+            images_dir = MediaDownloader(cdn_repo_path=self.cdn_repo_path, offline=True).images_dir
+            result = ImageOptimizer(images_dir, workers=workers).optimize_all()
+            return result['errors'] == 0
+        except Exception as e:
+            logger.error(f"Image optimization failed: {e}")
+            return False
+    
+    def verify_media(self, workers=None, deep=False):
+        """Find broken or truncated images and queue them for re-download"""
+        logger.info("Starting image integrity scan...")
+        try:
+            from download_media import MediaDownloader
+            from verify_media import ImageVerifier
+            images_dir = MediaDownloader(cdn_repo_path=self.cdn_repo_path, offline=True).images_dir
+            ImageVerifier(images_dir, workers=workers, deep=deep).verify_all()
+            return True
+        except Exception as e:
+            logger.error(f"Image integrity scan failed: {e}")
+            return False
+    
+    def user_data_dirs(self):
+        """Every user's data tree: public/data/json and the per-user trees of batch runs"""
+        data_dir = Path('public/data/json')
+        data_dirs = [data_dir] if (data_dir / 'user').is_dir() else []
+        if data_dir.is_dir():
+            data_dirs.extend(sorted(path for path in data_dir.iterdir() if (path / 'user').is_dir()))
+        return data_dirs
+    
+    def collect_garbage(self, grace_days=None, dry_run=False):
+        """Delete images of titles no data file references any more (after a grace period)"""
+        logger.info(f"Starting orphan image collection{' (dry run)' if dry_run else ''}...")
+        try:
+            from download_media import MediaDownloader
+            from gc_media import MediaGarbageCollector
+            downloader = MediaDownloader(cdn_repo_path=self.cdn_repo_path, offline=True)
+            collector = MediaGarbageCollector(downloader, self.user_data_dirs(), grace_days, dry_run)
+            collector.collect()
+            return True
+        except Exception as e:
+            logger.error(f"Orphan image collection failed: {e}")
+            return False
+    
+    def migrate_layout(self, layout):
+        """Move the image tree to another directory layout and rebuild the media index"""
+        logger.info(f"Starting image layout migration to {layout}...")
+        try:
+            from download_media import MediaDownloader
+            from image_layout import migrate_layout
+            images_dir = MediaDownloader(cdn_repo_path=self.cdn_repo_path, offline=True).images_dir
+            migrate_layout(images_dir, layout)
+            # A new instance, so it reads the layout the migration recorded
+            MediaDownloader(cdn_repo_path=self.cdn_repo_path, offline=True).create_media_index()
+            return True
+        except Exception as e:
+            logger.error(f"Image layout migration failed: {e}")
+            return False
+    
+    def derive_data(self):
+        """Rebuild the derived tables of every user's data tree from the files on disk"""
+        logger.info("Rebuilding derived data...")
+        try:
+            data_dirs = self.user_data_dirs()
+            if not data_dirs:
+                logger.error("No user data found; fetch the Trakt data first")
+                return False
+            for data_dir in data_dirs:
+                self.refresh_derived_data(data_dir)
+            logger.info(f"Rebuilt derived data for {len(data_dirs)} data trees")
+            return True
+        except Exception as e:
+            logger.error(f"Rebuilding derived data failed: {e}")
+            return False
+    
+    def merge_index(self, parts_dir=None):
+        """Combine the partial indexes of a sharded download into media_index.json"""
+        logger.info("Merging partial media indexes...")
+        try:
+            from download_media import MediaDownloader
+            downloader = MediaDownloader(cdn_repo_path=self.cdn_repo_path, offline=True)
+            return downloader.merge_partial_indexes(parts_dir)
+        except Exception as e:
+            logger.error(f"Merging partial indexes failed: {e}")
+            return False
+    
+    def batch_update(self, usernames):
+        """Fetch data and download media for several users under one shared rate budget"""
+        logger.info(f"Starting batch update for {len(usernames)} users: {', '.join(usernames)}")
+        from fetch_trakt_data import TraktUserDataClient
+        from download_media import MediaDownloader
+        from rate_limit import RateLimiter
+        
+        trakt_limiter = RateLimiter(config.TRAKT_RATE_LIMIT, config.TRAKT_RATE_PERIOD)
+        tmdb_limiter = RateLimiter(config.TMDB_RATE_LIMIT, config.TMDB_RATE_PERIOD)
+        
+        # One downloader for everyone: posters shared between users are fetched once
+        try:
+            downloader = MediaDownloader(cdn_repo_path=self.cdn_repo_path, metrics=self.metrics,
+                                         rate_limiter=tmdb_limiter, profiler=self.profiler)
+        except Exception as e:
+            logger.error(f"Batch update failed: {e}")
+            return False
+        self.apply_time_budget(downloader)
+        
+        def sync_user(username):
+            client = TraktUserDataClient(
+                metrics=self.metrics,
+                username=username,
+                data_dir=Path('public/data/json') / username,
+                imgs_dir=Path('public/data/imgs') / username,
+                rate_limiter=trakt_limiter,
+                profiler=self.profiler
+            )
+            client.fetch_all_user_data()
+            downloader.process_data_dir(client.data_dir)
+        
+        failed = []
+        with ThreadPoolExecutor(max_workers=min(len(usernames), config.BATCH_MAX_WORKERS)) as executor:
+            futures = {executor.submit(sync_user, username): username for username in usernames}
+            for future in as_completed(futures):
+                username = futures[future]
+                try:
+                    future.result()
+                    logger.info(f"Batch sync completed for user: {username}")
+                except Exception as e:
+                    logger.error(f"Batch sync failed for user {username}: {e}")
+                    failed.append(username)
+        
+        downloader.save_season_counts()
+        downloader.save_title_features()
+        for username in usernames:
+            if username not in failed:
+                self.refresh_derived_data(Path('public/data/json') / username)
+        downloader.create_media_index()
+        
+        duration = datetime.now() - self.start_time
+        logger.info(f"Batch update finished in {duration}: "
+                   f"{len(usernames) - len(failed)} succeeded, {len(failed)} failed")
+        return not failed
+    
     def check_environment(self):
         """Check if all required environment variables are set"""
         required_vars = [
@@ -106,48 +338,69 @@ class TraktDataManager:
         logger.info("Note: Using public Trakt API endpoints (no authentication required)")
         return True
     
+    def media_paths(self):
+        """Image tree and media_index.json location (the same rules as MediaDownloader)"""
+        if self.cdn_repo_path:
+            return Path(self.cdn_repo_path) / 'watch', Path('public/data/media_index.json')
+        images_dir = Path('public/data/imgs')
+        return images_dir, images_dir / 'media_index.json'
+    
+    def read_json(self, path):
+        """Parsed JSON file, or None when it is missing or unreadable"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def count_files(self, root, suffixes):
+        """Count files with the given suffixes under root in one directory walk (fallback only)"""
+        return sum(1 for _, _, filenames in os.walk(root) for filename in filenames
+                   if filename.lower().endswith(suffixes))
+    
     def show_status(self):
-        """Show status of data and media files"""
+        """Show status of data and media files from the manifests each sync writes.
+        The trees are only walked when a manifest is missing."""
         logger.info("Checking data status...")
         
         data_dir = Path('public/data/json')
-        images_dir = Path('public/data/imgs')
+        images_dir, media_index_path = self.media_paths()
         
         if not data_dir.exists():
             logger.warning("JSON data directory doesn't exist")
         else:
-            json_files = list(data_dir.rglob('*.json'))
-            logger.info(f"Found {len(json_files)} JSON files")
+            manifest = self.read_json(data_dir / 'manifest.json')
+            if manifest:
+                files = manifest.get('files', {})
+                size = sum(entry.get('size', 0) for entry in files.values())
+                logger.info(f"Found {len(files)} JSON files ({size / 1024 / 1024:.1f} MB, pages not counted) "
+                           f"in the data manifest of {manifest.get('generated_at')}")
+            else:
+                logger.info(f"Found {self.count_files(data_dir, ('.json',))} JSON files (no data manifest yet)")
             
             # Check index file
-            index_file = data_dir / 'index.json'
-            if index_file.exists():
-                with open(index_file, 'r') as f:
-                    import json
-                    index_data = json.load(f)
-                    if 'last_updated' in index_data:
-                        logger.info(f"Data last updated: {index_data['last_updated']}")
+            index_data = self.read_json(data_dir / 'index.json')
+            if index_data and 'last_updated' in index_data:
+                logger.info(f"Data last updated: {index_data['last_updated']}")
         
         if not images_dir.exists():
             logger.warning("Images directory doesn't exist")
         else:
-            image_files = list(images_dir.rglob('*.jpg')) + list(images_dir.rglob('*.png'))
-            logger.info(f"Found {len(image_files)} image files")
-            
-            # Check media index
-            media_index_file = images_dir / 'media_index.json'
-            if media_index_file.exists():
-                with open(media_index_file, 'r') as f:
-                    import json
-                    media_index = json.load(f)
-                    if 'last_updated' in media_index:
-                        logger.info(f"Media last updated: {media_index['last_updated']}")
+            # The compact index manifest carries per-category totals for the whole tree
+            index_manifest = self.read_json(media_index_path.parent / 'media_index' / 'manifest.json')
+            if index_manifest:
+                totals = index_manifest.get('totals', {})
+                logger.info("Media index totals: "
+                           + ', '.join(f"{category} {count}" for category, count in totals.items()))
+                logger.info(f"Media last updated: {index_manifest.get('last_updated')}")
+            else:
+                logger.info(f"Found {self.count_files(images_dir, ('.jpg', '.png'))} image files "
+                           f"(no media index yet)")
     
     def cleanup_old_files(self, days=30):
         """Clean up files older than specified days"""
         logger.info(f"Cleaning up files older than {days} days...")
         
-        from datetime import timedelta
         cutoff_date = datetime.now() - timedelta(days=days)
         
         # Clean up log files
@@ -157,12 +410,15 @@ class TraktDataManager:
                 log_file.unlink()
                 logger.info(f"Deleted old log file: {log_file}")
 
+PROFILED_ACTIONS = ['fetch', 'download', 'full', 'batch', 'plan']
+
 def main():
     """Main function with command line argument parsing"""
     parser = argparse.ArgumentParser(description='Trakt Data Management Utility')
     parser.add_argument(
         'action',
-        choices=['fetch', 'download', 'full', 'status', 'check', 'cleanup'],
+        choices=['fetch', 'download', 'full', 'batch', 'plan', 'derive', 'optimize', 'verify', 'gc',
+                 'merge-index', 'migrate-layout', 'status', 'check', 'cleanup'],
         help='Action to perform'
     )
     parser.add_argument(
@@ -171,6 +427,79 @@ def main():
         default=30,
         help='Days to keep files for cleanup action (default: 30)'
     )
+    parser.add_argument(
+        '--users',
+        default=os.getenv('TRAKT_USERNAMES', ''),
+        help='Comma-separated Trakt usernames for the batch action (default: $TRAKT_USERNAMES)'
+    )
+    parser.add_argument(
+        '--cdn-repo-path',
+        help='Path to the CDN repository where images will be stored'
+    )
+    parser.add_argument(
+        '--presence-from-index',
+        action='store_true',
+        help='Read existing images from media_index.json instead of scanning the image tree'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Worker processes for the optimize and verify actions (default: CPU count)'
+    )
+    parser.add_argument(
+        '--deep',
+        action='store_true',
+        help='For the verify action: decode every image completely, not just its header'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='For the gc action: report what would be deleted without deleting anything'
+    )
+    parser.add_argument(
+        '--grace-days',
+        type=int,
+        help=f'For the gc action: days a title must be unreferenced before its images are deleted '
+             f'(default: {config.GC_GRACE_DAYS})'
+    )
+    parser.add_argument(
+        '--parts-dir',
+        help=f'Directory with the partial indexes for merge-index '
+             f'(default: {config.MEDIA_INDEX_PARTS_DIR}/ next to media_index.json)'
+    )
+    parser.add_argument(
+        '--layout',
+        choices=['flat', 'hashed'],
+        help='For the migrate-layout action: the directory layout to move the image tree to'
+    )
+    parser.add_argument(
+        '--sequential',
+        action='store_true',
+        help='For the full action: fetch everything first, then download (no overlap)'
+    )
+    parser.add_argument(
+        '--time-budget',
+        type=float,
+        help='Seconds the download, full or batch run may take; downloads stop early, '
+             'highest-priority titles first, and the index is still saved'
+    )
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const=config.PROFILE_DIR,
+        help=f'Profile each stage with cProfile and tracemalloc (fetch, download, full, batch, plan); '
+             f'results go to this directory (default: {config.PROFILE_DIR})'
+    )
+    parser.add_argument(
+        '--metrics-dir',
+        default=config.METRICS_DIR,
+        help=f'Directory for per-endpoint run metrics reports (default: {config.METRICS_DIR})'
+    )
+    parser.add_argument(
+        '--no-metrics',
+        action='store_true',
+        help='Do not write a run metrics report'
+    )
     parser.add_argument(
         '--verbose',
         action='store_true',
@@ -182,10 +511,17 @@ def main():
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
     
-    manager = TraktDataManager()
+    profiler = create_profiler(args.profile, args.action) if args.action in PROFILED_ACTIONS else None
+    manager = TraktDataManager(cdn_repo_path=args.cdn_repo_path, time_budget=args.time_budget,
+                               profiler=profiler)
+    
+    # Actions that call the APIs need the keys from .env.local
+    if args.action in ['fetch', 'download', 'full', 'batch', 'check']:
+        from dotenv import load_dotenv
+        load_dotenv('../.env.local')  # Look in project root folder
     
     # Check environment variables for actions that need them
-    if args.action in ['fetch', 'download', 'full']:
+    if args.action in ['fetch', 'download', 'full', 'batch']:
         if not manager.check_environment():
             sys.exit(1)
     
@@ -196,7 +532,31 @@ def main():
     elif args.action == 'download':
         success = manager.download_media_only()
     elif args.action == 'full':
-        success = manager.full_update()
+        success = manager.full_update(stream=not args.sequential)
+    elif args.action == 'batch':
+        usernames = [name.strip() for name in args.users.split(',') if name.strip()]
+        if not usernames:
+            logger.error("The batch action needs --users or TRAKT_USERNAMES")
+        else:
+            success = manager.batch_update(usernames)
+    elif args.action == 'plan':
+        manager.plan_downloads('index' if args.presence_from_index else 'scan')
+        success = True
+    elif args.action == 'derive':
+        success = manager.derive_data()
+    elif args.action == 'optimize':
+        success = manager.optimize_media(args.workers)
+    elif args.action == 'verify':
+        success = manager.verify_media(args.workers, args.deep)
+    elif args.action == 'gc':
+        success = manager.collect_garbage(args.grace_days, args.dry_run)
+    elif args.action == 'merge-index':
+        success = manager.merge_index(args.parts_dir)
+    elif args.action == 'migrate-layout':
+        if not args.layout:
+            logger.error("The migrate-layout action needs --layout flat or --layout hashed")
+        else:
+            success = manager.migrate_layout(args.layout)
     elif args.action == 'status':
         manager.show_status()
         success = True
@@ -206,6 +566,14 @@ def main():
         manager.cleanup_old_files(args.cleanup_days)
         success = True
     
+    # Record where the run spent its time for actions that hit the network
+    if args.action in ['fetch', 'download', 'full', 'batch'] and not args.no_metrics:
+        manager.metrics.write_report(args.metrics_dir, args.action, success=success,
+                                     keep_runs=config.METRICS_KEEP_RUNS)
+    
+    if profiler:
+        profiler.write_summary()
+    
     if not success:
         logger.error(f"Action '{args.action}' failed")
         sys.exit(1)
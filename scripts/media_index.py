@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Compact Media Index
+
+Writes the media index as small integer-based shards next to media_index.json, so a lookup
+like "does this id have a poster?" only needs the manifest and one shard instead of the
+whole filename list. Layout (in public/data/media_index/):
+- manifest.json   shard size, {shard number: entry count} for non-empty shards, totals and
+                  the image tree layout (image_layout.py) needed to turn ids into paths
+- shard_<n>.json  ids in [n * shard_size, (n + 1) * shard_size):
+                  sorted id arrays per category and an id -> [season numbers] map
+
+filter_index and merge_indexes cut a media_index.json structure down to one download shard
+(--shard i/N) and join the partial indexes of all shards again.
+"""
+
+import os
+import re
+import json
+from datetime import datetime
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+COMPACT_INDEX_VERSION = 1
+FILENAME_ID = re.compile(r'^(\d+)_(?:poster|backdrop)\.jpg$')
+SEASON_FILENAME = re.compile(r'^season_(\d+)_poster\.jpg$')
+
+
+def filename_ids(filenames):
+    """Integer TMDB ids from names like '17801_poster.jpg'"""
+    ids = set()
+    for filename in filenames:
+        match = FILENAME_ID.match(filename)
+        if match:
+            ids.add(int(match.group(1)))
+    return ids
+
+
+def season_numbers(seasons):
+    """Season numbers that have a poster, from {'1': ['season_1_poster.jpg'], ...}"""
+    numbers = set()
+    for season_number, filenames in seasons.items():
+        if any(SEASON_FILENAME.match(filename) for filename in filenames) and season_number.isdigit():
+            numbers.add(int(season_number))
+    return sorted(numbers)
+
+
+def build_shards(media_index, shard_size):
+    """Split a media_index.json structure into {shard_number: compact shard}"""
+    categories = {
+        ('movies', 'posters'): filename_ids(media_index['movies']['posters']),
+        ('movies', 'backdrops'): filename_ids(media_index['movies']['backdrops']),
+        ('shows', 'posters'): filename_ids(media_index['shows']['posters']),
+        ('shows', 'backdrops'): filename_ids(media_index['shows']['backdrops']),
+    }
+
+    def empty_shard():
+        return {
+            'movies': {'posters': [], 'backdrops': []},
+            'shows': {'posters': [], 'backdrops': [], 'season_posters': {}}
+        }
+
+    shards = {}
+    for (media_type, category), ids in categories.items():
+        for tmdb_id in sorted(ids):
+            shard = shards.setdefault(tmdb_id // shard_size, empty_shard())
+            shard[media_type][category].append(tmdb_id)
+
+    for show_id, seasons in sorted(media_index['shows']['season_posters'].items(), key=lambda x: int(x[0])):
+        numbers = season_numbers(seasons)
+        if show_id.isdigit() and numbers:
+            shard = shards.setdefault(int(show_id) // shard_size, empty_shard())
+            shard['shows']['season_posters'][show_id] = numbers
+
+    return shards
+
+
+def shard_counts(shard):
+    return {
+        'movies/posters': len(shard['movies']['posters']),
+        'movies/backdrops': len(shard['movies']['backdrops']),
+        'shows/posters': len(shard['shows']['posters']),
+        'shows/backdrops': len(shard['shows']['backdrops']),
+        'shows/season_posters': len(shard['shows']['season_posters'])
+    }
+
+
+def write_compact_index(media_index, output_dir, shard_size):
+    """Write the manifest and shards for a media index; returns the manifest"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    shards = build_shards(media_index, shard_size)
+    manifest = {
+        'version': COMPACT_INDEX_VERSION,
+        'last_updated': media_index.get('last_updated', datetime.now().isoformat()),
+        'shard_size': shard_size,
+        'layout': media_index.get('layout', 'flat'),
+        'file_pattern': 'shard_{n}.json',
+        'shards': {},
+        'totals': {}
+    }
+
+    for shard_number, shard in sorted(shards.items()):
+        filename = f'shard_{shard_number}.json'
+        with open(output_dir / filename, 'w', encoding='utf-8') as f:
+            json.dump(shard, f, separators=(',', ':'))
+
+        counts = shard_counts(shard)
+        manifest['shards'][str(shard_number)] = sum(counts.values())
+        for category, count in counts.items():
+            manifest['totals'][category] = manifest['totals'].get(category, 0) + count
+
+    # Write the manifest after the shards so readers never see it point at missing files
+    tmp_path = output_dir / 'manifest.json.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, output_dir / 'manifest.json')
+
+    # Drop shards whose id range no longer has any images
+    current_files = {f'shard_{shard_number}.json' for shard_number in manifest['shards']}
+    for stale in output_dir.glob('shard_*.json'):
+        if stale.name not in current_files:
+            stale.unlink()
+
+    logger.info(f"Wrote compact media index: {len(shards)} shards in {output_dir}")
+    return manifest
+
+
+def filename_id(filename):
+    """Integer TMDB id of a name like '17801_poster.jpg' (None for other names)"""
+    match = FILENAME_ID.match(filename)
+    return int(match.group(1)) if match else None
+
+
+def filter_index(media_index, keep_id):
+    """Copy of a media index with only the images whose TMDB id passes keep_id.
+    Names without an id are always kept (a merge de-duplicates them)."""
+    def keep_names(filenames):
+        return [name for name in filenames if filename_id(name) is None or keep_id(filename_id(name))]
+
+    return {
+        'last_updated': media_index['last_updated'],
+        'layout': media_index.get('layout', 'flat'),
+        'movies': {category: keep_names(media_index['movies'][category]) for category in ('posters', 'backdrops')},
+        'shows': {
+            'posters': keep_names(media_index['shows']['posters']),
+            'backdrops': keep_names(media_index['shows']['backdrops']),
+            'season_posters': {show_id: seasons for show_id, seasons in media_index['shows']['season_posters'].items()
+                               if not show_id.isdigit() or keep_id(int(show_id))}
+        }
+    }
+
+
+def merge_indexes(indexes):
+    """Union of several media indexes, such as the partial indexes of a sharded download"""
+    layouts = {index.get('layout', 'flat') for index in indexes}
+    if len(layouts) > 1:
+        raise ValueError(f"Cannot merge media indexes of different image layouts: {sorted(layouts)}")
+    merged = {
+        'last_updated': max(index['last_updated'] for index in indexes),
+        'layout': layouts.pop(),
+        'movies': {'posters': set(), 'backdrops': set()},
+        'shows': {'posters': set(), 'backdrops': set(), 'season_posters': {}}
+    }
+    for index in indexes:
+        for media_type, category in [('movies', 'posters'), ('movies', 'backdrops'),
+                                     ('shows', 'posters'), ('shows', 'backdrops')]:
+            merged[media_type][category].update(index[media_type][category])
+        for show_id, seasons in index['shows']['season_posters'].items():
+            show_seasons = merged['shows']['season_posters'].setdefault(show_id, {})
+            for season_number, filenames in seasons.items():
+                show_seasons[season_number] = sorted(set(show_seasons.get(season_number, [])) | set(filenames))
+
+    for media_type, category in [('movies', 'posters'), ('movies', 'backdrops'),
+                                 ('shows', 'posters'), ('shows', 'backdrops')]:
+        merged[media_type][category] = sorted(merged[media_type][category])
+    return merged
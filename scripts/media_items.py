@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Media Work Items
+
+Turns the Trakt items of the download sources into small MediaItem records once, as a file
+is read, so the download pipeline never holds on to (or re-inspects) the raw Trakt dicts.
+A MediaItem keeps only what downloading needs:
+- media type ('movie' | 'show') and TMDB id
+- queue priority (recent watches, then watchlist rank, then lists)
+- source bits (SOURCE_*) for every kind of file that references the title
+- season numbers known locally (watched seasons and history episodes), for the planner
+
+A title that appears in several files (history, watched, watchlist...) becomes one record.
+shard_of assigns titles to download shards (--shard i/N) by a stable hash of the TMDB id.
+"""
+
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+SOURCE_HISTORY = 1
+SOURCE_WATCHED = 2
+SOURCE_WATCHLIST = 4
+SOURCE_LIST = 8
+
+
+@dataclass(slots=True)
+class MediaItem:
+    media_type: str
+    tmdb_id: int
+    priority: tuple
+    sources: int = 0
+    seasons: frozenset = frozenset()
+
+    def merge(self, other):
+        """Fold another record of the same title into this one"""
+        self.priority = min(self.priority, other.priority)
+        self.sources |= other.sources
+        if other.seasons:
+            self.seasons = self.seasons | other.seasons
+
+
+def source_flag(source_path):
+    """SOURCE_* bit for a data file path"""
+    parts = Path(source_path).parts
+    if 'history' in parts:
+        return SOURCE_HISTORY
+    if 'watched' in parts:
+        return SOURCE_WATCHED
+    if 'watchlist' in parts:
+        return SOURCE_WATCHLIST
+    return SOURCE_LIST
+
+
+def item_priority(source, item):
+    """Sort key for the download queue: recent watches, then watchlist rank, then lists"""
+    if source in (SOURCE_HISTORY, SOURCE_WATCHED):
+        watched_at = item.get('watched_at') or item.get('last_watched_at')
+        try:
+            timestamp = datetime.fromisoformat(watched_at.replace('Z', '+00:00')).timestamp()
+        except (AttributeError, ValueError):
+            timestamp = 0
+        return (0, -timestamp)
+    if source == SOURCE_WATCHLIST:
+        return (1, item.get('rank') or float('inf'))
+    return (2, item.get('rank') or float('inf'))
+
+
+def raw_items(data, source_path):
+    """Yield ('movie' | 'show', item) for every title in loaded JSON data"""
+    # Extract actual data (handle metadata wrapper)
+    if isinstance(data, dict) and 'data' in data:
+        items = data['data']
+    else:
+        items = data
+
+    if not isinstance(items, list):
+        items = [items]
+
+    for item in items:
+        if isinstance(item, dict):
+            # Check if it's a movie
+            if 'movie' in item or (item.get('type') == 'movie'):
+                yield 'movie', item
+            # Check if it's a show
+            elif 'show' in item or (item.get('type') == 'show'):
+                yield 'show', item
+            # Check if it has direct movie/show data
+            elif 'ids' in item:
+                # Try to determine type from context or filename
+                if 'movie' in str(source_path).lower():
+                    yield 'movie', item
+                elif 'show' in str(source_path).lower():
+                    yield 'show', item
+
+
+def tmdb_id_of(item, media_type):
+    """Extract the TMDB ID from the different Trakt item shapes"""
+    if 'ids' in item:
+        return item['ids'].get('tmdb')
+    elif media_type in item and 'ids' in item[media_type]:
+        return item[media_type]['ids'].get('tmdb')
+    elif 'tmdb' in item:
+        return item['tmdb']
+    return None
+
+
+def local_seasons(item):
+    """Season numbers a show item mentions: watched seasons and a history episode's season"""
+    seasons = {season['number'] for season in item.get('seasons', []) if 'number' in season}
+    if isinstance(item.get('episode'), dict) and item['episode'].get('season') is not None:
+        seasons.add(item['episode']['season'])
+    return frozenset(seasons)
+
+
+def iter_media_items(data, source_path):
+    """Yield a MediaItem for every title with a TMDB id in loaded JSON data"""
+    flag = source_flag(source_path)
+    for media_type, item in raw_items(data, source_path):
+        tmdb_id = tmdb_id_of(item, media_type)
+        if not tmdb_id:
+            logger.warning(f"No TMDB ID found for {media_type} in {source_path}: {item.get(media_type, item)}")
+            continue
+        yield MediaItem(media_type, tmdb_id, item_priority(flag, item), flag,
+                        local_seasons(item) if media_type == 'show' else frozenset())
+
+
+def merge_items(items):
+    """One record per title, most important first (ties keep the order titles were first seen)"""
+    table = {}
+    for item in items:
+        key = (item.media_type, item.tmdb_id)
+        if key in table:
+            table[key].merge(item)
+        else:
+            table[key] = item
+    return sorted(table.values(), key=lambda item: item.priority)
+
+
+def shard_of(tmdb_id, shard_count):
+    """Shard number (1..shard_count) of a TMDB id; the same on every machine and run"""
+    return zlib.crc32(str(tmdb_id).encode('ascii')) % shard_count + 1
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Request Metrics for Trakt Sync Runs
+
+This module collects per-endpoint network metrics for the Trakt and TMDB clients
+and writes them as a JSON run report and a Prometheus textfile. It records:
+- Request count, bytes and latency percentiles
+- Rate limited (429) responses and retries
+- Seconds spent sleeping for rate limiting
+- Cache hits (files that did not need to be downloaded)
+"""
+
+import json
+import math
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, pct):
+    """Return the nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    rank = math.ceil(pct / 100.0 * len(values))
+    return values[max(0, min(len(values), rank) - 1)]
+
+
+class EndpointStats:
+    """Counters for a single (client, endpoint) pair"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.sleep_seconds = 0.0
+        self.cache_hits = 0
+        self.latencies = []
+
+    def to_dict(self):
+        latencies = sorted(self.latencies)
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'rate_limited': self.rate_limited,
+            'retries': self.retries,
+            'sleep_seconds': round(self.sleep_seconds, 3),
+            'cache_hits': self.cache_hits,
+            'latency_total_seconds': round(sum(latencies), 3),
+            'latency_p50_seconds': round(percentile(latencies, 50), 4),
+            'latency_p95_seconds': round(percentile(latencies, 95), 4)
+        }
+
+
+class RequestMetrics:
+    """Thread-safe collector of per-endpoint request metrics"""
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def _stats(self, client, endpoint):
+        key = (client, endpoint)
+        stats = self.endpoints.get(key)
+        if stats is None:
+            stats = self.endpoints[key] = EndpointStats()
+        return stats
+
+    def record_request(self, client, endpoint, latency, nbytes=0, error=False):
+        """Record a completed HTTP request"""
+        with self.lock:
+            stats = self._stats(client, endpoint)
+            stats.count += 1
+            stats.bytes += nbytes
+            stats.latencies.append(latency)
+            if error:
+                stats.errors += 1
+
+    def record_rate_limited(self, client, endpoint, retry_after):
+        """Record a 429 response followed by a sleep and a retry"""
+        with self.lock:
+            stats = self._stats(client, endpoint)
+            stats.rate_limited += 1
+            stats.retries += 1
+            stats.sleep_seconds += retry_after
+
+    def record_sleep(self, client, endpoint, seconds):
+        """Record time spent throttling before a request"""
+        with self.lock:
+            self._stats(client, endpoint).sleep_seconds += seconds
+
+    def record_cache_hit(self, client, endpoint):
+        """Record a request that was avoided because the result already existed"""
+        with self.lock:
+            self._stats(client, endpoint).cache_hits += 1
+
+    def summary(self):
+        """Return the collected metrics grouped by client and endpoint"""
+        with self.lock:
+            clients = {}
+            for (client, endpoint), stats in sorted(self.endpoints.items()):
+                clients.setdefault(client, {})[endpoint] = stats.to_dict()
+
+        totals = {}
+        for client, endpoints in clients.items():
+            totals[client] = {
+                field: round(sum(e[field] for e in endpoints.values()), 3)
+                for field in ('count', 'errors', 'bytes', 'rate_limited', 'retries',
+                              'sleep_seconds', 'cache_hits', 'latency_total_seconds')
+            }
+
+        return {'totals': totals, 'endpoints': clients}
+
+    def to_prometheus(self, summary, run_info):
+        """Render a summary in the Prometheus textfile exposition format"""
+        counters = [
+            ('requests_total', 'count', 'counter', 'HTTP requests made'),
+            ('request_errors_total', 'errors', 'counter', 'HTTP requests that failed'),
+            ('response_bytes_total', 'bytes', 'counter', 'Response bytes received'),
+            ('rate_limited_total', 'rate_limited', 'counter', 'Responses with status 429'),
+            ('retries_total', 'retries', 'counter', 'Requests retried after rate limiting'),
+            ('sleep_seconds_total', 'sleep_seconds', 'counter', 'Seconds spent sleeping for rate limits'),
+            ('cache_hits_total', 'cache_hits', 'counter', 'Requests skipped because the file already existed'),
+        ]
+
+        lines = []
+        for name, field, metric_type, help_text in counters:
+            lines.append(f'# HELP trakt_sync_{name} {help_text}')
+            lines.append(f'# TYPE trakt_sync_{name} {metric_type}')
+            for client, endpoints in summary['endpoints'].items():
+                for endpoint, stats in endpoints.items():
+                    lines.append(f'trakt_sync_{name}{{client="{client}",endpoint="{endpoint}"}} {stats[field]}')
+
+        lines.append('# HELP trakt_sync_request_latency_seconds Request latency percentiles')
+        lines.append('# TYPE trakt_sync_request_latency_seconds summary')
+        for client, endpoints in summary['endpoints'].items():
+            for endpoint, stats in endpoints.items():
+                labels = f'client="{client}",endpoint="{endpoint}"'
+                lines.append(f'trakt_sync_request_latency_seconds{{{labels},quantile="0.5"}} {stats["latency_p50_seconds"]}')
+                lines.append(f'trakt_sync_request_latency_seconds{{{labels},quantile="0.95"}} {stats["latency_p95_seconds"]}')
+                lines.append(f'trakt_sync_request_latency_seconds_sum{{{labels}}} {stats["latency_total_seconds"]}')
+                lines.append(f'trakt_sync_request_latency_seconds_count{{{labels}}} {stats["count"]}')
+
+        lines.append('# HELP trakt_sync_run_duration_seconds Wall time of the sync run')
+        lines.append('# TYPE trakt_sync_run_duration_seconds gauge')
+        lines.append(f'trakt_sync_run_duration_seconds{{action="{run_info["action"]}"}} {run_info["duration_seconds"]}')
+        lines.append('# HELP trakt_sync_run_success Whether the sync run succeeded')
+        lines.append('# TYPE trakt_sync_run_success gauge')
+        lines.append(f'trakt_sync_run_success{{action="{run_info["action"]}"}} {int(run_info["success"])}')
+        lines.append('# HELP trakt_sync_last_run_timestamp_seconds Unix time the sync run finished')
+        lines.append('# TYPE trakt_sync_last_run_timestamp_seconds gauge')
+        lines.append(f'trakt_sync_last_run_timestamp_seconds {run_info["finished_at_unix"]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, report_dir, action, success=True, keep_runs=90):
+        """Write the JSON run report, the run history and the Prometheus textfile"""
+        report_dir = Path(report_dir)
+        runs_dir = report_dir / 'runs'
+        runs_dir.mkdir(parents=True, exist_ok=True)
+
+        finished_at = datetime.now(timezone.utc)
+        run_info = {
+            'action': action,
+            'success': success,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': finished_at.isoformat(),
+            'finished_at_unix': int(finished_at.timestamp()),
+            'duration_seconds': round((finished_at - self.started_at).total_seconds(), 3)
+        }
+        summary = self.summary()
+        report = {'run': run_info, **summary}
+
+        run_path = runs_dir / f"{finished_at.strftime('%Y%m%dT%H%M%SZ')}_{action}.json"
+        with open(run_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+        # One line per run so trends can be charted without opening every report
+        with open(report_dir / 'history.ndjson', 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'run': run_info, 'totals': summary['totals']}) + '\n')
+
+        # Write the textfile atomically so a collector never reads a partial file
+        prom_path = report_dir / 'trakt_sync.prom'
+        tmp_path = prom_path.with_suffix('.prom.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus(summary, run_info))
+        os.replace(tmp_path, prom_path)
+
+        # Keep only the most recent run reports
+        run_reports = sorted(runs_dir.glob('*.json'))
+        for old_report in run_reports[:-keep_runs] if keep_runs else []:
+            old_report.unlink()
+
+        logger.info(f"Saved run metrics report to {run_path}")
+        for client, totals in summary['totals'].items():
+            logger.info(f"{client}: {totals['count']} requests, {totals['bytes']} bytes, "
+                       f"{totals['rate_limited']} rate limited, {totals['sleep_seconds']}s sleeping, "
+                       f"{totals['cache_hits']} cache hits")
+        return run_path
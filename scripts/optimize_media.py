@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Lossless Image Optimizer
+
+This script recompresses the posters and backdrops stored in the image tree without
+changing a single pixel or any URL. Each JPEG is rewritten by jpegtran with:
+- Optimized Huffman tables
+- Progressive scans
+- All metadata stripped
+
+Files are processed in parallel with a process pool. A manifest in the image tree records
+every processed file and the bytes saved, so later runs only touch new or replaced files.
+jpegtran is part of libjpeg-turbo (`apt-get install libjpeg-turbo-progs`).
+"""
+
+import os
+import json
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def optimize_file(job):
+    """Recompress one JPEG in place; returns (relative_path, size_before, size_after, error)"""
+    jpegtran, images_dir, relative_path = job
+    filepath = Path(images_dir) / relative_path
+    tmp_path = filepath.with_name(f'.{filepath.name}.opt')
+    size_before = 0
+
+    # A file deleted since the scan is reported as an error instead of stopping the pool
+    try:
+        size_before = filepath.stat().st_size
+        subprocess.run(
+            [jpegtran, '-copy', 'none', '-optimize', '-progressive', '-outfile', str(tmp_path), str(filepath)],
+            check=True, capture_output=True, timeout=60
+        )
+        size_after = tmp_path.stat().st_size
+
+        # Only keep the result when it is actually smaller
+        if 0 < size_after < size_before:
+            os.replace(tmp_path, filepath)
+            return relative_path, size_before, size_after, None
+        return relative_path, size_before, size_before, None
+
+    except (OSError, subprocess.SubprocessError) as e:
+        stderr = getattr(e, 'stderr', None)
+        return relative_path, size_before, size_before, (stderr.decode(errors='replace').strip() if stderr else str(e))
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class ImageOptimizer:
+    def __init__(self, images_dir, workers=None):
+        self.images_dir = Path(images_dir)
+        self.workers = workers or os.cpu_count()
+        self.manifest_path = self.images_dir / config.OPTIMIZE_MANIFEST
+        self.jpegtran = shutil.which('jpegtran')
+
+        if not self.jpegtran:
+            raise RuntimeError("jpegtran not found; install libjpeg-turbo-progs to optimize images")
+
+    def load_manifest(self):
+        """Load the manifest of files that were already optimized"""
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'files': {}, 'total_bytes_saved': 0}
+
+    def save_manifest(self, manifest):
+        manifest['last_updated'] = datetime.now().isoformat()
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def pending_files(self, manifest):
+        """Posters and backdrops that are new or changed since they were optimized"""
+        pending = []
+        for media_type in ('movies', 'shows'):
+            for root, dirs, files in os.walk(self.images_dir / media_type):
+                for filename in files:
+                    if not filename.endswith('.jpg'):
+                        continue
+                    filepath = Path(root) / filename
+                    relative_path = filepath.relative_to(self.images_dir).as_posix()
+                    entry = manifest['files'].get(relative_path)
+                    # A different size means the file was re-downloaded after it was optimized
+                    if entry is None or entry['size'] != filepath.stat().st_size:
+                        pending.append(relative_path)
+        return pending
+
+    def optimize_all(self):
+        """Optimize every pending image and update the manifest"""
+        manifest = self.load_manifest()
+        pending = self.pending_files(manifest)
+        logger.info(f"Optimizing {len(pending)} images with {self.workers} workers "
+                   f"({len(manifest['files'])} already optimized)")
+
+        if not pending:
+            return {'processed': 0, 'bytes_saved': 0, 'errors': 0}
+
+        jobs = [(self.jpegtran, str(self.images_dir), relative_path) for relative_path in pending]
+        bytes_saved = 0
+        errors = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for relative_path, size_before, size_after, error in executor.map(optimize_file, jobs, chunksize=16):
+                if error:
+                    errors += 1
+                    logger.error(f"Error optimizing {relative_path}: {error}")
+                    continue
+                saved = size_before - size_after
+                bytes_saved += saved
+                manifest['files'][relative_path] = {'size': size_after, 'saved': saved}
+
+        manifest['total_bytes_saved'] = manifest.get('total_bytes_saved', 0) + bytes_saved
+        self.save_manifest(manifest)
+
+        logger.info(f"Optimized {len(pending) - errors} images, saved {bytes_saved / 1024 / 1024:.1f} MB "
+                   f"({manifest['total_bytes_saved'] / 1024 / 1024:.1f} MB in total), {errors} errors")
+        return {'processed': len(pending) - errors, 'bytes_saved': bytes_saved, 'errors': errors}
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Losslessly recompress stored posters and backdrops')
+    parser.add_argument('--cdn-repo-path',
+                       help='Path to the CDN repository where images are stored')
+    parser.add_argument('--workers', type=int, help='Number of worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    images_dir = Path(args.cdn_repo_path) / 'watch' if args.cdn_repo_path else Path('public/data/imgs')
+
+    try:
+        result = ImageOptimizer(images_dir, workers=args.workers).optimize_all()
+    except Exception as e:
+        logger.error(f"Script failed: {e}")
+        exit(1)
+
+    if result['errors']:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Pre-paginated Data Pages
+
+Splits large Trakt lists (history and watched) into fixed-size, pre-sorted static pages
+so the site can serve one small file per request instead of loading and slicing the
+whole list. For a list saved as user/history/shows.json this writes:
+- user/history/shows/manifest.json     totals, page size and page counts per sort order
+- user/history/shows/page_<n>.json     pages in the default order (as returned by Trakt)
+- user/history/shows/<sort>/page_<n>.json  pages for each additional sort order
+"""
+
+import os
+import json
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def item_title(item):
+    media = item.get('movie') or item.get('show') or {}
+    return (media.get('title') or '').lower()
+
+
+# Sort orders: name -> (key function, reverse)
+SORT_ORDERS = {
+    'watched_at': (lambda item: item.get('watched_at') or '', True),
+    'last_watched_at': (lambda item: item.get('last_watched_at') or '', True),
+    'plays': (lambda item: item.get('plays') or 0, True),
+    'title': (item_title, False),
+}
+
+
+def write_sorted_pages(output_dir, items, sorts, page_size, metadata):
+    """Write the pages for every sort order plus a manifest; the first sort is the default"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    total = len(items)
+    total_pages = max(1, -(-total // page_size))
+    manifest = {
+        'metadata': metadata,
+        'page_size': page_size,
+        'total': total,
+        'total_pages': total_pages,
+        'default_sort': sorts[0],
+        'sorts': {}
+    }
+
+    for position, sort in enumerate(sorts):
+        key, reverse = SORT_ORDERS[sort]
+        # sorted() is stable, so ties keep the Trakt order
+        ordered = sorted(items, key=key, reverse=reverse)
+        sort_dir = output_dir if position == 0 else output_dir / sort
+        sort_dir.mkdir(parents=True, exist_ok=True)
+
+        for page in range(1, total_pages + 1):
+            page_items = ordered[(page - 1) * page_size:page * page_size]
+            output = {
+                'metadata': {
+                    **metadata,
+                    'sort': sort,
+                    'page': page,
+                    'page_size': page_size,
+                    'total': total,
+                    'total_pages': total_pages,
+                    'count': len(page_items)
+                },
+                'data': page_items
+            }
+            with open(sort_dir / f'page_{page}.json', 'w', encoding='utf-8') as f:
+                json.dump(output, f, indent=2, ensure_ascii=False)
+
+        # Remove pages left over from a longer list
+        for stale in sort_dir.glob('page_*.json'):
+            number = stale.stem[len('page_'):]
+            if not number.isdigit() or int(number) > total_pages:
+                stale.unlink()
+
+        manifest['sorts'][sort] = {
+            'path': 'page_{n}.json' if position == 0 else f'{sort}/page_{{n}}.json',
+            'pages': total_pages
+        }
+
+    tmp_path = output_dir / 'manifest.json.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, output_dir / 'manifest.json')
+
+    logger.info(f"Wrote {total_pages} pages x {len(sorts)} sort orders to {output_dir}")
+    return manifest
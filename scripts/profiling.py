@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Stage Profiling
+
+Optional CPU and memory profiling for pipeline stages (enabled with --profile). Each stage
+runs under cProfile and tracemalloc and leaves in the profile directory:
+- <stage>.pstats   cProfile data (open with `python -m pstats` or snakeviz)
+- <stage>.txt      top functions by cumulative time and top allocation sites
+- summary.json     wall time, peak traced memory and peak RSS for every stage
+
+Without --profile the pipeline uses NULL_PROFILER, whose stages are a no-op context manager.
+Stages do not nest: a stage started while another one is running (for example from a
+second batch thread) runs unprofiled and is counted in the outer stage. cProfile only sees
+the thread that enabled it, so work on a long-lived worker thread (the streaming download
+worker) gets its own concurrent stage, profiled alongside the main thread's stages; its
+peak traced memory counts from the last stage start on any thread.
+"""
+
+import io
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+import logging
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 15
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class NullProfiler:
+    """Profiler used when --profile is off"""
+
+    def stage(self, name, concurrent=False):
+        return nullcontext()
+
+    def write_summary(self):
+        return None
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class StageProfiler:
+    def __init__(self, profile_dir, run_name):
+        self.output_dir = Path(profile_dir) / f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{run_name}"
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.stages = []
+        self.stage_names = set()
+        self.active = False
+        self.running = 0
+        self.started_tracing = False
+        self.lock = threading.Lock()
+        logger.info(f"Profiling enabled, writing results to {self.output_dir}")
+
+    def unique_name(self, name):
+        """Stage names double as file names; repeated stages get a numeric suffix"""
+        candidate, number = name, 2
+        while candidate in self.stage_names:
+            candidate = f'{name}_{number}'
+            number += 1
+        self.stage_names.add(candidate)
+        return candidate
+
+    @contextmanager
+    def stage(self, name, concurrent=False):
+        """Profile one stage (CPU and memory) of the calling thread. A concurrent stage (one
+        per worker thread) runs alongside the other stages instead of being nested in them."""
+        with self.lock:
+            nested = self.active and not concurrent
+            if not nested:
+                if not concurrent:
+                    self.active = True
+                name = self.unique_name(name)
+                # tracemalloc is process-wide: started by the first running stage, stopped by the last
+                if self.running == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self.started_tracing = True
+                else:
+                    tracemalloc.reset_peak()
+                self.running += 1
+        if nested:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            wall_time = time.perf_counter() - started
+            with self.lock:
+                peak_traced = tracemalloc.get_traced_memory()[1]
+                snapshot = tracemalloc.take_snapshot()
+                self.running -= 1
+                if self.running == 0 and self.started_tracing:
+                    tracemalloc.stop()
+                    self.started_tracing = False
+                if not concurrent:
+                    self.active = False
+            self.save_stage(name, profile, snapshot, wall_time, peak_traced)
+
+    def save_stage(self, name, profile, snapshot, wall_time, peak_traced):
+        """Write the pstats file and text report for one stage"""
+        profile.dump_stats(str(self.output_dir / f'{name}.pstats'))
+
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        allocations = [
+            {'site': str(stat.traceback[0]), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+        ]
+
+        functions = io.StringIO()
+        pstats.Stats(profile, stream=functions).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+
+        entry = {
+            'stage': name,
+            'wall_seconds': round(wall_time, 3),
+            'peak_traced_mb': round(peak_traced / (1024 * 1024), 2),
+            'peak_rss_mb': peak_rss_mb(),
+            'top_allocations': allocations
+        }
+        with open(self.output_dir / f'{name}.txt', 'w', encoding='utf-8') as f:
+            f.write(f"Stage {name}: {entry['wall_seconds']}s, peak traced {entry['peak_traced_mb']} MB, "
+                    f"peak RSS {entry['peak_rss_mb']} MB\n\n")
+            f.write("Top allocation sites (live at the end of the stage):\n")
+            for allocation in allocations:
+                f.write(f"  {allocation['size_kb']:>10} KB {allocation['count']:>8} blocks  {allocation['site']}\n")
+            f.write(f"\nTop {TOP_FUNCTIONS} functions by cumulative time:\n")
+            f.write(functions.getvalue())
+
+        self.stages.append(entry)
+        logger.info(f"Profiled {name}: {entry['wall_seconds']}s, peak traced {entry['peak_traced_mb']} MB, "
+                   f"peak RSS {entry['peak_rss_mb']} MB")
+
+    def write_summary(self):
+        """Write summary.json for all profiled stages; returns its path"""
+        summary_path = self.output_dir / 'summary.json'
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump({'stages': self.stages}, f, indent=2)
+        logger.info(f"Profile summary: {summary_path}")
+        return summary_path
+
+
+def create_profiler(profile_dir, run_name):
+    """StageProfiler when profile_dir is set, NULL_PROFILER otherwise"""
+    return StageProfiler(profile_dir, run_name) if profile_dir else NULL_PROFILER
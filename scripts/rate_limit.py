@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Shared Rate Limiting
+
+A thread-safe token bucket that several API clients can share, so concurrent
+syncs for different users stay inside one Trakt or TMDB rate budget.
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket allowing `limit` requests per `period` seconds"""
+
+    def __init__(self, limit, period):
+        self.capacity = float(limit)
+        self.rate = limit / float(period)
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until it is available. Returns the seconds slept."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            # Reserve the token even if it has not refilled yet; callers queue up in order
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
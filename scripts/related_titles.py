@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Related Titles Table
+
+Precomputes "more like this from my library" for the movie and show pages, so a page needs
+one keyed lookup instead of comparing its title with every watched and listed item. Written
+to user/related/titles.json as {'movies': {tmdb_id: [tmdb_ids]}, 'shows': {...}}:
+- the catalog is every title in the watched, history, watchlist and list files
+- each title gets a feature vector: genres, year, runtime and rating (from the TMDB details
+  the downloader caches in TITLE_FEATURES_FILE, see MediaDownloader.save_title_features;
+  titles not fetched yet fall back to the year in the Trakt items) and list co-membership
+  (the watchlist counts as a list)
+- genre and list blocks are scaled to unit length, numbers are standardized, and each block
+  is weighted with RELATED_WEIGHTS; rows are normalized, so similarity is a dot product
+- similarities are computed RELATED_BLOCK_SIZE rows at a time (one matrix product per block)
+  and the top RELATED_TOP_K per row are picked with argpartition
+Movies are only related to movies and shows to shows.
+"""
+
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+import logging
+
+import numpy as np
+
+import config
+from media_items import raw_items, tmdb_id_of
+from show_progress import load_data
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SOURCES = [
+    'user/watched/movies.json',
+    'user/watched/shows.json',
+    'user/history/movies.json',
+    'user/history/shows.json',
+    'user/watchlist/all.json'
+]
+
+
+def catalog_files(data_dir):
+    """(path, list name or None) for every file that contributes titles"""
+    data_dir = Path(data_dir)
+    files = [(data_dir / source, 'watchlist' if 'watchlist' in source else None) for source in CATALOG_SOURCES]
+    files.extend((path, path.name[:-len('_items.json')])
+                 for path in sorted((data_dir / 'user/lists').glob('*_items.json')))
+    return [(path, list_name) for path, list_name in files if path.exists()]
+
+
+def load_title_features(path):
+    """{'movies': {tmdb_id: features}, 'shows': {...}} saved by the downloader"""
+    return load_data(path) or {}
+
+
+def collect_catalog(data_dir, title_features=None):
+    """{('movie' | 'show', tmdb_id): title record} with the fields the features need"""
+    title_features = title_features or {}
+    catalog = {}
+    for path, list_name in catalog_files(data_dir):
+        for media_type, item in raw_items(load_data(path) or [], path):
+            tmdb_id = tmdb_id_of(item, media_type)
+            if not tmdb_id:
+                continue
+            title = item.get(media_type, item)
+            record = catalog.setdefault((media_type, int(tmdb_id)), {
+                'year': None, 'runtime': None, 'rating': None, 'genres': set(), 'lists': set()
+            })
+            # The first file with a value wins; extended fields may only be in some files
+            for field in ('year', 'runtime', 'rating'):
+                if record[field] is None and isinstance(title.get(field), (int, float)) and title[field] > 0:
+                    record[field] = title[field]
+            record['genres'].update(title.get('genres') or [])
+            if list_name:
+                record['lists'].add(list_name)
+
+    # TMDB details are the same for every file a title is in, so they are applied once at the end
+    for (media_type, tmdb_id), record in catalog.items():
+        features = title_features.get(f'{media_type}s', {}).get(str(tmdb_id))
+        if features:
+            for field in ('year', 'runtime', 'rating'):
+                record[field] = features.get(field) or record[field]
+            record['genres'] = set(features.get('genres') or []) or record['genres']
+    return catalog
+
+
+def one_hot_block(sets, weight):
+    """Rows of a multi-hot block (one column per distinct value), scaled to length weight"""
+    vocabulary = {value: column for column, value in enumerate(sorted(set().union(*sets)))}
+    block = np.zeros((len(sets), len(vocabulary)), dtype=np.float32)
+    for row, values in enumerate(sets):
+        block[row, [vocabulary[value] for value in values]] = 1.0
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    return np.divide(block, norms, out=np.zeros_like(block), where=norms > 0) * weight
+
+
+def numeric_column(values, weight, log=False):
+    """Standardized column (missing values sit at the mean), clipped to 3 deviations"""
+    column = np.array([np.nan if value is None else value for value in values], dtype=np.float32)
+    if log:
+        column = np.log1p(column)
+    known = ~np.isnan(column)
+    if known.sum() < 2 or np.std(column[known]) == 0:
+        return np.zeros((len(values), 1), dtype=np.float32)
+    column = (column - column[known].mean()) / column[known].std()
+    return (np.clip(np.nan_to_num(column, nan=0.0), -3, 3) * weight)[:, None]
+
+
+def feature_matrix(records, weights):
+    """Row-normalized feature vectors for a list of title records"""
+    blocks = [
+        one_hot_block([record['genres'] for record in records], weights['genres']),
+        one_hot_block([record['lists'] for record in records], weights['lists']),
+        numeric_column([record['year'] for record in records], weights['year']),
+        numeric_column([record['runtime'] for record in records], weights['runtime'], log=True),
+        numeric_column([record['rating'] for record in records], weights['rating'])
+    ]
+    features = np.hstack(blocks)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return np.divide(features, norms, out=np.zeros_like(features), where=norms > 0)
+
+
+def top_neighbours(features, k, block_size):
+    """(indices, scores) of the k most similar other rows of every row, best first"""
+    count = len(features)
+    k = min(k, count - 1)
+    indices = np.zeros((count, max(k, 0)), dtype=np.int64)
+    scores = np.zeros((count, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return indices, scores
+
+    for start in range(0, count, block_size):
+        end = min(start + block_size, count)
+        # Negated in place (no copy of the block), so the best matches are the smallest values
+        distance = features[start:end] @ features.T
+        np.negative(distance, out=distance)
+        distance[np.arange(end - start), np.arange(start, end)] = np.inf  # not related to itself
+        candidates = np.argpartition(distance, k - 1, axis=1)[:, :k]
+        candidate_distances = np.take_along_axis(distance, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1, kind='stable')
+        indices[start:end] = np.take_along_axis(candidates, order, axis=1)
+        scores[start:end] = -np.take_along_axis(candidate_distances, order, axis=1)
+    return indices, scores
+
+
+def build_related_titles(catalog, k=None, block_size=None, weights=None):
+    """{'movies': {tmdb_id: [tmdb_ids]}, 'shows': {...}} for a catalog from collect_catalog"""
+    k = config.RELATED_TOP_K if k is None else k
+    block_size = block_size or config.RELATED_BLOCK_SIZE
+    weights = weights or config.RELATED_WEIGHTS
+
+    related = {}
+    for media_type in ('movie', 'show'):
+        ids = sorted(tmdb_id for kind, tmdb_id in catalog if kind == media_type)
+        table = {}
+        if ids:
+            features = feature_matrix([catalog[(media_type, tmdb_id)] for tmdb_id in ids], weights)
+            indices, scores = top_neighbours(features, k, block_size)
+            id_array = np.array(ids)
+            for row, tmdb_id in enumerate(ids):
+                # Titles without any features in common are not related
+                neighbours = id_array[indices[row][scores[row] > 0]].tolist()
+                if neighbours:
+                    table[str(tmdb_id)] = neighbours
+        related[f'{media_type}s'] = table
+    return related
+
+
+def write_related_titles(data_dir, title_features=None):
+    """Build and save user/related/titles.json for one user's data tree"""
+    data_dir = Path(data_dir)
+    catalog = collect_catalog(data_dir, title_features)
+    if not catalog:
+        logger.info("No titles yet, skipping related titles")
+        return None
+
+    related = build_related_titles(catalog)
+    output = {
+        'metadata': {
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'source': 'watched_history_watchlist_lists_tmdb_details',
+            'top_k': config.RELATED_TOP_K,
+            'count': {media_type: len(table) for media_type, table in related.items()}
+        },
+        'data': related
+    }
+    output_path = data_dir / 'user/related/titles.json'
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, separators=(',', ':'))
+
+    logger.info(f"Saved related titles for {len(related['movies'])} movies and {len(related['shows'])} shows "
+               f"to {output_path}")
+    return related
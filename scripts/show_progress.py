@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Show Progress Table
+
+Builds one progress row per show from history/shows.json and watched/shows.json in a
+single pass, so a show page needs one keyed lookup instead of walking nested seasons and
+raw history events. Written to user/progress/shows.json as {tmdb_id: row} with:
+- watched and total episodes per season (totals from the TMDB season counts the
+  downloader caches, see MediaDownloader.save_season_counts)
+- first and last watch dates, the last watched episode
+- the next unwatched episode (when season totals are known)
+- rewatch counts (extra plays and the number of episodes watched more than once)
+"""
+
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def load_data(path):
+    """The 'data' payload of a saved JSON file, or None when it is missing"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        content = json.load(f)
+    return content.get('data') if isinstance(content, dict) and 'metadata' in content else content
+
+
+def next_episode(watched, season_totals):
+    """First unwatched regular episode in (season, number) order, given known season totals"""
+    for season_number in sorted(int(s) for s in season_totals if int(s) > 0):
+        for number in range(1, season_totals[str(season_number)] + 1):
+            if (season_number, number) not in watched:
+                return {'season': season_number, 'number': number}
+    return None
+
+
+def build_show_progress(history, watched_shows, season_counts):
+    """Progress rows keyed by TMDB id (as a string)"""
+    rows = {}
+
+    for item in watched_shows or []:
+        show = item.get('show', {})
+        tmdb_id = show.get('ids', {}).get('tmdb')
+        if not tmdb_id:
+            continue
+
+        key = str(tmdb_id)
+        totals = season_counts.get(key, {})
+        seasons = {}
+        episodes = set()
+        extra_plays = 0
+        rewatched_episodes = 0
+        last_episode = None
+        first_watched_at = None
+
+        for season in item.get('seasons', []):
+            season_number = season.get('number')
+            if season_number is None:
+                continue
+            for episode in season.get('episodes', []):
+                episodes.add((season_number, episode.get('number')))
+                plays = episode.get('plays', 1)
+                if plays > 1:
+                    extra_plays += plays - 1
+                    rewatched_episodes += 1
+                watched_at = episode.get('last_watched_at')
+                if watched_at and (last_episode is None or watched_at > last_episode['watched_at']):
+                    last_episode = {'season': season_number, 'number': episode.get('number'), 'watched_at': watched_at}
+                if watched_at and (first_watched_at is None or watched_at < first_watched_at):
+                    first_watched_at = watched_at
+            seasons[str(season_number)] = {
+                'watched': len(season.get('episodes', [])),
+                'total': totals.get(str(season_number))
+            }
+
+        # Seasons nothing was watched from yet still count towards the totals
+        for season_number, total in totals.items():
+            seasons.setdefault(season_number, {'watched': 0, 'total': total})
+
+        regular_totals = [total for season_number, total in totals.items() if int(season_number) > 0]
+        episodes_total = sum(regular_totals) if regular_totals else show.get('aired_episodes')
+        episodes_watched = sum(1 for season_number, _ in episodes if season_number > 0)
+
+        rows[key] = {
+            'title': show.get('title'),
+            'trakt': show.get('ids', {}).get('trakt'),
+            'plays': item.get('plays', 0),
+            'episodes_watched': episodes_watched,
+            'episodes_total': episodes_total,
+            'completed': bool(episodes_total) and episodes_watched >= episodes_total,
+            'seasons': dict(sorted(seasons.items(), key=lambda x: int(x[0]))),
+            'first_watched_at': first_watched_at,
+            'last_watched_at': item.get('last_watched_at'),
+            'last_episode': last_episode,
+            'next_episode': next_episode(episodes, totals) if totals else None,
+            'rewatches': {'plays': extra_plays, 'episodes': rewatched_episodes}
+        }
+
+    # History events refine first/last watch dates (history can reach further back than
+    # the watched summary's last_watched_at values)
+    for event in history or []:
+        key = str(event.get('show', {}).get('ids', {}).get('tmdb'))
+        row = rows.get(key)
+        watched_at = event.get('watched_at')
+        if not row or not watched_at:
+            continue
+        if row['first_watched_at'] is None or watched_at < row['first_watched_at']:
+            row['first_watched_at'] = watched_at
+        episode = event.get('episode')
+        if episode and (row['last_episode'] is None or watched_at > row['last_episode']['watched_at']):
+            row['last_episode'] = {'season': episode.get('season'), 'number': episode.get('number'),
+                                   'watched_at': watched_at}
+
+    return rows
+
+
+def load_season_counts(path):
+    """{tmdb_id: {season_number: episode_count}} saved by the downloader"""
+    return load_data(path) or {}
+
+
+def write_show_progress(data_dir, season_counts):
+    """Build and save user/progress/shows.json for one user's data tree"""
+    data_dir = Path(data_dir)
+    watched_shows = load_data(data_dir / 'user/watched/shows.json')
+    if watched_shows is None:
+        logger.info("No watched shows yet, skipping show progress")
+        return None
+
+    history = load_data(data_dir / 'user/history/shows.json')
+    rows = build_show_progress(history, watched_shows, season_counts)
+
+    output = {
+        'metadata': {
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'source': 'history_and_watched',
+            'count': len(rows)
+        },
+        'data': rows
+    }
+    output_path = data_dir / 'user/progress/shows.json'
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+
+    logger.info(f"Saved progress for {len(rows)} shows to {output_path}")
+    return rows
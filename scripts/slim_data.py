@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Slim Data Projections
+
+Writes a small copy of a saved list next to the full file (user/watched/shows.json ->
+user/watched/shows.slim.json) for consumers that only need ids and a few fields, such as
+generate_cover.py and the watched grids. Each slim item keeps:
+- the movie/show as {title, year, ids}
+- plays, last_watched_at, watched_at, rank, listed_at, type (where present)
+- for shows with nested seasons: season_numbers and episodes_watched instead of the seasons
+- for history episodes: {season, number}
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+SLIM_FIELDS = ('id', 'type', 'plays', 'last_watched_at', 'watched_at', 'rank', 'listed_at')
+SLIM_MEDIA_FIELDS = ('title', 'year', 'ids')
+
+
+def slim_item(item):
+    """Projection of one list item"""
+    slim = {field: item[field] for field in SLIM_FIELDS if field in item}
+
+    for media_type in ('movie', 'show'):
+        media = item.get(media_type)
+        if isinstance(media, dict):
+            slim[media_type] = {field: media[field] for field in SLIM_MEDIA_FIELDS if field in media}
+
+    if isinstance(item.get('seasons'), list):
+        seasons = item['seasons']
+        slim['season_numbers'] = [season['number'] for season in seasons if season.get('number', 0) > 0]
+        slim['episodes_watched'] = sum(len(season.get('episodes', [])) for season in seasons)
+
+    episode = item.get('episode')
+    if isinstance(episode, dict):
+        slim['episode'] = {'season': episode.get('season'), 'number': episode.get('number')}
+
+    return slim
+
+
+def write_slim(full_path, items, metadata):
+    """Write <name>.slim.json next to a saved list; returns the slim path"""
+    slim_path = full_path.with_suffix('.slim.json')
+    output = {
+        'metadata': {**metadata, 'projection': 'slim'},
+        'data': [slim_item(item) for item in items if isinstance(item, dict)]
+    }
+    with open(slim_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, separators=(',', ':'), ensure_ascii=False)
+
+    logger.info(f"Saved slim projection to {slim_path}")
+    return slim_path
@@ -0,0 +1,663 @@
+#!/usr/bin/env python3
+"""
+Local Trakt/TMDB Stand-in Server
+
+This script serves a synthetic media library over HTTP so the pipeline can be
+benchmarked without touching the real APIs or spending rate limits. It imitates:
+- Trakt user endpoints (profile, stats, history, watched, watchlist, lists, comments)
+- Trakt pagination and X-Ratelimit headers, with 429 responses once the budget is spent
+- TMDB images, show details, season, episode and person images endpoints plus the image CDN
+- The site's watched API, media index manifest and the poster CDN used by generate_cover.py
+
+URL layout (all on one port):
+- /trakt/...        Trakt API        (TRAKT_API_BASE_URL)
+- /tmdb/3/...       TMDB API         (TMDB_API_BASE_URL)
+- /tmdb/t/p/...     TMDB images      (TMDB_IMAGE_BASE_URL)
+- /site/...         Site API         (COVER_DATA_BASE_URL)
+- /cdn/...          Poster CDN       (COVER_CDN_BASE_URL)
+- /_stats, /_reset  Request counters for the benchmark harness
+"""
+
+import json
+import math
+import random
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import urlparse, parse_qs
+import logging
+
+from slim_data import slim_item
+
+logger = logging.getLogger(__name__)
+
+BASE_TIME = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def iso(dt):
+    """Format a datetime the way Trakt does"""
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+class LazyList:
+    """Sequence whose items are generated on access, so large libraries stay small in memory"""
+
+    def __init__(self, length, factory):
+        self.length = length
+        self.factory = factory
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.factory(i) for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if index < 0 or index >= self.length:
+            raise IndexError(index)
+        return self.factory(index)
+
+
+class SyntheticLibrary:
+    """Deterministic synthetic Trakt library of a given size"""
+
+    def __init__(self, size, username='bench', seed=42):
+        self.size = size
+        self.username = username
+        self.seed = seed
+
+        self.movie_count = int(size * 0.6)
+        self.show_count = size - self.movie_count
+
+        # TMDB ids are spread out like real ones so id-range sharding has something to do
+        rng = random.Random(seed)
+        self.movie_ids = rng.sample(range(1, 1_500_000), self.movie_count)
+        self.show_ids = rng.sample(range(1, 300_000), self.show_count)
+        self.movie_index = {tmdb_id: index for index, tmdb_id in enumerate(self.movie_ids)}
+        self.show_index = {tmdb_id: index for index, tmdb_id in enumerate(self.show_ids)}
+
+        self.watched_movies = self.movie_count * 7 // 10
+        self.watched_shows = self.show_count * 7 // 10
+        self.history_episode_count = self.watched_shows * 5
+
+        self.lists = [
+            ('favorites', 'Favorites', 0.05),
+            ('to-watch-2026', 'To Watch 2026', 0.05),
+            ('action-archive', 'Action Archive', 0.25),
+        ]
+
+    # Base objects
+
+    def movie(self, index, full=False):
+        tmdb_id = self.movie_ids[index]
+        movie = {
+            'title': f'Movie {index}',
+            'year': 1970 + index % 56,
+            'ids': {'trakt': index + 1, 'slug': f'movie-{index}', 'imdb': f'tt{1000000 + index}', 'tmdb': tmdb_id}
+        }
+        if full:
+            movie.update({
+                'runtime': 80 + index % 90,
+                'rating': round(5 + (index % 50) / 10, 1),
+                'genres': [['action', 'drama', 'comedy', 'horror', 'science-fiction'][index % 5],
+                           ['thriller', 'romance', 'adventure'][index % 3]]
+            })
+        return movie
+
+    def show(self, index, full=False):
+        tmdb_id = self.show_ids[index]
+        show = {
+            'title': f'Show {index}',
+            'year': 1990 + index % 36,
+            'ids': {'trakt': 100000 + index, 'slug': f'show-{index}', 'imdb': f'tt{2000000 + index}',
+                    'tmdb': tmdb_id, 'tvdb': 300000 + index},
+            'aired_episodes': self.season_count(tmdb_id) * self.episode_count(tmdb_id)
+        }
+        if full:
+            show.update({
+                'runtime': 20 + index % 40,
+                'rating': round(5 + (index % 45) / 10, 1),
+                'genres': [['drama', 'comedy', 'crime', 'animation', 'documentary'][index % 5]]
+            })
+        return show
+
+    def season_count(self, tmdb_id):
+        return 1 + tmdb_id % 6
+
+    def episode_count(self, tmdb_id):
+        return 6 + tmdb_id % 7
+
+    def watched_at(self, index):
+        return iso(BASE_TIME - timedelta(hours=index * 7))
+
+    # Trakt endpoint payloads
+
+    def profile(self, base_url):
+        return {
+            'username': self.username,
+            'private': False,
+            'name': 'Benchmark User',
+            'vip': False,
+            'ids': {'slug': self.username},
+            'joined_at': iso(BASE_TIME - timedelta(days=3000)),
+            'images': {'avatar': {'full': f'{base_url}/tmdb/t/p/w185/avatar.jpg'}}
+        }
+
+    def stats(self):
+        return {
+            'movies': {'plays': self.watched_movies, 'watched': self.watched_movies, 'minutes': self.watched_movies * 110},
+            'shows': {'watched': self.watched_shows},
+            'episodes': {'plays': self.history_episode_count, 'watched': self.history_episode_count}
+        }
+
+    def history_positions(self):
+        """Positions of movie and episode events within the combined history"""
+        if not hasattr(self, '_history_positions'):
+            movies, total = self.watched_movies, self.watched_movies + self.history_episode_count
+            movie_positions, episode_positions = array('I'), array('I')
+            for i in range(total):
+                # Spread movie watches evenly between episode watches
+                if (i + 1) * movies // total > i * movies // total:
+                    movie_positions.append(i)
+                else:
+                    episode_positions.append(i)
+            self._history_positions = (movie_positions, episode_positions)
+        return self._history_positions
+
+    def history(self, kind, full=False):
+        movie_positions, episode_positions = self.history_positions()
+
+        def movie_event(k):
+            i = movie_positions[k]
+            return {'id': 10_000_000 + i, 'watched_at': self.watched_at(i), 'action': 'watch',
+                    'type': 'movie', 'movie': self.movie(k, full)}
+
+        def episode_event(k):
+            i = episode_positions[k]
+            show_index = k // 5
+            tmdb_id = self.show_ids[show_index]
+            season = 1 + (k % 5) % self.season_count(tmdb_id)
+            number = 1 + k % self.episode_count(tmdb_id)
+            return {'id': 10_000_000 + i, 'watched_at': self.watched_at(i), 'action': 'watch',
+                    'type': 'episode',
+                    'episode': {'season': season, 'number': number, 'title': f'Episode {number}',
+                                'ids': {'trakt': 5_000_000 + k, 'tmdb': 3_000_000 + k}},
+                    'show': self.show(show_index, full)}
+
+        if kind == 'movies':
+            return LazyList(len(movie_positions), movie_event)
+        if kind == 'shows':
+            return LazyList(len(episode_positions), episode_event)
+
+        movie_index = {position: k for k, position in enumerate(movie_positions)}
+
+        def any_event(i):
+            if i in movie_index:
+                return movie_event(movie_index[i])
+            return episode_event(bisect_left(episode_positions, i))
+        return LazyList(len(movie_positions) + len(episode_positions), any_event)
+
+    def watched(self, kind, full=False, seasons=True):
+        def watched_movie(i):
+            return {'plays': 1 + i % 3, 'last_watched_at': self.watched_at(i),
+                    'last_updated_at': self.watched_at(i), 'movie': self.movie(i, full)}
+
+        def watched_show(i):
+            tmdb_id = self.show_ids[i]
+            item = {'plays': self.season_count(tmdb_id) * self.episode_count(tmdb_id),
+                    'last_watched_at': self.watched_at(i), 'last_updated_at': self.watched_at(i),
+                    'reset_at': None, 'show': self.show(i, full)}
+            if seasons:
+                item['seasons'] = [
+                    {'number': s, 'episodes': [
+                        {'number': e, 'plays': 1, 'last_watched_at': self.watched_at(i)}
+                        for e in range(1, self.episode_count(tmdb_id) + 1)]}
+                    for s in range(1, self.season_count(tmdb_id) + 1)]
+            return item
+
+        if kind == 'movies':
+            return LazyList(self.watched_movies, watched_movie)
+        return LazyList(self.watched_shows, watched_show)
+
+    def watchlist(self, kind, full=False):
+        movies = max(1, self.movie_count // 10)
+        shows = max(1, self.show_count // 10)
+
+        def entry(rank, i):
+            # Watchlist picks titles from the unwatched tail of the library
+            if i % 3 == 0 and i // 3 < shows:
+                show_index = self.show_count - 1 - i // 3
+                return {'rank': rank, 'id': 30_000_000 + i, 'listed_at': self.watched_at(i),
+                        'notes': None, 'type': 'show', 'show': self.show(show_index, full)}
+            movie_index = self.movie_count - 1 - (i - i // 3)
+            return {'rank': rank, 'id': 30_000_000 + i, 'listed_at': self.watched_at(i),
+                    'notes': None, 'type': 'movie', 'movie': self.movie(movie_index, full)}
+
+        items = [entry(rank + 1, i) for rank, i in enumerate(range(min(movies + shows, self.size)))]
+        if kind == 'movies':
+            items = [item for item in items if item['type'] == 'movie']
+        elif kind == 'shows':
+            items = [item for item in items if item['type'] == 'show']
+        return items
+
+    def user_lists(self):
+        return [{
+            'name': name, 'description': f'Synthetic list {name}', 'privacy': 'public',
+            'type': 'personal', 'display_numbers': True, 'allow_comments': True,
+            'sort_by': 'rank', 'sort_how': 'asc',
+            'created_at': iso(BASE_TIME - timedelta(days=400)),
+            'updated_at': iso(BASE_TIME - timedelta(days=position)),
+            'item_count': int(self.size * share), 'comment_count': 0, 'likes': 0,
+            'ids': {'slug': slug, 'trakt': 900 + position},
+            'user': {'username': self.username, 'ids': {'slug': self.username}}
+        } for position, (slug, name, share) in enumerate(self.lists)]
+
+    def list_items(self, slug, full=False):
+        for position, (list_slug, _, share) in enumerate(self.lists):
+            if list_slug == slug:
+                count = int(self.size * share)
+                offset = position * 97
+
+                def list_entry(i):
+                    j = (offset + i * 7) % self.size
+                    base = {'rank': i + 1, 'id': 40_000_000 + position * 1_000_000 + i,
+                            'listed_at': self.watched_at(i), 'notes': None}
+                    if j < self.movie_count:
+                        return {**base, 'type': 'movie', 'movie': self.movie(j, full)}
+                    return {**base, 'type': 'show', 'show': self.show(j - self.movie_count, full)}
+                return LazyList(count, list_entry)
+        return None
+
+    def comments(self):
+        return [{'type': 'movie', 'comment': {'id': i, 'comment': f'Comment {i}', 'spoiler': False,
+                                              'created_at': self.watched_at(i)},
+                 'movie': self.movie(i)} for i in range(min(10, self.movie_count))]
+
+    # TMDB endpoint payloads
+
+    def tmdb_images(self, kind, tmdb_id):
+        prefix = 'm' if kind == 'movie' else 't'
+        return {
+            'id': tmdb_id,
+            'posters': [{'file_path': f'/{prefix}{tmdb_id}p.jpg', 'width': 780, 'height': 1170}],
+            'backdrops': [{'file_path': f'/{prefix}{tmdb_id}b.jpg', 'width': 1280, 'height': 720}]
+        }
+
+    def tmdb_movie_details(self, tmdb_id):
+        movie = self.movie(self.movie_index.get(tmdb_id, 0), full=True)
+        return {
+            'id': tmdb_id,
+            'title': movie['title'],
+            'release_date': f"{movie['year']}-06-01",
+            'runtime': movie['runtime'],
+            'vote_average': movie['rating'],
+            'genres': [{'id': index, 'name': genre.title()} for index, genre in enumerate(movie['genres'])]
+        }
+
+    def tmdb_show_details(self, tmdb_id):
+        count = self.season_count(tmdb_id)
+        show = self.show(self.show_index.get(tmdb_id, 0), full=True)
+        # Every third show has a specials season, like many real shows
+        first = 0 if tmdb_id % 3 == 0 else 1
+        return {
+            'id': tmdb_id,
+            'name': f'Show {tmdb_id}',
+            'first_air_date': f"{show['year']}-01-15",
+            'episode_run_time': [show['runtime']],
+            'vote_average': show['rating'],
+            'genres': [{'id': index, 'name': genre.title()} for index, genre in enumerate(show['genres'])],
+            'number_of_seasons': count,
+            'seasons': [{'season_number': s, 'episode_count': self.episode_count(tmdb_id)}
+                        for s in range(first, count + 1)]
+        }
+
+    def tmdb_season_images(self, tmdb_id, season):
+        return {'id': tmdb_id, 'posters': [{'file_path': f'/s{tmdb_id}_{season}.jpg'}]}
+
+    def tmdb_episode_images(self, tmdb_id, season, episode):
+        return {'id': tmdb_id, 'stills': [{'file_path': f'/e{tmdb_id}_{season}_{episode}.jpg'}]}
+
+    def tmdb_person_images(self, person_id):
+        # Like on TMDB, some people have no profile picture
+        profiles = [] if person_id % 5 == 0 else [{'file_path': f'/p{person_id}.jpg'}]
+        return {'id': person_id, 'profiles': profiles}
+
+
+def make_jpeg(width, height, seed=0):
+    """Render a noisy gradient JPEG roughly the size of a real TMDB poster"""
+    from PIL import Image
+
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    image = Image.merge('RGB', (gradient, noise, Image.blend(gradient, noise, 0.5)))
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class RateBudget:
+    """Fixed-window request budget that answers 429 once spent"""
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.window_start = time.monotonic()
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Consume one request; return (allowed, remaining, seconds_until_reset)"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.period:
+                self.window_start = now
+                self.count = 0
+            reset_in = self.period - (now - self.window_start)
+            if self.count >= self.limit:
+                return False, 0, reset_in
+            self.count += 1
+            return True, self.limit - self.count, reset_in
+
+
+class StubState:
+    """Library, settings and counters shared by all request handlers"""
+
+    def __init__(self, library, latency_ms=0, error_rate=0.0, retry_after=0,
+                 trakt_limit=1000, trakt_period=300, tmdb_limit=10000, tmdb_period=10,
+                 page_limit=100):
+        self.library = library
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.page_limit = page_limit
+        self.budgets = {
+            'trakt': RateBudget(trakt_limit, trakt_period),
+            'tmdb': RateBudget(tmdb_limit, tmdb_period)
+        }
+        self.rng = random.Random(library.seed)
+        self.lock = threading.Lock()
+        self.poster_bytes = make_jpeg(780, 1170)
+        self.backdrop_bytes = make_jpeg(1280, 720)
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+
+    def count(self, api, status, nbytes):
+        with self.lock:
+            stats = self.counts.setdefault(api, {'requests': 0, 'rate_limited': 0, 'bytes': 0})
+            stats['requests'] += 1
+            stats['bytes'] += nbytes
+            if status == 429:
+                stats['rate_limited'] += 1
+
+    def inject_error(self):
+        with self.lock:
+            return self.error_rate > 0 and self.rng.random() < self.error_rate
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """Route requests to the Trakt, TMDB, site and CDN stand-ins"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+
+        if path == '/_stats':
+            return self.send_json(200, self.state.counts)
+        if path == '/_reset':
+            self.state.reset()
+            return self.send_json(200, {'reset': True})
+
+        if self.state.latency:
+            time.sleep(self.state.latency)
+
+        if path.startswith('/trakt/'):
+            return self.handle_trakt(path[len('/trakt'):], query)
+        if path.startswith('/tmdb/3/'):
+            return self.handle_tmdb(path[len('/tmdb/3'):])
+        if path.startswith('/tmdb/t/p/'):
+            return self.handle_image('tmdb_images', path)
+        if path.startswith('/site/'):
+            return self.handle_site(path[len('/site'):], query)
+        if path.startswith('/cdn/'):
+            return self.handle_image('cdn', path)
+        return self.send_json(404, {'error': 'not found'}, api='unknown')
+
+    # Responses
+
+    def send_json(self, status, payload, api=None, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        if api:
+            self.state.count(api, status, len(body))
+
+    def check_budget(self, api):
+        """Apply the rate budget; send a 429 and return None when it is spent"""
+        budget = self.state.budgets[api]
+        allowed, remaining, reset_in = budget.take()
+        if api == 'trakt':
+            until = datetime.now(timezone.utc) + timedelta(seconds=reset_in)
+            headers = {'X-Ratelimit': json.dumps({
+                'name': 'UNAUTHED_API_GET_LIMIT', 'period': budget.period, 'limit': budget.limit,
+                'remaining': remaining, 'until': iso(until)})}
+        else:
+            headers = {'X-RateLimit-Limit': str(budget.limit),
+                       'X-RateLimit-Remaining': str(remaining),
+                       'X-RateLimit-Reset': str(int(time.time() + reset_in))}
+
+        if not allowed or self.state.inject_error():
+            retry_after = self.state.retry_after if allowed else max(self.state.retry_after, math.ceil(reset_in))
+            headers['Retry-After'] = str(retry_after)
+            self.send_json(429, {'error': 'rate limit exceeded'}, api=api, headers=headers)
+            return None
+        return headers
+
+    def send_page(self, items, query, headers, api='trakt', paginate_by_default=False):
+        """Send a list, paginated like Trakt when page/limit are given"""
+        if items is None:
+            return self.send_json(404, {'error': 'not found'}, api=api, headers=headers)
+
+        if 'page' in query or 'limit' in query or paginate_by_default:
+            page = max(1, int(query.get('page', 1)))
+            limit = max(1, int(query.get('limit', self.state.page_limit)))
+            page_count = max(1, math.ceil(len(items) / limit))
+            headers.update({
+                'X-Pagination-Page': str(page),
+                'X-Pagination-Limit': str(limit),
+                'X-Pagination-Page-Count': str(page_count),
+                'X-Pagination-Item-Count': str(len(items))
+            })
+            items = items[(page - 1) * limit:page * limit]
+        else:
+            items = items[:]
+        return self.send_json(200, items, api=api, headers=headers)
+
+    # Stand-ins
+
+    def handle_trakt(self, path, query):
+        headers = self.check_budget('trakt')
+        if headers is None:
+            return
+
+        library = self.state.library
+        full = 'full' in query.get('extended', '')
+        # Every username gets the same library, which is what batch runs want to de-duplicate
+        match = re.match(r'/users/([^/]+)', path)
+        if not match:
+            return self.send_json(404, {'error': 'user not found'}, api='trakt', headers=headers)
+        route = path[match.end():]
+
+        if route == '':
+            base_url = f'http://{self.headers.get("Host")}'
+            return self.send_json(200, library.profile(base_url), api='trakt', headers=headers)
+        if route == '/stats':
+            return self.send_json(200, library.stats(), api='trakt', headers=headers)
+        if route == '/comments':
+            return self.send_page(library.comments(), query, headers, paginate_by_default=True)
+        if route == '/lists':
+            return self.send_json(200, library.user_lists(), api='trakt', headers=headers)
+
+        match = re.fullmatch(r'/history(?:/(movies|shows))?', route)
+        if match:
+            return self.send_page(library.history(match.group(1), full), query, headers,
+                                  paginate_by_default=True)
+        match = re.fullmatch(r'/watched/(movies|shows)', route)
+        if match:
+            seasons = 'noseasons' not in query.get('extended', '')
+            return self.send_page(library.watched(match.group(1), full, seasons), query, headers)
+        match = re.fullmatch(r'/watchlist(?:/(movies|shows))?', route)
+        if match:
+            return self.send_page(library.watchlist(match.group(1), full), query, headers)
+        match = re.fullmatch(r'/lists/([^/]+)/items', route)
+        if match:
+            return self.send_page(library.list_items(match.group(1), full), query, headers)
+
+        return self.send_json(404, {'error': 'not found'}, api='trakt', headers=headers)
+
+    def handle_tmdb(self, path):
+        headers = self.check_budget('tmdb')
+        if headers is None:
+            return
+
+        library = self.state.library
+        match = re.fullmatch(r'/(movie|tv)/(\d+)/images', path)
+        if match:
+            return self.send_json(200, library.tmdb_images(match.group(1), int(match.group(2))),
+                                  api='tmdb', headers=headers)
+        match = re.fullmatch(r'/movie/(\d+)', path)
+        if match:
+            return self.send_json(200, library.tmdb_movie_details(int(match.group(1))),
+                                  api='tmdb', headers=headers)
+        match = re.fullmatch(r'/tv/(\d+)', path)
+        if match:
+            return self.send_json(200, library.tmdb_show_details(int(match.group(1))),
+                                  api='tmdb', headers=headers)
+        match = re.fullmatch(r'/tv/(\d+)/season/(\d+)/images', path)
+        if match:
+            return self.send_json(200, library.tmdb_season_images(int(match.group(1)), int(match.group(2))),
+                                  api='tmdb', headers=headers)
+        match = re.fullmatch(r'/tv/(\d+)/season/(\d+)/episode/(\d+)/images', path)
+        if match:
+            return self.send_json(200, library.tmdb_episode_images(*(int(group) for group in match.groups())),
+                                  api='tmdb', headers=headers)
+        match = re.fullmatch(r'/person/(\d+)/images', path)
+        if match:
+            return self.send_json(200, library.tmdb_person_images(int(match.group(1))),
+                                  api='tmdb', headers=headers)
+        return self.send_json(404, {'status_message': 'not found'}, api='tmdb', headers=headers)
+
+    def handle_site(self, path, query):
+        library = self.state.library
+        if path == '/api/trakt/user/watched' and query.get('type') in ('movies', 'shows'):
+            items = library.watched(query['type'])[:]
+            if query.get('slim') == 'true':
+                items = [slim_item(item) for item in items]
+            return self.send_json(200, {'metadata': {'count': len(items)}, 'data': items}, api='site')
+        if path == '/data/media_index/manifest.json':
+            # The poster CDN answers any path, so the stub tree is simply flat
+            return self.send_json(200, {'version': 1, 'layout': 'flat', 'shards': {}, 'totals': {}}, api='site')
+        return self.send_json(404, {'error': 'not found'}, api='site')
+
+    def handle_image(self, api, path):
+        body = self.state.backdrop_bytes if 'backdrop' in path or re.search(r'\d+b\.jpg$', path) \
+            else self.state.poster_bytes
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.state.count(api, 200, len(body))
+
+
+class StubApiServer:
+    """Run the stand-in server on a background thread"""
+
+    def __init__(self, state, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), StubRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = state
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def env(self):
+        """Environment variables that point the pipeline at this server"""
+        return {
+            'TRAKT_API_BASE_URL': f'{self.base_url}/trakt',
+            'TMDB_API_BASE_URL': f'{self.base_url}/tmdb/3',
+            'TMDB_IMAGE_BASE_URL': f'{self.base_url}/tmdb/t/p',
+            'COVER_DATA_BASE_URL': f'{self.base_url}/site',
+            'COVER_CDN_BASE_URL': f'{self.base_url}/cdn',
+            'TRAKT_USERNAME': self.httpd.state.library.username
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve a synthetic Trakt/TMDB library locally')
+    parser.add_argument('--size', type=int, default=1000, help='Number of titles in the library (default: 1000)')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Added latency per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of API requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds on injected 429s')
+    parser.add_argument('--trakt-limit', type=int, default=1000, help='Trakt requests per period (default: 1000)')
+    parser.add_argument('--trakt-period', type=int, default=300, help='Trakt rate limit period in seconds')
+    parser.add_argument('--tmdb-limit', type=int, default=40, help='TMDB requests per period (default: 40)')
+    parser.add_argument('--tmdb-period', type=int, default=10, help='TMDB rate limit period in seconds')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    state = StubState(SyntheticLibrary(args.size), latency_ms=args.latency_ms, error_rate=args.error_rate,
+                      retry_after=args.retry_after, trakt_limit=args.trakt_limit,
+                      trakt_period=args.trakt_period, tmdb_limit=args.tmdb_limit,
+                      tmdb_period=args.tmdb_period)
+    server = StubApiServer(state, port=args.port)
+    logger.info(f"Serving a {args.size}-title library at {server.base_url}")
+    for name, value in server.env().items():
+        logger.info(f"  {name}={value}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
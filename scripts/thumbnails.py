@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Thumbnail Utility
+
+Small versions of posters for the cover image (and any later thumbnail or atlas step)
+without paying for a full-size decode of every image:
+- JPEGs are decoded in draft mode: libjpeg scales by 1/2, 1/4 or 1/8 while decoding, down to
+  the smallest scale that still leaves DRAFT_MARGIN times the target size (a w780 poster is
+  decoded at 1/4 for an 89x136 thumbnail)
+- the rest is a two-step resize: a fast integer reduce() to about REDUCING_GAP times the
+  target, then LANCZOS for the final size
+- ThumbnailCache keeps finished thumbnails on disk keyed by the SHA-256 of the source bytes
+  and the target size, so a poster that did not change is never decoded again
+"""
+
+import os
+import time
+import hashlib
+from io import BytesIO
+from pathlib import Path
+import logging
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DRAFT_MARGIN = 2    # decode at >= 2x the target, so LANCZOS still has detail to work with
+REDUCING_GAP = 2.0  # reduce() by whole factors until within 2x of the target, then LANCZOS
+CACHE_VERSION = 1   # part of every cache key; bump when thumbnails are made differently
+
+
+def make_thumbnail(source, size):
+    """RGB image of exactly size (width, height) from image bytes or a file path"""
+    with Image.open(BytesIO(source) if isinstance(source, bytes) else source) as image:
+        if image.format == 'JPEG':
+            image.draft('RGB', (size[0] * DRAFT_MARGIN, size[1] * DRAFT_MARGIN))
+        return image.convert('RGB').resize(size, Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, data, size):
+        """Cache file of a thumbnail: <first 2 hex digits>/<sha256>_<w>x<h>_v<version>.png"""
+        digest = hashlib.sha256(data).hexdigest()
+        return self.cache_dir / digest[:2] / f'{digest}_{size[0]}x{size[1]}_v{CACHE_VERSION}.png'
+
+    def get(self, data, size):
+        """Thumbnail of image bytes, from the cache when these bytes were seen before"""
+        cache_path = self.path(data, size)
+        try:
+            with Image.open(cache_path) as cached:
+                thumbnail = cached.convert('RGB')
+            os.utime(cache_path)  # the mtime records the last use, see prune
+            self.hits += 1
+            return thumbnail
+        except (OSError, ValueError):
+            pass
+
+        thumbnail = make_thumbnail(data, size)
+        self.misses += 1
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_name(f'.{cache_path.name}.part')
+            thumbnail.save(tmp_path, 'PNG')
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not cache thumbnail {cache_path}: {e}")
+        return thumbnail
+
+    def prune(self, max_age_days):
+        """Delete thumbnails that were not used for max_age_days; returns the number deleted"""
+        cutoff = time.time() - max_age_days * 86400
+        deleted = 0
+        for cache_path in self.cache_dir.glob('*/*.png'):
+            if cache_path.stat().st_mtime < cutoff:
+                cache_path.unlink(missing_ok=True)
+                deleted += 1
+        return deleted
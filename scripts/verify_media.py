@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Image Integrity Scanner
+
+Finds broken or truncated posters and backdrops in the image tree. Every image is opened
+with Pillow in a process pool, which decodes its header and dimensions, and JPEG/PNG files
+must end with their end-of-image marker (a download that was cut off does not).
+--deep also decodes the pixels.
+
+Results are cached in the image tree keyed by (path, size, mtime), so later runs only open
+new or changed files. Broken files are written to the re-download queue; the downloader
+treats queued files as missing and replaces them on its next run.
+"""
+
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import logging
+
+from PIL import Image
+
+import config
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.webp')
+TRAILER_BYTES = 64
+
+
+def missing_trailer(filepath, image_format):
+    """Error message when a JPEG/PNG file does not end with its end-of-image marker"""
+    with open(filepath, 'rb') as f:
+        f.seek(max(0, filepath.stat().st_size - TRAILER_BYTES))
+        tail = f.read()
+    if image_format == 'JPEG' and not tail.rstrip(b'\x00').endswith(b'\xff\xd9'):
+        return 'truncated: no JPEG end-of-image marker'
+    if image_format == 'PNG' and b'IEND' not in tail:
+        return 'truncated: no PNG IEND chunk'
+    return None
+
+
+def verify_file(job):
+    """Check one image; returns (relative_path, cache entry)"""
+    images_dir, relative_path, deep = job
+    filepath = Path(images_dir) / relative_path
+    entry = {'size': None, 'mtime_ns': None, 'deep': deep}
+
+    # A file deleted or replaced since the scan is an error entry, not a failed scan
+    try:
+        stat = filepath.stat()
+        entry['size'], entry['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+        with Image.open(filepath) as image:
+            entry['format'] = image.format
+            entry['width'], entry['height'] = image.size
+            if deep:
+                image.load()
+        error = missing_trailer(filepath, entry['format'])
+        if not error and not (entry['width'] and entry['height']):
+            error = 'empty image'
+    except Exception as e:
+        error = str(e) or e.__class__.__name__
+
+    entry['ok'] = error is None
+    if error:
+        entry['error'] = error
+    return relative_path, entry
+
+
+class ImageVerifier:
+    def __init__(self, images_dir, workers=None, deep=False):
+        self.images_dir = Path(images_dir)
+        self.workers = workers or os.cpu_count()
+        self.deep = deep
+        self.cache_path = self.images_dir / config.VERIFY_CACHE
+        self.queue_path = self.images_dir / config.REDOWNLOAD_QUEUE
+
+    def load_cache(self):
+        """Load the verification results of earlier runs"""
+        if self.cache_path.exists():
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'files': {}}
+
+    def save_json(self, path, data):
+        data['last_updated'] = datetime.now().isoformat()
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def scan(self):
+        """Current images as {relative_path: (size, mtime_ns)}"""
+        images = {}
+        for media_type in ('movies', 'shows'):
+            for root, dirs, files in os.walk(self.images_dir / media_type):
+                for filename in files:
+                    if filename.startswith('.') or not filename.lower().endswith(IMAGE_SUFFIXES):
+                        continue
+                    filepath = Path(root) / filename
+                    stat = filepath.stat()
+                    images[filepath.relative_to(self.images_dir).as_posix()] = (stat.st_size, stat.st_mtime_ns)
+        return images
+
+    def verify_all(self):
+        """Verify every new or changed image, update the cache and the re-download queue"""
+        cache = self.load_cache()
+        images = self.scan()
+
+        # Forget deleted files; anything whose size or mtime changed is checked again, and a
+        # deep scan also re-checks files that only had their header read
+        cache['files'] = {path: entry for path, entry in cache['files'].items() if path in images}
+        pending = []
+        for path, (size, mtime_ns) in images.items():
+            entry = cache['files'].get(path)
+            if (entry is None or (entry['size'], entry['mtime_ns']) != (size, mtime_ns)
+                    or (self.deep and not entry.get('deep'))):
+                pending.append(path)
+        logger.info(f"Verifying {len(pending)} of {len(images)} images with {self.workers} workers "
+                   f"({len(images) - len(pending)} unchanged since the last scan)")
+
+        if pending:
+            jobs = [(str(self.images_dir), path, self.deep) for path in pending]
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                for path, entry in executor.map(verify_file, jobs, chunksize=64):
+                    cache['files'][path] = entry
+                    if not entry['ok']:
+                        logger.warning(f"Broken image {path}: {entry['error']}")
+        self.save_json(self.cache_path, cache)
+
+        broken = sorted(path for path, entry in cache['files'].items() if not entry['ok'])
+        self.save_json(self.queue_path, {'files': broken})
+
+        logger.info(f"Verified {len(images)} images: {len(broken)} broken, queued for re-download "
+                   f"in {self.queue_path}")
+        return {'images': len(images), 'checked': len(pending), 'broken': len(broken)}
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Find broken or truncated images and queue them for re-download')
+    parser.add_argument('--cdn-repo-path',
+                       help='Path to the CDN repository where images are stored')
+    parser.add_argument('--workers', type=int, help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--deep', action='store_true', help='Also decode the pixels of every image (slower)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    images_dir = Path(args.cdn_repo_path) / 'watch' if args.cdn_repo_path else Path('public/data/imgs')
+
+    try:
+        ImageVerifier(images_dir, workers=args.workers, deep=args.deep).verify_all()
+    except Exception as e:
+        logger.error(f"Script failed: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()